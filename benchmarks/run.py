@@ -0,0 +1,251 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks of uci extension and euci wrapper.
+
+This generates synthetic configs in temporary directory and measures time of
+common operations. Results are printed or written as JSON so they can be
+compared between versions:
+
+    python3 benchmarks/run.py --output new.json --compare old.json
+
+Benchmarks in DISK group write config to disk including fsync and rename and
+their time is dominated by storage. They are measured but not compared unless
+--compare-disk is used as results are comparable only on same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from ipaddress import IPv4Address
+
+import uci
+import euci
+
+CONFIG = 'bench'
+
+# Benchmarks measuring mostly speed of storage rather than pyuci
+DISK = frozenset(('commit',))
+
+
+def generate(confdir, sections, list_size):
+    """Generate synthetic config with given number of sections."""
+    with open(os.path.join(confdir, CONFIG), 'w') as file:
+        for i in range(sections):
+            if i % 10:
+                file.write("config item 'item{}'\n".format(i))
+            else:
+                file.write("config anonymous\n")
+            file.write("\toption string 'value{}'\n".format(i))
+            file.write("\toption boolean '{}'\n".format('yes' if i % 2 else 'no'))
+            file.write("\toption integer '{}'\n".format(i))
+            file.write("\toption address '10.{}.{}.1'\n".format(i // 256 % 256, i % 256))
+            for j in range(list_size):
+                file.write("\tlist values 'entry{}'\n".format(j))
+            file.write("\n")
+
+
+class Benchmarks:
+    """Collection of benchmarks. Every method bench_* returns number of operations performed in single round."""
+
+    def __init__(self, confdir, savedir, sections, lookups):
+        self.confdir = confdir
+        self.savedir = savedir
+        self.names = ['item{}'.format(i) for i in range(sections) if i % 10]
+        step = max(len(self.names) // lookups, 1)
+        self.sample = self.names[::step][:lookups]
+        self.uci = self.new()
+        self.euci = euci.EUci(confdir=confdir, savedir=savedir)
+        self.uci.get_all(CONFIG)
+        self.euci.get_all(CONFIG)
+        self.counter = 0
+
+    def new(self):
+        """Create new Uci object for generated configs."""
+        return uci.Uci(confdir=self.confdir, savedir=self.savedir)
+
+    def bench_get(self):
+        for name in self.sample:
+            self.uci.get(CONFIG, name, 'string')
+        return len(self.sample)
+
+    def bench_get_list(self):
+        for name in self.sample:
+            self.uci.get(CONFIG, name, 'values')
+        return len(self.sample)
+
+    def bench_get_section_type(self):
+        for name in self.sample:
+            self.uci.get(CONFIG, name)
+        return len(self.sample)
+
+    def bench_get_all_section(self):
+        for name in self.sample:
+            self.uci.get_all(CONFIG, name)
+        return len(self.sample)
+
+    def bench_get_all_config(self):
+        self.uci.get_all(CONFIG)
+        return 1
+
+    def bench_load(self):
+        self.new().get_all(CONFIG)
+        return 1
+
+    def bench_set(self):
+        self.counter += 1
+        value = str(self.counter)
+        for name in self.sample:
+            self.uci.set(CONFIG, name, 'string', value)
+        self.uci.revert(CONFIG)
+        return len(self.sample)
+
+    def bench_commit(self):
+        self.counter += 1
+        self.uci.set(CONFIG, self.sample[0], 'integer', str(self.counter))
+        self.uci.commit(CONFIG)
+        return 1
+
+    def bench_context(self):
+        with self.new() as ctx:
+            ctx.get(CONFIG, self.sample[0], 'string')
+        return 1
+
+    def _euci_get(self, option, dtype):
+        for name in self.sample:
+            self.euci.get(CONFIG, name, option, dtype=dtype)
+        return len(self.sample)
+
+    def bench_euci_get_str(self):
+        return self._euci_get('string', str)
+
+    def bench_euci_get_bool(self):
+        return self._euci_get('boolean', bool)
+
+    def bench_euci_get_int(self):
+        return self._euci_get('integer', int)
+
+    def bench_euci_get_ipaddress(self):
+        return self._euci_get('address', IPv4Address)
+
+    def bench_euci_get_list(self):
+        for name in self.sample:
+            self.euci.get(CONFIG, name, 'values', list=True)
+        return len(self.sample)
+
+    @classmethod
+    def names_all(cls):
+        """List names of all benchmarks."""
+        return [name[6:] for name in dir(cls) if name.startswith('bench_')]
+
+
+def measure(func, rounds):
+    """Run given benchmark function and return statistics of time per operation in seconds."""
+    func()  # warm up
+    times = []
+    ops = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        ops = func()
+        times.append((time.perf_counter() - start) / ops)
+    return {
+        'ops': ops,
+        'rounds': rounds,
+        'min': min(times),
+        'max': max(times),
+        'mean': statistics.mean(times),
+        'median': statistics.median(times),
+    }
+
+
+def compare(results, baseline, disk=False):
+    """Print comparison of median times with baseline results to standard error output.
+
+    Benchmarks of DISK group are skipped unless disk is True.
+    """
+    for name, result in sorted(results.items()):
+        if name in DISK and not disk:
+            continue
+        base = baseline.get(name)
+        if base is None:
+            print("{:<24} {:>12.3f} us".format(name, result['median'] * 1e6), file=sys.stderr)
+            continue
+        print("{:<24} {:>12.3f} us {:>+8.1f} %".format(
+            name, result['median'] * 1e6, (result['median'] / base['median'] - 1) * 100), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sections', type=int, default=2000, help='Number of sections in generated config')
+    parser.add_argument('--list-size', type=int, default=8, help='Number of values in list option of every section')
+    parser.add_argument('--lookups', type=int, default=200, help='Number of lookups performed in single round')
+    parser.add_argument('--rounds', type=int, default=20, help='Number of rounds of every benchmark')
+    parser.add_argument('--output', '-o', help='File to write JSON results to (standard output by default)')
+    parser.add_argument('--compare', '-c', help='JSON results of previous run to compare with')
+    parser.add_argument('--compare-disk', action='store_true',
+                        help='Compare also benchmarks dominated by disk: ' + ', '.join(sorted(DISK)))
+    parser.add_argument('benchmarks', nargs='*',
+                        help='Benchmarks to run (all by default): ' + ', '.join(Benchmarks.names_all()))
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(Benchmarks.names_all())
+    if unknown:
+        parser.error('unknown benchmarks: ' + ', '.join(sorted(unknown)))
+
+    tmpdir = tempfile.mkdtemp(prefix='pyuci-bench-')
+    try:
+        confdir = os.path.join(tmpdir, 'config')
+        savedir = os.path.join(tmpdir, 'save')
+        os.mkdir(confdir)
+        os.mkdir(savedir)
+        generate(confdir, args.sections, args.list_size)
+        bench = Benchmarks(confdir, savedir, args.sections, args.lookups)
+        results = {}
+        for name in args.benchmarks or Benchmarks.names_all():
+            results[name] = measure(getattr(bench, 'bench_' + name), args.rounds)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'sections': args.sections,
+            'list_size': args.list_size,
+            'lookups': args.lookups,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)['results'], args.compare_disk)
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,7 @@ import ipaddress
 
 from uci import Uci, UciExceptionNotFound
 from . import boolean
+from .common import check_get_kwargs, path_config, split_path
 
 
 def _is_iter(data):
@@ -35,24 +36,75 @@ def _is_iter(data):
     return isinstance(data, collections.abc.Iterable) and not isinstance(data, str)
 
 
+def _get_bool(value):
+    value = value.lower()
+    if value not in boolean.VALUES:
+        raise ValueError("invalid value '{}' for bool type".format(value))
+    return boolean.VALUES[value]
+
+
+# Functions converting string value to supported data types
+_CONVERTERS = {
+    str: str,
+    bool: _get_bool,
+    int: int,
+    ipaddress.IPv4Address: ipaddress.ip_address,
+    ipaddress.IPv6Address: ipaddress.ip_address,
+}
+
+# Types that Uci.get() is able to convert to on its own
+_NATIVE = frozenset((str, bool, int))
+
+
 class EUci(Uci):
     """Extended Uci wrapper
+
+    Optional keyword argument "cache" is instance of euci.cache.ConfigCache
+    (such as euci.cache.DEFAULT). Values of configs that are not loaded in this
+    object are then read by get() through it. Configs loaded by any other
+    method (or by load()) are read from this object so all its methods report
+    the same state until the config is unloaded.
     """
 
+    _cache = None
+
+    def __init__(self, *args, cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = cache
+
     @staticmethod
     def _get(value, dtype):
-        if dtype == str:
-            return value
-        elif dtype == bool:
-            value = value.lower()
-            if value not in boolean.VALUES:
-                raise ValueError("invalid value '{}' for bool type".format(value))
-            return boolean.VALUES[value]
-        elif dtype == int:
-            return int(value)
-        elif dtype in (ipaddress.IPv4Address, ipaddress.IPv6Address):
-            return ipaddress.ip_address(value)
-        raise TypeError("'{}' is not supported type of data".format(dtype))
+        return EUci._converter(dtype)(value)
+
+    @staticmethod
+    def _converter(dtype):
+        """Returns function converting string value to given dtype (str if None)."""
+        if dtype is None:
+            return str
+        try:
+            return _CONVERTERS[dtype]
+        except (KeyError, TypeError):
+            raise TypeError("'{}' is not supported type of data".format(dtype)) from None
+
+    @staticmethod
+    def _typed(values, convert, kwargs):
+        """Convert value or tuple of values and apply 'list' keyword argument."""
+        if _is_iter(values):
+            result = tuple((convert(str(value)) for value in values))
+        else:
+            result = convert(str(values))
+        return EUci._listed(result, kwargs)
+
+    @staticmethod
+    def _listed(result, kwargs):
+        """Apply 'list' keyword argument to value or tuple of values."""
+        if 'list' in kwargs:
+            if isinstance(result, tuple) == bool(kwargs['list']):
+                return result
+            if kwargs['list']:
+                return (result,)
+            return result[0]
+        return result
 
     def get(self, *args, dtype=str, **kwargs):
         """Get configuration value.
@@ -67,8 +119,9 @@ class EUci(Uci):
 
         Following additional optional keywords arguments are available:
         dtype: data type to be returned. Currently supported are: str, bool and
-            int. If you don't specify this then it defaults to str. If value
-            cannot be converted to specified type then it raises ValueError.
+            int. If you don't specify this (or pass None) then it defaults to
+            str. If value cannot be converted to specified type then it raises
+            ValueError.
         list: bool setting if option is expected to be list. This ensures that
             this method always returns tuple or on the other hand never
             returns one.
@@ -76,37 +129,110 @@ class EUci(Uci):
             UciExceptionNotFound.
 
         Note that dtype and list are considered only if at least "section" is
-        provided.
+        provided. Path can be also provided as single string in format
+        "config.section.option".
 
         When requested value is not found then this raises UciExceptionNotFound.
         ValueError is raised in case of value that can't be converted to dtype.
         """
-        kwdiff = set(kwargs).difference({'default', 'list'})
-        if kwdiff:
-            raise TypeError("'{}' is an invalid keyword argument for this function"
-                            .format(next(iter(kwdiff))))
+        check_get_kwargs(kwargs)
+        section = len(args) > 1 or (len(args) == 1 and isinstance(args[0], str) and
+                                    split_path(args[0])[1] is not None)
+        if section and self._cache is not None and path_config(args[0]) not in self.loaded():
+            return self._cache.get(*args, dtype=dtype, confdir=self.confdir(), savedir=self.savedir(),
+                                   **kwargs)
 
+        native = section and dtype in _NATIVE
         try:
+            if native:
+                # Conversion is done by Uci.get() directly from libuci values
+                return self._listed(super().get(*args, dtype=dtype), kwargs)
             values = super().get(*args)
         except UciExceptionNotFound:
             if 'default' not in kwargs:
                 raise
             values = kwargs['default']
-        if len(args) < 2:
+        if not section:
             # Only "config" was provided, values is dictionary and no conversion is provided.
             return values
 
-        if _is_iter(values):
-            result = tuple((self._get(str(value), dtype) for value in values))
+        return self._typed(values, self._converter(dtype), kwargs)
+
+    def get_many(self, paths, dtype=str, **kwargs):
+        """Get multiple configuration values at once.
+
+        This is overloaded Uci.get_many() with additional type conversion.
+        "paths" is either iterable of paths or dictionary mapping paths to
+        their default values. Path is either tuple of "config", "section" and
+        "option" or string in format "config.section.option".
+
+        List of values is returned for iterable and dictionary with same keys
+        for dictionary. Keyword arguments "dtype", "list" and "default" have
+        same meaning as in case of get() and are applied to all values. The
+        "default" keyword argument is ignored for dictionary as its values are
+        used as defaults instead.
+
+        Dictionaries with sections (paths specifying only "config") are
+        returned without any conversion.
+        """
+        check_get_kwargs(kwargs)
+        convert = self._converter(dtype)
+
+        def typed(value):
+            if isinstance(value, dict):
+                return value
+            return self._typed(value, convert, kwargs)
+
+        if 'default' in kwargs:
+            values = super().get_many(paths, default=kwargs['default'])
         else:
-            result = self._get(str(values), dtype)
-        if 'list' in kwargs:
-            if isinstance(result, tuple) == bool(kwargs['list']):
-                return result
-            if kwargs['list']:
-                return (result,)
-            return result[0]
-        return result
+            values = super().get_many(paths)
+        if isinstance(values, dict):
+            return {path: typed(value) for path, value in values.items()}
+        return [typed(value) for value in values]
+
+    @staticmethod
+    def schema(options, factory=None):
+        """Compile schema of section options for typed reading of whole sections.
+
+        "options" is dictionary mapping option names to either data type or
+        instance of euci.schema.Option. "factory" is optional callable (such
+        as dataclass) called with typed values as keyword arguments.
+
+        Returns instance of euci.schema.Schema.
+        """
+        from .schema import Schema
+        return Schema(options, factory)
+
+    def get_sections(self, config, section_type=None, schema=None):
+        """Get sections of config as compact immutable objects.
+
+        Returns tuple of euci.section.Section objects in order of sections in
+        config. Only sections of given type are returned if section_type is
+        provided. Values are converted using schema if provided (see
+        EUci.schema()), otherwise they are kept as strings and tuples.
+        """
+        from .section import section
+        types = {info.name: info.type for info in self.sections(config, section_type)}
+        typed = schema.typed if schema is not None else dict
+        return tuple(
+            section(name, types[name], typed(values))
+            for name, values in self.foreach(config, section_type))
+
+    def watch(self, configs=None, callback=None, debounce=0.05):
+        """Watch given configs (or all if not provided) for changes.
+
+        Returns euci.watch.Watcher for confdir and savedir of this object.
+        Changed configs without unsaved changes are unloaded from this object
+        so it reads their new content. If callback is provided then it is
+        called with every euci.watch.Event from separate thread until watcher
+        is closed.
+        """
+        from .watch import Watcher
+        watcher = Watcher(configs, self.confdir(), self.savedir(), debounce, context=self)
+        if callback is not None:
+            watcher.start(callback)
+        return watcher
 
     @staticmethod
     def _set_value(value, dtype):
@@ -131,13 +257,24 @@ class EUci(Uci):
         ensure correct type. That is in case of boolean for example:
         set("foo", "fee", "faa", bool(value))
         """
-        if _is_iter(args[-1]):
+        super().set(*args[:-1], self._convert_value(args[-1]))
+
+    def add_many(self, config, section_type, sections):
+        """Add multiple anonymous sections of given type.
+
+        Every item of sections is dictionary with options of new section. Values
+        are converted same way as in set. Returns list of names of new sections.
+        """
+        return super().add_many(config, section_type, [
+            {name: self._convert_value(value) for name, value in options.items()}
+            for options in sections])
+
+    def _convert_value(self, value):
+        if _is_iter(value):
             # We consider first value as authoritative for type
-            dtype = type(args[-1][0]) if args[-1] else str
-            super().set(*args[:-1], tuple(
-                (self._set_value(value, dtype) for value in args[-1])))
-        else:
-            super().set(*args[:-1], self._set_value(args[-1], type(args[-1])))
+            dtype = type(value[0]) if value else str
+            return tuple(self._set_value(val, dtype) for val in value)
+        return self._set_value(value, type(value))
 
     # Following methods are obsolete and should not be exnteded nor used in new code #
 
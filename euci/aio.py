@@ -0,0 +1,165 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Asyncio front end for EUci.
+
+Calls to libuci block on file access. AsyncEUci runs them in thread pool so
+event loop is not blocked. Every thread of pool uses its own EUci context that
+is reused between calls. Contexts reload config before use if it was changed
+since they loaded it.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import weakref
+
+from . import EUci
+from .common import default_dirs, file_signature, path_config
+
+
+class AsyncEUci:
+    """Asynchronous variant of EUci backed by pool of contexts.
+
+    "size" is maximal number of contexts and threads used to access them.
+    Custom "executor" can be provided. It is used for blocking calls and
+    number of contexts is then limited only by number of its threads.
+
+    Modifications are always saved to savedir immediately and commit has to be
+    called to write them to confdir. Modifications of single config done from
+    single event loop are serialized so concurrent changes do not interleave.
+    """
+
+    def __init__(self, size=4, confdir=None, savedir=None, executor=None):
+        default_confdir, default_savedir = default_dirs()
+        self._confdir = confdir or default_confdir
+        self._savedir = savedir or default_savedir
+        self._own_executor = executor is None
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix='euci-aio')
+        self._pool = []
+        # Everything below is protected by _pool_lock
+        self._pool_lock = threading.Lock()
+        # Locks of modified configs per event loop kept only while they are used
+        self._locks = weakref.WeakValueDictionary()
+        self._versions = {}
+
+    def _signature(self, config, version):
+        """Returns signature of config used to detect that context has to reload it."""
+        return (
+            version,
+            file_signature(os.path.join(self._confdir, config)),
+            file_signature(os.path.join(self._savedir, config)),
+        )
+
+    def _run(self, configs, func, write):
+        """Call func with pooled context that has up to date configs. This runs in executor."""
+        with self._pool_lock:
+            if self._pool:
+                uci, seen = self._pool.pop()
+            else:
+                uci, seen = EUci(confdir=self._confdir, savedir=self._savedir), {}
+            versions = {config: self._versions.get(config, 0) for config in configs}
+        try:
+            for config in configs:
+                signature = self._signature(config, versions[config])
+                if seen.get(config) != signature:
+                    uci.unload(config)
+                    seen[config] = signature
+            return func(uci)
+        except BaseException:
+            # Context might be left with partial changes
+            for config in configs:
+                seen.pop(config, None)
+            raise
+        finally:
+            with self._pool_lock:
+                if write:
+                    # Invalidated before call returns so no later call can use
+                    # config loaded before this modification. Contexts that are
+                    # in use now notice new version once they are used again.
+                    for config in configs:
+                        self._versions[config] = self._versions.get(config, 0) + 1
+                    for _, other in self._pool:
+                        for config in configs:
+                            other.pop(config, None)
+                self._pool.append((uci, seen))
+
+    async def _call(self, configs, func, write=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._run, configs, func, write))
+
+    async def _write(self, config, func):
+        """Run func modifying given config. Modifications of single config are serialized."""
+        key = (asyncio.get_running_loop(), config)
+        with self._pool_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                # Lock is created in running loop as it is bound to it on Python < 3.10
+                lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            return await self._call((config,), func, write=True)
+
+    async def get(self, *args, dtype=str, **kwargs):
+        """Get configuration value. This is asynchronous variant of EUci.get()."""
+        configs = (path_config(args[0]),) if args else ()
+        return await self._call(configs, lambda uci: uci.get(*args, dtype=dtype, **kwargs))
+
+    async def get_many(self, paths, dtype=str, **kwargs):
+        """Get multiple configuration values. This is asynchronous variant of EUci.get_many()."""
+        if not isinstance(paths, dict):
+            paths = list(paths)
+        configs = {path_config(path) for path in paths}
+        return await self._call(configs, lambda uci: uci.get_many(paths, dtype=dtype, **kwargs))
+
+    async def set(self, *args):
+        """Set configuration value and save change to savedir. Arguments are same as for EUci.set()."""
+        config = path_config(args[0])
+
+        def write(uci):
+            uci.set(*args)
+            uci.save(config)
+        await self._write(config, write)
+
+    async def commit(self, config):
+        """Commit saved changes of given config."""
+        await self._write(config, lambda uci: uci.commit(config))
+
+    async def revert(self, config):
+        """Revert saved changes of given config."""
+        await self._write(config, lambda uci: uci.revert(config))
+
+    def close(self):
+        """Release pooled contexts and shutdown executor if it was not provided."""
+        if self._own_executor:
+            self._executor.shutdown()
+        with self._pool_lock:
+            self._pool.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
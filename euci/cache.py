@@ -0,0 +1,161 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Process-wide read-through cache of parsed UCI configs.
+
+Long running processes commonly create new Uci instance for every request and
+that means that configs are parsed again and again. ConfigCache keeps parsed
+configs in memory and reparses them only when their file in confdir or delta
+file in savedir changes.
+"""
+import collections
+import os
+import sys
+import threading
+from types import MappingProxyType
+
+from uci import Uci, UciExceptionNotFound
+from . import EUci
+from .common import check_get_kwargs, default_dirs, file_signature, find_section, split_path
+
+
+def _sizeof(data):
+    """Rough estimate of memory used by parsed config."""
+    size = sys.getsizeof(data)
+    for name, section in data.items():
+        size += sys.getsizeof(name) + sys.getsizeof(section)
+        for option, value in section.items():
+            size += sys.getsizeof(option) + sys.getsizeof(value)
+            if isinstance(value, tuple):
+                size += sum(sys.getsizeof(val) for val in value)
+    return size
+
+
+_Entry = collections.namedtuple("_Entry", ("signature", "sections", "types", "size"))
+
+
+class ConfigCache:
+    """Cache of parsed configs with LRU eviction.
+
+    max_size: memory budget in bytes. Least recently used configs are dropped
+        when estimated size of all cached configs exceeds it.
+    """
+
+    def __init__(self, max_size=4 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Returns dictionary with cache statistics."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        """Drop all cached configs and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.size = self.hits = self.misses = self.evictions = 0
+
+    def _load(self, key, signature):
+        confdir, savedir, config = key
+        uci = Uci(confdir=confdir, savedir=savedir)
+        values = uci.get_all(config)
+        sections = MappingProxyType({
+            name: MappingProxyType(section) for name, section in values.items()
+        })
+        types = {info.name: info.type for info in uci.sections(config)}
+        return _Entry(signature, sections, types, _sizeof(values))
+
+    def _entry(self, config, confdir, savedir):
+        defconfdir, defsavedir = default_dirs()
+        key = (confdir or defconfdir, savedir or defsavedir, config)
+        # Stat is done before parsing so change during parsing is detected next time
+        signature = (
+            file_signature(os.path.join(key[0], config)),
+            file_signature(os.path.join(key[1], config)),
+        )
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._load(key, signature)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.size -= old.size
+                self.evictions += 1
+        return entry
+
+    def get(self, config, section=None, option=None, dtype=str, confdir=None, savedir=None, **kwargs):
+        """Get configuration value from cache.
+
+        This has same semantics as EUci.get() (including path given as single
+        "config.section.option" string, extended section syntax "@type[index]"
+        and keyword arguments "dtype", "list" and "default") with exception
+        that read-only mappings are returned instead of dictionaries.
+        Additional keyword arguments "confdir" and "savedir" can be used to
+        specify location of config. Defaults of libuci are used if they are not
+        provided.
+        """
+        check_get_kwargs(kwargs)
+        config, section, option = split_path(config, section, option)
+        try:
+            entry = self._entry(config, confdir, savedir)
+            if section is None:
+                return entry.sections
+            section = find_section(section, entry.types.items())
+            if option is None:
+                values = entry.types[section]
+            else:
+                values = entry.sections[section][option]
+        except (KeyError, UciExceptionNotFound):
+            if 'default' not in kwargs:
+                raise UciExceptionNotFound() from None
+            values = kwargs['default']
+        if section is None:
+            return values
+        return EUci._typed(values, EUci._converter(dtype), kwargs)
+
+
+# Process-wide instance of cache
+DEFAULT = ConfigCache()
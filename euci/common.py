@@ -0,0 +1,98 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Helpers shared by modules of euci that access configs without EUci object."""
+import os
+import re
+
+from uci import Uci, UciExceptionNotFound
+
+_DEFAULT_DIRS = None
+
+# Keyword arguments accepted by EUci.get() on top of dtype
+GET_KWARGS = frozenset(('default', 'list'))
+
+# Extended section syntax "@type[index]"
+_EXT_SECTION = re.compile(r"@([^\[\]]*)\[(-?[0-9]+)\]$")
+
+
+def default_dirs():
+    """Returns default confdir and savedir as used by libuci."""
+    global _DEFAULT_DIRS
+    if _DEFAULT_DIRS is None:
+        uci = Uci()
+        _DEFAULT_DIRS = (uci.confdir(), uci.savedir())
+    return _DEFAULT_DIRS
+
+
+def file_signature(path):
+    """Returns signature of file used to detect its change or None if file does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def path_config(path):
+    """Returns config of path given either as "config.section.option" string or as tuple."""
+    if isinstance(path, str):
+        return path.split('.', 1)[0]
+    return path[0]
+
+
+def check_get_kwargs(kwargs):
+    """Raise TypeError if there is keyword argument not accepted by EUci.get()."""
+    if not GET_KWARGS.issuperset(kwargs):
+        raise TypeError("'{}' is an invalid keyword argument for this function"
+                        .format(next(iter(set(kwargs) - GET_KWARGS))))
+
+
+def split_path(config, section=None, option=None):
+    """Split path given as single "config.section.option" string to its parts.
+
+    Returns tuple of config, section and option where missing parts are None.
+    """
+    if section is None and option is None and '.' in config:
+        parts = config.split('.', 2)
+        return tuple(parts) + (None,) * (3 - len(parts))
+    return config, section, option
+
+
+def find_section(section, sections):
+    """Resolve section given in extended syntax "@type[index]" to its name.
+
+    "sections" is iterable of pairs of section name and type in order of config.
+    Empty type matches sections of any type. Section that is not in extended
+    syntax is returned as it is. UciExceptionNotFound is raised if there is no
+    such section.
+    """
+    match = _EXT_SECTION.match(section)
+    if match is None:
+        return section
+    names = [name for name, stype in sections if not match.group(1) or stype == match.group(1)]
+    try:
+        return names[int(match.group(2))]
+    except IndexError:
+        raise UciExceptionNotFound() from None
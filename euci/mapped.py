@@ -0,0 +1,315 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Read-only access to configs through shared memory-mapped index files.
+
+Every process that creates its own Uci parses configs to its private memory.
+MappedUci instead compiles config to index file once and all processes map that
+file to memory. Values are looked up directly in mapped pages so parsed configs
+are shared between processes and readers do not have to parse configs at all.
+Index is rebuilt when config file in confdir or delta file in savedir changes.
+
+Index file consists of header, table of sections sorted by name and string data.
+Every section points to table of its options sorted by name and every option to
+table of its values. All references are offsets from start of file so the file
+can be mapped to any address.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from uci import Uci, UciExceptionNotFound
+from . import EUci
+from .common import check_get_kwargs, default_dirs, file_signature, find_section, split_path
+
+_MAGIC = b"UCIX"
+_VERSION = 2
+# magic, version, signature (2 * (device, inode, size, mtime)), confdir (offset,
+# length), number of sections, offset of sections table
+_HEADER = struct.Struct("<4sI8qIIII")
+# name (offset, length), type (offset, length), index, anonymous, options (offset, count)
+_SECTION = struct.Struct("<8I")
+# name (offset, length), is list, values (offset, count), index in section
+_OPTION = struct.Struct("<6I")
+# value (offset, length)
+_VALUE = struct.Struct("<2I")
+
+
+def _signature(confdir, savedir, config):
+    """Returns signature of config files used to detect their change."""
+    stats = (
+        file_signature(os.path.join(confdir, config)),
+        file_signature(os.path.join(savedir, config)),
+    )
+    return tuple(val for stat in stats for val in (stat or (-1, -1, -1, -1)))
+
+
+class _Writer:
+    """Helper to compose index file."""
+
+    def __init__(self):
+        self.tables = []
+        self.strings = bytearray()
+        self._offsets = {}
+
+    def string(self, value):
+        """Returns offset and length of string in data. Strings are deduplicated."""
+        data = value.encode()
+        if data not in self._offsets:
+            self._offsets[data] = len(self.strings)
+            self.strings += data
+        return self._offsets[data], len(data)
+
+
+def _compose(confdir, savedir, config, signature):
+    """Parse config and return content of index file."""
+    uci = Uci(confdir=confdir, savedir=savedir)
+    values = uci.get_all(config)
+    infos = sorted(uci.sections(config), key=lambda info: info.name.encode())
+
+    writer = _Writer()
+    confdir_ref = writer.string(confdir)
+    # Strings are placed after tables so we collect tables with relative offsets
+    # of strings first and fix them once size of tables is known.
+    sections = []
+    options = []
+    items = []
+    for info in infos:
+        section = values[info.name]
+        sections.append((writer.string(info.name), writer.string(info.type), info.index,
+                         info.anonymous, len(options), len(section)))
+        for order, name in sorted(enumerate(section), key=lambda item: item[1].encode()):
+            value = section[name]
+            listed = isinstance(value, tuple)
+            value = value if listed else (value,)
+            options.append((writer.string(name), listed, len(items), len(value), order))
+            items.extend(writer.string(val) for val in value)
+
+    sections_off = _HEADER.size
+    options_off = sections_off + len(sections) * _SECTION.size
+    values_off = options_off + len(options) * _OPTION.size
+    strings_off = values_off + len(items) * _VALUE.size
+
+    data = bytearray(_HEADER.pack(_MAGIC, _VERSION, *signature, confdir_ref[0] + strings_off,
+                                  confdir_ref[1], len(sections), sections_off))
+    for name, stype, index, anonymous, first, count in sections:
+        data += _SECTION.pack(name[0] + strings_off, name[1], stype[0] + strings_off, stype[1],
+                              index, anonymous, options_off + first * _OPTION.size, count)
+    for name, listed, first, count, order in options:
+        data += _OPTION.pack(name[0] + strings_off, name[1], listed,
+                             values_off + first * _VALUE.size, count, order)
+    for offset, length in items:
+        data += _VALUE.pack(offset + strings_off, length)
+    data += writer.strings
+    return bytes(data)
+
+
+class _Index:
+    """Mapped index file of single config."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self.map)
+        if header[0] != _MAGIC or header[1] != _VERSION:
+            raise ValueError("Invalid index file: " + path)
+        self.signature = header[2:10]
+        self.confdir = self._string(header[10], header[11])
+        self.count = header[12]
+        self.table = header[13]
+        self._sections = None
+
+    def _string(self, offset, length):
+        return self.map[offset:offset + length].decode()
+
+    def _bsearch(self, table, count, entry, key):
+        """Binary search in table of entries with name as first field."""
+        key = key.encode()
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            fields = entry.unpack_from(self.map, table + mid * entry.size)
+            name = self.map[fields[0]:fields[0] + fields[1]]
+            if name == key:
+                return fields
+            if name < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def _values(self, option):
+        values = tuple(
+            self._string(*_VALUE.unpack_from(self.map, option[3] + i * _VALUE.size))
+            for i in range(option[4]))
+        return values if option[2] else values[0]
+
+    def _options(self, section):
+        options = sorted(
+            (_OPTION.unpack_from(self.map, section[6] + i * _OPTION.size) for i in range(section[7])),
+            key=lambda option: option[5])
+        return {self._string(option[0], option[1]): self._values(option) for option in options}
+
+    def _ordered(self):
+        return sorted(
+            (_SECTION.unpack_from(self.map, self.table + i * _SECTION.size) for i in range(self.count)),
+            key=lambda section: section[4])
+
+    def sections(self):
+        """Returns list of section names and types in order of config."""
+        if self._sections is None:
+            self._sections = [(self._string(section[0], section[1]), self._string(section[2], section[3]))
+                              for section in self._ordered()]
+        return self._sections
+
+    def section(self, name):
+        """Returns section fields or raises UciExceptionNotFound.
+
+        Section can be specified in extended syntax "@type[index]" as well.
+        """
+        if name.startswith("@"):
+            name = find_section(name, self.sections())
+        section = self._bsearch(self.table, self.count, _SECTION, name)
+        if section is None:
+            raise UciExceptionNotFound()
+        return section
+
+    def section_type(self, name):
+        section = self.section(name)
+        return self._string(section[2], section[3])
+
+    def option(self, section, name):
+        section = self.section(section)
+        option = self._bsearch(section[6], section[7], _OPTION, name)
+        if option is None:
+            raise UciExceptionNotFound()
+        return self._values(option)
+
+    def section_options(self, name):
+        return self._options(self.section(name))
+
+    def all(self):
+        return {self._string(section[0], section[1]): self._options(section) for section in self._ordered()}
+
+
+class MappedUci:
+    """Read-only access to configs using shared memory-mapped index files.
+
+    confdir and savedir: locations of configs and their deltas. Defaults of
+        libuci are used if they are not provided.
+    indexdir: directory where index files are stored. Processes sharing index
+        have to use same directory. Directory ".index" in savedir is used by
+        default.
+    """
+
+    def __init__(self, confdir=None, savedir=None, indexdir=None):
+        defconfdir, defsavedir = default_dirs()
+        self.confdir = confdir or defconfdir
+        self.savedir = savedir or defsavedir
+        self.indexdir = indexdir or os.path.join(self.savedir, ".index")
+        self.rebuilds = 0
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _build(self, config, signature):
+        """Compose index and atomically replace existing one."""
+        os.makedirs(self.indexdir, exist_ok=True)
+        data = _compose(self.confdir, self.savedir, config, signature)
+        fd, tmppath = tempfile.mkstemp(dir=self.indexdir, prefix="." + config)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmppath, os.path.join(self.indexdir, config))
+        except BaseException:
+            os.unlink(tmppath)
+            raise
+        self.rebuilds += 1
+
+    def _open(self, config, signature):
+        """Open index of config that is up to date. Returns None if there is no such index."""
+        try:
+            index = _Index(os.path.join(self.indexdir, config))
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+        if index.signature != signature or index.confdir != self.confdir:
+            return None
+        return index
+
+    def _index(self, config):
+        # Index built from config changed after this signature was taken is
+        # recorded with old signature and thus rebuilt on next access.
+        signature = _signature(self.confdir, self.savedir, config)
+        with self._lock:
+            index = self._indexes.get(config)
+            if index is not None and index.signature == signature:
+                return index
+        if signature[:4] == (-1, -1, -1, -1):
+            raise UciExceptionNotFound()
+        index = self._open(config, signature)
+        if index is None:
+            self._build(config, signature)
+            # Index might be already replaced by other process with newer one
+            # and that is fine as well.
+            index = _Index(os.path.join(self.indexdir, config))
+        with self._lock:
+            # Previous mapping is left to garbage collector as other threads might use it
+            self._indexes[config] = index
+        return index
+
+    def get_all(self, config, section=None, option=None):
+        """Same as Uci.get_all but values are read from mapped index."""
+        config, section, option = split_path(config, section, option)
+        index = self._index(config)
+        if section is None:
+            return index.all()
+        if option is None:
+            return index.section_options(section)
+        return index.option(section, option)
+
+    def get(self, config, section=None, option=None, dtype=str, **kwargs):
+        """Get configuration value from mapped index.
+
+        This has same semantics as EUci.get() including path given as single
+        "config.section.option" string, extended section syntax "@type[index]"
+        and keyword arguments "dtype", "list" and "default".
+        """
+        check_get_kwargs(kwargs)
+        config, section, option = split_path(config, section, option)
+        try:
+            index = self._index(config)
+            if section is None:
+                return index.all()
+            if option is None:
+                values = index.section_type(section)
+            else:
+                values = index.option(section, option)
+        except UciExceptionNotFound:
+            if 'default' not in kwargs:
+                raise
+            values = kwargs['default']
+        if section is None:
+            return values
+        return EUci._typed(values, EUci._converter(dtype), kwargs)
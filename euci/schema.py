@@ -0,0 +1,121 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Compiled schemas for typed reading of whole sections.
+
+Schema is declared once and compiled to list of converters so reading of section
+does just single lookup and conversion of every option without any further
+dispatch on data type.
+"""
+from uci import UciExceptionNotFound
+from . import _CONVERTERS
+
+_REQUIRED = object()
+
+
+class Option:
+    """Declaration of single option of schema.
+
+    dtype: data type of value. Supported types are same as for EUci.get().
+    list: True if value should always be tuple, False if it should never be
+        tuple and None to keep value as it is.
+    default: value used if option is not present in section (or if it is
+        empty list and list is False). It is used as it is without any
+        conversion. UciExceptionNotFound is raised for missing option if no
+        default is provided.
+    """
+    __slots__ = ('dtype', 'list', 'default')
+
+    def __init__(self, dtype=str, list=None, default=_REQUIRED):
+        self.dtype = dtype
+        self.list = list
+        self.default = default
+
+    def __repr__(self):
+        if self.default is _REQUIRED:
+            return "Option({!r}, list={!r})".format(self.dtype, self.list)
+        return "Option({!r}, list={!r}, default={!r})".format(self.dtype, self.list, self.default)
+
+
+def _compile(convert, is_list):
+    """Returns function converting raw value to typed one with given list handling."""
+    if is_list is None:
+        return lambda value: tuple(map(convert, value)) if isinstance(value, tuple) else convert(value)
+    if is_list:
+        return lambda value: tuple(map(convert, value)) if isinstance(value, tuple) else (convert(value),)
+    return lambda value: convert(value[0]) if isinstance(value, tuple) else convert(value)
+
+
+class Schema:
+    """Compiled schema of section options. Use EUci.schema() to create it."""
+
+    def __init__(self, options, factory=None):
+        self.factory = factory
+        self._fields = []
+        for name, option in options.items():
+            if not isinstance(option, Option):
+                option = Option(option)
+            convert = _CONVERTERS.get(option.dtype)
+            if convert is None:
+                raise TypeError("'{}' is not supported type of data".format(option.dtype))
+            scalar = option.list is not None and not option.list
+            self._fields.append((name, _compile(convert, option.list), option.default, scalar))
+
+    def convert(self, values):
+        """Convert dictionary of raw section values as returned by Uci.get_all()."""
+        result = self.typed(values)
+        if self.factory is not None:
+            return self.factory(**result)
+        return result
+
+    def typed(self, values):
+        """Convert dictionary of raw section values to dictionary of typed values.
+
+        This is same as convert() with exception that factory is not used.
+        """
+        result = {}
+        for name, convert, default, scalar in self._fields:
+            value = values.get(name, _REQUIRED)
+            if value is _REQUIRED or (scalar and value == ()):
+                # Empty list has no value to be used as single one
+                if default is _REQUIRED:
+                    raise UciExceptionNotFound("Option '{}' is missing".format(name))
+                result[name] = default
+            else:
+                result[name] = convert(value)
+        return result
+
+    def read_section(self, uci, config, section):
+        """Read and convert section from given Uci instance.
+
+        Returns dictionary of typed values or result of factory.
+        """
+        return self.convert(uci.get_all(config, section))
+
+    def read_package(self, uci, config, section_type=None):
+        """Read and convert all sections of given type (or all sections) of config.
+
+        Returns dictionary mapping section names to results of read_section().
+        """
+        return {name: self.convert(values) for name, values in uci.foreach(config, section_type)}
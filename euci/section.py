@@ -0,0 +1,153 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Compact immutable section objects.
+
+Section is tuple of section name, section type and values of options. Names of
+options are not stored in sections but in classes of sections shared by all
+sections with same set of options (layout). Keys and string values are interned so
+they are shared between sections as well. Sections are hashable if all their
+values are hashable (which is true for all types supported by EUci).
+"""
+import sys
+import weakref
+
+# Classes are kept only while there are sections using them so layouts of configs
+# that are no longer read do not accumulate.
+_LAYOUTS = weakref.WeakValueDictionary()
+
+
+def _intern(value):
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is tuple:
+        return tuple(_intern(val) for val in value)
+    return value
+
+
+class Section(tuple):
+    """Immutable section of config.
+
+    Option values are accessible same way as with dictionary (section["option"]) or
+    as attributes (section.option). Name and type of section are accessible as
+    attributes "name" and "type". Attributes of section ("name", "type", "keys",
+    "values", "items", "get", "count", "index" and names starting with
+    underscore) take precedence over options with same names so such options
+    are accessible only as section["option"]. Options are ordered by name.
+
+    Use section() to create instances.
+    """
+    __slots__ = ()
+    _keys = ()
+    _index = {}
+
+    @property
+    def name(self):
+        """Name of section."""
+        return tuple.__getitem__(self, 0)
+
+    @property
+    def type(self):
+        """Type of section."""
+        return tuple.__getitem__(self, 1)
+
+    def __getitem__(self, key):
+        try:
+            return tuple.__getitem__(self, self._index[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __getattr__(self, attr):
+        index = self._index.get(attr)
+        if index is None:
+            raise AttributeError("Section has no option '{}'".format(attr))
+        return tuple.__getitem__(self, index)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Section is immutable")
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return tuple.__getitem__(self, slice(2, None))
+
+    def items(self):
+        return tuple(zip(self._keys, self.values()))
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Section):
+            return NotImplemented
+        return self._keys == other._keys and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self._keys, tuple.__hash__(self)))
+
+    def __reduce__(self):
+        return (section, (self.name, self.type, dict(self.items())))
+
+    def __repr__(self):
+        return "Section({!r}, {!r}, {{{}}})".format(
+            self.name, self.type, ", ".join("{!r}: {!r}".format(key, value) for key, value in self.items()))
+
+
+def _layout(keys):
+    """Returns class of sections with given sorted tuple of option names."""
+    cls = _LAYOUTS.get(keys)
+    if cls is None:
+        keys = tuple(sys.intern(key) for key in keys)
+        cls = type("Section", (Section,), {
+            "__slots__": (),
+            "__module__": __name__,
+            "_keys": keys,
+            "_index": {key: i for i, key in enumerate(keys, 2)},
+        })
+        # Other thread might have created same layout in meantime
+        cls = _LAYOUTS.setdefault(keys, cls)
+    return cls
+
+
+def section(name, section_type, values):
+    """Create section of given name and type with dictionary of option values."""
+    keys = tuple(sorted(values))
+    cls = _layout(keys)
+    return tuple.__new__(cls, (sys.intern(name), sys.intern(section_type),
+                               *(_intern(values[key]) for key in keys)))
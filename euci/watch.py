@@ -0,0 +1,319 @@
+# Copyright (c) 2026, CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above copyright
+#      notice, this list of conditions and the following disclaimer in the
+#      documentation and/or other materials provided with the distribution.
+#    * Neither the name of the CZ.NIC nor the
+#      names of its contributors may be used to endorse or promote products
+#      derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL CZ.NIC BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""Watching of config changes using inotify.
+
+Watcher is notified by kernel when config file in confdir or delta file in
+savedir is written, replaced or removed. Events are debounced, only affected
+configs are reloaded and compared with their previous content and changed
+sections and options are reported. This is available only on Linux.
+"""
+import asyncio
+import collections
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+
+from uci import UciExceptionNotFound
+
+# Constants from sys/inotify.h
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ONLYDIR = 0x01000000
+_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE | _IN_ONLYDIR
+_EVENT = struct.Struct("iIII")
+
+_LOGGER = logging.getLogger(__name__)
+
+_LIBC = None
+
+
+def _libc():
+    global _LIBC
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return _LIBC
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+Event = collections.namedtuple("Event", ("config", "sections", "options"))
+Event.__doc__ = """Change of config.
+
+config: name of changed config
+sections: frozenset of names of sections that were added, removed or modified
+options: frozenset of (section, option) tuples of options that were added,
+    removed or modified
+"""
+
+
+def _changes(config, old, new):
+    """Returns Event describing differences between two snapshots or None if they are same."""
+    if old == new:
+        return None
+    old = old or {}
+    new = new or {}
+    sections = set()
+    options = set()
+    for name in old.keys() | new.keys():
+        otype, ooptions = old.get(name, (None, {}))
+        ntype, noptions = new.get(name, (None, {}))
+        if otype != ntype:
+            sections.add(name)
+        for option in ooptions.keys() | noptions.keys():
+            if ooptions.get(option) != noptions.get(option):
+                sections.add(name)
+                options.add((name, option))
+    return Event(config, frozenset(sections), frozenset(options))
+
+
+class Watcher:
+    """Watcher of changes of configs.
+
+    configs: iterable of names of watched configs. All configs are watched if
+        not provided.
+    confdir and savedir: locations of configs and their deltas. Defaults of
+        libuci are used if they are not provided.
+    debounce: time in seconds to wait for other changes after first one. This
+        merges multiple changes done in quick succession to single event.
+    context: Uci object that unloads every changed config without unsaved
+        changes so it reads new content on next access.
+
+    Events can be received with read(), by iteration (including asynchronous
+    iteration) or by callback called from thread started by start().
+    """
+
+    def __init__(self, configs=None, confdir=None, savedir=None, debounce=0.05, context=None):
+        from . import EUci
+        self._uci = EUci(confdir=confdir, savedir=savedir)
+        self.confdir = self._uci.confdir()
+        self.savedir = self._uci.savedir()
+        self.debounce = debounce
+        self._configs = None if configs is None else frozenset(configs)
+        self._context = context
+        self._closed = False
+        self._thread = None
+        self._pending = []
+        # Descriptors are closed by the last reader once watcher is closed
+        self._lock = threading.Lock()
+        self._readers = 0
+
+        libc = _libc()
+        self._fd = _check(libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+        self._wake = os.pipe()
+        try:
+            # libuci creates savedir on first save so we do the same to be able to watch it
+            os.makedirs(self.savedir, exist_ok=True)
+            for path in (self.confdir, self.savedir):
+                _check(libc.inotify_add_watch(self._fd, os.fsencode(path), _MASK))
+            self._snapshots = {config: self._snapshot(config) for config in self._watched()}
+        except BaseException:
+            self._close_fds()
+            raise
+
+    def _watched(self):
+        return self._configs if self._configs is not None else self._uci.list_configs()
+
+    def _snapshot(self, config):
+        """Load current content of config. Returns None if config does not exist."""
+        self._uci.unload(config)
+        try:
+            values = self._uci.get_all(config)
+        except UciExceptionNotFound:
+            return None
+        return {info.name: (info.type, values[info.name]) for info in self._uci.sections(config)}
+
+    def fileno(self):
+        """File descriptor of inotify instance. It is readable when there are changes."""
+        return self._fd
+
+    def _drain(self):
+        """Read all pending inotify events and return set of affected configs."""
+        configs = set()
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    # Some events were lost so we have to check everything
+                    configs.update(self._snapshots)
+                    configs.update(self._watched())
+                elif name and not name.startswith("."):  # Temporary files are hidden
+                    configs.add(name)
+        if self._configs is not None:
+            configs &= self._configs
+        return configs
+
+    def _reload(self, configs):
+        """Reload given configs and return list of events for those that changed."""
+        events = []
+        for config in sorted(configs):
+            snapshot = self._snapshot(config)
+            event = _changes(config, self._snapshots.get(config), snapshot)
+            self._snapshots[config] = snapshot
+            if event is not None:
+                if self._context is not None and config not in self._context.dirty_packages():
+                    self._context.unload(config)
+                events.append(event)
+        return events
+
+    def _enter(self):
+        """Register reader of descriptors. Returns False if watcher is closed."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._readers += 1
+            return True
+
+    def _leave(self):
+        """Unregister reader of descriptors and close them if it was the last one of closed watcher."""
+        with self._lock:
+            self._readers -= 1
+            last = self._closed and not self._readers
+        if last:
+            self._close_fds()
+
+    def _wait(self, fds, timeout):
+        """Wait until any of given descriptors is readable. Returns True if inotify is readable."""
+        while True:
+            try:
+                readable, _, _ = select.select(fds, [], [], timeout)
+                return self._fd in readable
+            except InterruptedError:
+                continue
+
+    def read(self, timeout=None):
+        """Wait for changes and return list of events.
+
+        Empty list is returned if there was no change before timeout (in
+        seconds) or if watcher was closed.
+        """
+        if self._pending:
+            events, self._pending = self._pending, []
+            return events
+        if not self._enter():
+            return []
+        try:
+            if not self._wait((self._fd, self._wake[0]), timeout):
+                return []
+            if self.debounce and not self._closed:
+                self._wait((self._wake[0],), self.debounce)
+            if self._closed:
+                return []
+            return self._reload(self._drain())
+        finally:
+            self._leave()
+
+    def __iter__(self):
+        while not self._closed:
+            yield from self.read()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        while not self._pending:
+            if not self._enter():
+                raise StopAsyncIteration
+            try:
+                readable = loop.create_future()
+                for fd in (self._fd, self._wake[0]):
+                    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+                try:
+                    await readable
+                finally:
+                    for fd in (self._fd, self._wake[0]):
+                        loop.remove_reader(fd)
+                if self._closed:
+                    raise StopAsyncIteration
+                await asyncio.sleep(self.debounce)
+                self._pending.extend(await loop.run_in_executor(None, self._reload, self._drain()))
+            finally:
+                self._leave()
+        return self._pending.pop(0)
+
+    def start(self, callback):
+        """Call callback with every event from new thread until watcher is closed.
+
+        Exceptions raised by callback are logged and following events are
+        still delivered.
+        """
+        if self._thread is not None:
+            raise RuntimeError("Watcher thread is already running")
+
+        def run():
+            for event in self:
+                try:
+                    callback(event)
+                except Exception:
+                    _LOGGER.exception("Callback of watcher failed for event %r", event)
+        self._thread = threading.Thread(target=run, name="euci-watch", daemon=True)
+        self._thread.start()
+
+    def _close_fds(self):
+        for fd in (self._fd, *self._wake):
+            os.close(fd)
+
+    def close(self):
+        """Stop watching. Thread started by start() is joined.
+
+        Readers waiting in other threads or event loops are woken up and
+        descriptors are closed once the last of them returns.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            os.write(self._wake[1], b"\0")
+            last = not self._readers
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if last:
+            self._close_fds()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -26,3 +26,18 @@ const char *pytable_string(PyObject *pyobj, int index) {
 		return NULL;
 	return PyUnicode_AsUTF8(str);
 }
+
+PyObject *pytable_tuple_slice(PyObject *pyobj, Py_ssize_t start) {
+	if (PyTuple_Check(pyobj))
+		return PyTuple_GetSlice(pyobj, start, PyTuple_Size(pyobj));
+	else if (PyList_Check(pyobj)) {
+		PyObject *list = PyList_GetSlice(pyobj, start, PyList_Size(pyobj));
+		if (!list)
+			return NULL;
+		PyObject *ret = PyList_AsTuple(list);
+		Py_DECREF(list);
+		return ret;
+	}
+	PyErr_SetNone(PyExc_NotImplementedError);
+	return NULL;
+}
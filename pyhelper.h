@@ -26,6 +26,8 @@
 bool is_pytable(PyObject *pyobj);
 Py_ssize_t pytable_size(PyObject *pyobj);
 const char *pytable_string(PyObject *pyobj, int index);
+// Returns new tuple with items of table starting at given index.
+PyObject *pytable_tuple_slice(PyObject *pyobj, Py_ssize_t start);
 
 
 #endif /* _PYHELPER_H_ */
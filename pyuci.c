@@ -19,33 +19,304 @@
 #include "pyuci.h"
 #include <uci.h>
 #include <stdio.h>
+#include <strings.h>
+#include <stdint.h>
+#include <stdarg.h>
+#include <dirent.h>
+#include <time.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/file.h>
+#include <sys/stat.h>
 #include "pyhelper.h"
 
 // Uci exceptions
 static PyObject *UciException;
 static PyObject *UciExcNotFound;
 
+// Maximum number of methods tracked by statistics
+#define STATS_METHODS 64
+
+struct stats_method {
+	const char *name;
+	unsigned long calls;
+	double total, max;
+};
+
+// Optional statistics of Uci object (see Uci.set_stats). They are allocated only
+// when enabled so disabled statistics cost just a pointer check.
+struct uci_stats {
+	struct stats_method methods[STATS_METHODS];
+	size_t methods_cnt;
+	unsigned long loads, commits, cache_hits, cache_misses;
+	unsigned long long commit_bytes;
+	double load_time, commit_time;
+	// Callback called for calls that took at least slow_threshold seconds
+	PyObject *slow_callback;
+	double slow_threshold;
+};
+
 // Python Uci object handle
 typedef struct {
 	PyObject_HEAD
 	struct uci_context *ctx;
-	bool tainted;
+	// Names of packages modified since their last save, commit or revert
+	char **dirty;
+	size_t dirty_cnt, dirty_size;
+	// Incremented on every change that might invalidate libuci pointers
+	unsigned long generation;
+	// Per package index of sections (see type_index)
+	PyObject *type_index;
+	// Per package cache of lookups (see cached_lookup)
+	PyObject *path_cache;
+	// Per package index of option values (see value_index)
+	PyObject *value_index;
+	// Lock serializing access to context (see uci_lock)
+	PyThread_type_lock lock;
+	unsigned long lock_owner;
+	unsigned lock_depth;
+	// Statistics or NULL if disabled
+	struct uci_stats *stats;
+	// Pool this object is leased from (see ContextPool)
+	PyObject *pool;
+	// Object was returned to pool and can't be used until it is leased again
+	bool released;
+	// Signatures of files of loaded packages for pooled object (see load_signature)
+	PyObject *signatures;
 } uci_object;
 
+// Run given statement without holding GIL. This is intended for libuci calls that
+// might block on file access. Object lock has to be held so context is protected.
+#define WITHOUT_GIL(STMT) do { Py_BEGIN_ALLOW_THREADS STMT; Py_END_ALLOW_THREADS } while (0)
+
+// Acquire object lock. Lock is reentrant for thread that already holds it.
+// GIL is released while waiting so thread holding the lock can continue.
+static bool uci_lock(uci_object *self) {
+	if (!self->lock) {
+		PyErr_SetString(UciException, "Uci object is not initialized");
+		return false;
+	}
+	unsigned long ident = PyThread_get_thread_ident();
+	if (self->lock_depth && self->lock_owner == ident) {
+		self->lock_depth++;
+		return true;
+	}
+	if (!PyThread_acquire_lock(self->lock, NOWAIT_LOCK))
+		WITHOUT_GIL(PyThread_acquire_lock(self->lock, WAIT_LOCK));
+	if (self->released) {
+		PyThread_release_lock(self->lock);
+		PyErr_SetString(UciException, "Uci object was returned to pool");
+		return false;
+	}
+	self->lock_owner = ident;
+	self->lock_depth = 1;
+	return true;
+}
+
+static void uci_unlock(uci_object *self) {
+	if (--self->lock_depth == 0)
+		PyThread_release_lock(self->lock);
+}
+
+// Find element of given name in list
+static struct uci_element *find_element(struct uci_list *list, const char *name) {
+	struct uci_element *e;
+	uci_foreach_element(list, e)
+		if (!strcmp(e->name, name))
+			return e;
+	return NULL;
+}
+
+// Remove package (or all packages if NULL) from given dictionary of indexes
+static void index_invalidate(PyObject *index, const char *package) {
+	if (!index)
+		return;
+	if (!package) {
+		PyDict_Clear(index);
+		return;
+	}
+	if (PyDict_GetItemString(index, package) && PyDict_DelItemString(index, package))
+		PyErr_Clear();
+}
+
+// Invalidate lookup caches that hold libuci pointers of given package (or of any
+// package if NULL is passed). Value index is kept as it holds no pointers and
+// operations that modify values keep it up to date (see value_index_set).
+static void lookups_invalidate(uci_object *self, const char *package) {
+	self->generation++;
+	PyObject *type, *value, *traceback;
+	PyErr_Fetch(&type, &value, &traceback); // We might be called in error state
+	index_invalidate(self->type_index, package);
+	index_invalidate(self->path_cache, package);
+	PyErr_Restore(type, value, traceback);
+}
+
+// Drop value index of given package (or of all packages if NULL is passed)
+static void value_index_drop(uci_object *self, const char *package) {
+	PyObject *type, *value, *traceback;
+	PyErr_Fetch(&type, &value, &traceback);
+	index_invalidate(self->value_index, package);
+	PyErr_Restore(type, value, traceback);
+}
+
+// Invalidate anything that holds libuci pointers or content of given package (or
+// of any package if NULL is passed)
+static void pyuci_invalidate(uci_object *self, const char *package) {
+	lookups_invalidate(self, package);
+	value_index_drop(self, package);
+}
+
+static bool dirty_check(uci_object *self, const char *name) {
+	size_t i;
+	for (i = 0; i < self->dirty_cnt; i++)
+		if (!strcmp(self->dirty[i], name))
+			return true;
+	return false;
+}
+
+static bool dirty_mark(uci_object *self, const char *name) {
+	if (dirty_check(self, name))
+		return true;
+	if (self->dirty_cnt == self->dirty_size) {
+		size_t size = self->dirty_size ? 2 * self->dirty_size : 4;
+		char **dirty = realloc(self->dirty, size * sizeof *dirty);
+		if (!dirty) {
+			PyErr_NoMemory();
+			return false;
+		}
+		self->dirty = dirty;
+		self->dirty_size = size;
+	}
+	if (!(self->dirty[self->dirty_cnt] = strdup(name))) {
+		PyErr_NoMemory();
+		return false;
+	}
+	self->dirty_cnt++;
+	return true;
+}
+
+static void dirty_clear(uci_object *self, const char *name) {
+	size_t i;
+	for (i = 0; i < self->dirty_cnt; i++)
+		if (!strcmp(self->dirty[i], name)) {
+			free(self->dirty[i]);
+			self->dirty[i] = self->dirty[--self->dirty_cnt];
+			return;
+		}
+}
+
+static void dirty_free(uci_object *self) {
+	size_t i;
+	for (i = 0; i < self->dirty_cnt; i++)
+		free(self->dirty[i]);
+	free(self->dirty);
+	self->dirty = NULL;
+	self->dirty_cnt = self->dirty_size = 0;
+}
+
+static double monotonic(void) {
+	struct timespec ts;
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+static void stats_free(uci_object *self) {
+	if (!self->stats)
+		return;
+	Py_XDECREF(self->stats->slow_callback);
+	free(self->stats);
+	self->stats = NULL;
+}
+
+// Record call of method that started at given time (zero if statistics were
+// disabled at that time). Slow callback is called if configured.
+static PyObject *stats_method(uci_object *self, const char *name, double start, PyObject *ret) {
+	struct uci_stats *stats = self->stats;
+	if (!stats || !start)
+		return ret;
+	double duration = monotonic() - start;
+	size_t i;
+	// Names are string literals of method wrappers so pointers can be compared
+	for (i = 0; i < stats->methods_cnt && stats->methods[i].name != name; i++);
+	if (i == stats->methods_cnt && i < STATS_METHODS)
+		stats->methods[stats->methods_cnt++].name = name;
+	if (i < stats->methods_cnt) {
+		struct stats_method *m = &stats->methods[i];
+		m->calls++;
+		m->total += duration;
+		if (duration > m->max)
+			m->max = duration;
+	}
+
+	if (!stats->slow_callback || duration < stats->slow_threshold)
+		return ret;
+	// Callback might modify statistics or raise so we preserve state of call
+	PyObject *callback = stats->slow_callback, *type, *value, *traceback;
+	Py_INCREF(callback);
+	PyErr_Fetch(&type, &value, &traceback);
+	PyObject *res = PyObject_CallFunction(callback, "sd", name, duration);
+	if (res)
+		Py_DECREF(res);
+	else
+		PyErr_WriteUnraisable(callback);
+	PyErr_Restore(type, value, traceback);
+	Py_DECREF(callback);
+	return ret;
+}
+
+// Commit package and record it in statistics
+static int commit_package(uci_object *self, struct uci_package **p) {
+	int err;
+	double start = self->stats ? monotonic() : 0;
+	WITHOUT_GIL(err = uci_commit(self->ctx, p, false));
+	if (!self->stats || err || !*p)
+		return err;
+	self->stats->commits++;
+	self->stats->commit_time += monotonic() - start;
+	char *path;
+	struct stat st;
+	if (asprintf(&path, "%s/%s", self->ctx->confdir, (*p)->e.name) >= 0) {
+		if (!stat(path, &st))
+			self->stats->commit_bytes += st.st_size;
+		free(path);
+	}
+	return err;
+}
+
 static void uci_dealloc(uci_object *self) {
 	if (self->ctx != NULL)
 		uci_free_context(self->ctx);
+	dirty_free(self);
+	Py_XDECREF(self->type_index);
+	Py_XDECREF(self->path_cache);
+	Py_XDECREF(self->value_index);
+	if (self->lock)
+		PyThread_free_lock(self->lock);
+	stats_free(self);
+	Py_XDECREF(self->pool);
+	Py_XDECREF(self->signatures);
+	Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
 static int uci_init(uci_object *self, PyObject *args, PyObject *kwds) {
+	if (!self->lock && !(self->lock = PyThread_allocate_lock())) {
+		PyErr_NoMemory();
+		return -1;
+	}
+	if (!uci_lock(self))
+		return -1;
 	if (self->ctx) // reinitialization so first free previous one
 		uci_free_context(self->ctx);
-	self->tainted = false;
+	pyuci_invalidate(self, NULL);
+	dirty_free(self);
 	self->ctx = uci_alloc_context();
 	if (self->ctx == NULL) {
+		uci_unlock(self);
 		PyErr_SetString(UciException, "Cannot allocate uci context.");
-		return 0;
+		return -1;
 	}
+	// We rely on saved deltas being kept in package to know if commit is needed
+	self->ctx->flags |= UCI_FLAG_SAVED_DELTA;
 	static const char *keys[] = {"savedir", "confdir", NULL};
 	const char *savedir = NULL, *confdir = NULL;
 	PyArg_ParseTupleAndKeywords(args, kwds, "|ss", (char**)keys, &savedir, &confdir);
@@ -54,6 +325,7 @@ static int uci_init(uci_object *self, PyObject *args, PyObject *kwds) {
 		uci_set_savedir(self->ctx, savedir);
 	if (confdir)
 		uci_set_confdir(self->ctx, confdir);
+	uci_unlock(self);
 	return 0;
 }
 
@@ -62,29 +334,483 @@ static PyObject *pyuci_enter(uci_object *self, PyObject *args) {
 		PyErr_SetString(UciException, "Entering with non-initialized object is invalid");
 		return NULL;
 	}
+	Py_INCREF(self);
 	return (PyObject*)self;
 }
 
-static void commit_all(struct uci_context *ctx) {
-	struct uci_ptr ptr;
-	memset(&ptr, 0, sizeof ptr);
-	struct uci_element *e, *tmp;
-	uci_foreach_element_safe(&ctx->root, tmp, e) {
-		struct uci_package *p = uci_to_package(e);
-		if (ptr.p && (ptr.p != p))
+// Mode of configuration files created by commit (same as used by libuci)
+#define COMMIT_FILEMODE 0600
+
+// Grouped commit of multiple packages (see commit_packages)
+struct commit_entry {
+	struct uci_package *p;
+	struct uci_package *merged; // Package that is written (p or merged copy)
+	struct uci_context *ctx; // Context of merged package
+	char *name; // Copy of package name as package is unloaded after commit
+	char *path; // Configuration file as referenced by package
+	char *target; // Resolved configuration file that is replaced
+	char *tmp; // Temporary file written in place of configuration file
+	char *backup; // Hard link to original configuration file used for rollback
+	bool created; // If temporary file was created and not renamed yet
+	bool linked; // If backup was created
+	bool renamed; // If configuration file was replaced
+	FILE *conf; // Locked configuration file
+	FILE *delta; // Locked delta file in savedir or NULL if there is none
+	FILE *f;
+	char *error; // Error message or NULL
+	char *warning; // Problem after config was committed or NULL
+};
+
+// Set error message of entry from errno if there is no error already
+static void commit_errno(struct commit_entry *c) {
+	if (!c->error)
+		c->error = strdup(strerror(errno));
+}
+
+// Set error message of entry from error of given context
+static void commit_uci_error(struct commit_entry *c, struct uci_context *ctx) {
+	if (!c->error)
+		uci_get_errorstr(ctx, &c->error, NULL);
+}
+
+static void commit_warning(struct commit_entry *c, const char *what) {
+	if (!c->warning && asprintf(&c->warning, "%s: %s", what, strerror(errno)) < 0)
+		c->warning = NULL;
+}
+
+static int commit_entry_cmp(const void *a, const void *b) {
+	return strcmp((*(struct commit_entry *const *)a)->path, (*(struct commit_entry *const *)b)->path);
+}
+
+// Open and lock configuration file same way as libuci does on commit. This does
+// not require GIL.
+static void commit_lock(struct commit_entry *c) {
+	int fd = open(c->path, O_RDWR | O_CREAT, COMMIT_FILEMODE);
+	if (fd < 0) {
+		commit_errno(c);
+		return;
+	}
+	if ((flock(fd, LOCK_EX) && errno != ENOSYS) || !(c->conf = fdopen(fd, "r"))) {
+		commit_errno(c);
+		close(fd);
+		return;
+	}
+	if (!(c->target = realpath(c->path, NULL))) {
+		commit_errno(c);
+		return;
+	}
+	// Temporary file has to be in same directory so it can be renamed
+	const char *slash = strrchr(c->target, '/');
+	if (asprintf(&c->tmp, "%.*s/.%s.uci-XXXXXX", (int)(slash - c->target), c->target, c->name) < 0 ||
+			asprintf(&c->backup, "%s.orig", c->tmp) < 0) {
+		c->tmp = c->backup = NULL;
+		c->error = strdup(strerror(ENOMEM));
+	}
+}
+
+// Open and lock delta file of package in savedir if there is any. This does not
+// require GIL.
+static void commit_lock_delta(uci_object *self, struct commit_entry *c) {
+	char *path;
+	if (asprintf(&path, "%s/%s", self->ctx->savedir, c->name) < 0) {
+		c->error = strdup(strerror(ENOMEM));
+		return;
+	}
+	int fd = open(path, O_RDWR);
+	free(path);
+	if (fd < 0) {
+		if (errno != ENOENT)
+			commit_errno(c);
+		return;
+	}
+	if ((flock(fd, LOCK_EX) && errno != ENOSYS) || !(c->delta = fdopen(fd, "r"))) {
+		commit_errno(c);
+		close(fd);
+	}
+}
+
+// Perform change of given delta command. Pointer is not looked up yet.
+static int delta_apply(struct uci_context *ctx, enum uci_command cmd, struct uci_ptr *ptr) {
+	int err = UCI_ERR_INVAL;
+	switch (cmd) {
+	case UCI_CMD_REORDER:
+		if (ptr->value && !ptr->option && !(err = uci_lookup_ptr(ctx, ptr, NULL, false)))
+			err = ptr->s ? uci_reorder_section(ctx, ptr->s, strtoul(ptr->value, NULL, 10)) : UCI_ERR_NOTFOUND;
+		break;
+	case UCI_CMD_RENAME:
+		if (ptr->value)
+			err = uci_rename(ctx, ptr);
+		break;
+	case UCI_CMD_REMOVE:
+		err = uci_delete(ctx, ptr);
+		break;
+	case UCI_CMD_LIST_ADD:
+		if (ptr->option)
+			err = uci_add_list(ctx, ptr);
+		break;
+	case UCI_CMD_LIST_DEL:
+		if (ptr->option)
+			err = uci_del_list(ctx, ptr);
+		break;
+	default:
+		err = uci_set(ctx, ptr);
+		if (!err && cmd == UCI_CMD_ADD && !ptr->option && ptr->last)
+			uci_to_section(ptr->last)->anonymous = true;
+	}
+	return err;
+}
+
+// Apply changes recorded in delta file to package. This mirrors loading of delta
+// files in libuci including that invalid lines are ignored.
+static void commit_apply_delta(struct uci_context *ctx, struct uci_package *p, FILE *f) {
+	rewind(f);
+	while (!feof(f) && !ferror(f)) {
+		char *str = NULL, *arg = NULL;
+		if (uci_parse_argument(ctx, f, &str, &arg) || !arg || !*arg)
+			continue;
+		int cmd = UCI_CMD_CHANGE;
+		switch (*arg) {
+		case '^': cmd = UCI_CMD_REORDER; break;
+		case '-': cmd = UCI_CMD_REMOVE; break;
+		case '@': cmd = UCI_CMD_RENAME; break;
+		case '+': cmd = UCI_CMD_ADD; break;
+		case '|': cmd = UCI_CMD_LIST_ADD; break;
+		case '~': cmd = UCI_CMD_LIST_DEL; break;
+		}
+		if (cmd != UCI_CMD_CHANGE)
+			arg++;
+		struct uci_ptr ptr;
+		if (uci_parse_ptr(ctx, &ptr, arg) || !ptr.package || strcmp(ptr.package, p->e.name) ||
+				!ptr.section || (ptr.flags & UCI_LOOKUP_EXTENDED))
+			continue;
+		delta_apply(ctx, cmd, &ptr);
+	}
+}
+
+// Prepare content of package to be written. Package is reimported from locked
+// configuration file and all saved deltas (including ours) are applied to it in
+// separate context so changes committed or saved by others are not lost. This is
+// what uci_commit does. Packages outside of confdir are written as they are. This
+// does not require GIL.
+static void commit_merge(uci_object *self, struct uci_context *ctx, struct commit_entry *c) {
+	c->merged = c->p;
+	c->ctx = self->ctx;
+	if (!c->p->has_delta)
+		return;
+	if (!uci_list_empty(&c->p->delta) && uci_save(self->ctx, c->p)) {
+		commit_uci_error(c, self->ctx);
+		return;
+	}
+	commit_lock_delta(self, c);
+	if (c->error)
+		return;
+	c->merged = NULL;
+	c->ctx = ctx;
+	if (uci_import(ctx, c->conf, c->name, &c->merged, true) || !c->merged) {
+		commit_uci_error(c, ctx);
+		return;
+	}
+	struct uci_element *e;
+	uci_foreach_element(&self->ctx->delta_path, e) {
+		if (!strcmp(e->name, self->ctx->savedir))
+			continue;
+		char *path;
+		if (asprintf(&path, "%s/%s", e->name, c->name) < 0) {
+			c->error = strdup(strerror(ENOMEM));
+			return;
+		}
+		FILE *f = fopen(path, "r");
+		free(path);
+		if (!f)
+			continue;
+		if (!flock(fileno(f), LOCK_SH) || errno == ENOSYS)
+			commit_apply_delta(ctx, c->merged, f);
+		fclose(f);
+	}
+	if (c->delta)
+		commit_apply_delta(ctx, c->merged, c->delta);
+}
+
+// Write package to temporary file next to configuration file. This does not
+// require GIL.
+static void commit_write(struct commit_entry *c) {
+	struct stat st;
+	mode_t mode = stat(c->target, &st) ? COMMIT_FILEMODE : st.st_mode & 07777;
+	int fd = mkstemp(c->tmp);
+	if (fd < 0) {
+		commit_errno(c);
+		return;
+	}
+	c->created = true;
+	if (fchmod(fd, mode) || !(c->f = fdopen(fd, "w"))) {
+		commit_errno(c);
+		if (!c->f)
+			close(fd);
+		return;
+	}
+	if (uci_export(c->ctx, c->f, c->merged, false))
+		commit_uci_error(c, c->ctx);
+}
+
+// Flush and sync written temporary file. This does not require GIL.
+static void commit_sync(struct commit_entry *c) {
+	if (fflush(c->f) || fsync(fileno(c->f)))
+		commit_errno(c);
+	if (fclose(c->f))
+		commit_errno(c);
+	c->f = NULL;
+}
+
+// Check if given files are in the same directory
+static bool same_dir(const char *a, const char *b) {
+	const char *sa = strrchr(a, '/'), *sb = strrchr(b, '/');
+	return sa - a == sb - b && !strncmp(a, b, sa - a);
+}
+
+// Sync directory of given file so rename is persistent. This does not require GIL.
+static int commit_sync_dir(const char *path) {
+	const char *slash = strrchr(path, '/');
+	char *dir = strndup(path, slash == path ? 1 : slash - path);
+	if (!dir)
+		return -1;
+	int fd = open(dir, O_RDONLY | O_DIRECTORY);
+	free(dir);
+	if (fd < 0)
+		return -1;
+	int ret = fsync(fd);
+	close(fd);
+	return ret;
+}
+
+// Replace configuration files with temporary files. Original files are kept as
+// hard links until all of them are replaced so they can be restored if some
+// rename fails. Returns false if nothing was replaced. This does not require GIL.
+static bool commit_rename(struct commit_entry *entries, size_t cnt) {
+	size_t i;
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		if (link(c->target, c->backup)) {
+			commit_errno(c);
+			return false;
+		}
+		c->linked = true;
+	}
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		if (rename(c->tmp, c->target)) {
+			commit_errno(c);
+			break;
+		}
+		c->created = false;
+		c->renamed = true;
+	}
+	if (i == cnt)
+		return true;
+	while (i--) {
+		struct commit_entry *c = &entries[i];
+		if (rename(c->backup, c->target)) {
+			commit_warning(c, "Restore of original config failed");
+			continue;
+		}
+		c->linked = false;
+		c->renamed = false;
+	}
+	return false;
+}
+
+// Commit given packages at once. Configuration files of all packages are locked
+// and their content is merged with changes saved by others as uci_commit does.
+// Packages are then written to temporary files and synced and only if that
+// succeeds for all of them they are renamed to place of configuration files.
+// Saved deltas are cleared at the end and packages are unloaded. Returns list of
+// committed configs or NULL with UciException that has dictionary of errors of
+// configs as second argument.
+static PyObject *commit_packages(uci_object *self, struct uci_package **pkgs, size_t cnt) {
+	struct commit_entry *entries = calloc(cnt ? cnt : 1, sizeof *entries);
+	struct commit_entry **order = calloc(cnt ? cnt : 1, sizeof *order);
+	struct uci_context *ctx = uci_alloc_context();
+	PyObject *ret = NULL, *errors = NULL;
+	size_t i;
+	bool failed = false;
+	if (!entries || !order || !ctx) {
+		PyErr_NoMemory();
+		cnt = 0;
+		goto exit;
+	}
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		c->p = pkgs[i];
+		order[i] = c;
+		if (c->p->path)
+			c->path = strdup(c->p->path);
+		else if (asprintf(&c->path, "%s/%s", self->ctx->confdir, c->p->e.name) < 0)
+			c->path = NULL;
+		if (!c->path || !(c->name = strdup(c->p->e.name))) {
+			PyErr_NoMemory();
+			goto exit;
+		}
+		pyuci_invalidate(self, c->name);
+	}
+	// Files are always locked in same order so concurrent commits can't deadlock
+	qsort(order, cnt, sizeof *order, commit_entry_cmp);
+
+	double start = self->stats ? monotonic() : 0;
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; !failed && i < cnt; i++) {
+		commit_lock(order[i]);
+		failed = order[i]->error;
+	}
+	for (i = 0; !failed && i < cnt; i++) {
+		commit_merge(self, ctx, &entries[i]);
+		failed = entries[i].error;
+	}
+	for (i = 0; !failed && i < cnt; i++)
+		commit_write(&entries[i]);
+	for (i = 0; i < cnt; i++)
+		if (entries[i].f)
+			commit_sync(&entries[i]);
+	for (i = 0; i < cnt; i++)
+		failed = failed || entries[i].error;
+	if (!failed && !commit_rename(entries, cnt))
+		failed = true;
+	const char *synced = NULL;
+	for (i = 0; !failed && i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		// Configs are committed at this point so problems are only reported
+		if (c->delta && ftruncate(fileno(c->delta), 0))
+			commit_warning(c, "Clear of saved changes failed");
+		// Directory is synced only once if configs are in the same one
+		if (synced && same_dir(synced, c->target))
+			continue;
+		if (commit_sync_dir(c->target))
+			commit_warning(c, "Sync of directory failed");
+		synced = c->target;
+	}
+	Py_END_ALLOW_THREADS
+
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		if (!c->renamed)
 			continue;
-		ptr.p = p;
-		uci_commit(ctx, &p, false);
+		dirty_clear(self, c->name);
+		if (self->stats) {
+			struct stat st;
+			self->stats->commits++;
+			if (!stat(c->target, &st))
+				self->stats->commit_bytes += st.st_size;
+		}
+		// Content is reloaded from written file on next access
+		uci_unload(self->ctx, c->p);
+	}
+	if (self->stats && !failed)
+		self->stats->commit_time += monotonic() - start;
+	for (i = 0; i < cnt; i++)
+		if (entries[i].warning && PyErr_WarnFormat(PyExc_RuntimeWarning, 1,
+				"Config %s: %s", entries[i].name, entries[i].warning))
+			goto exit;
+
+	if (!(errors = PyDict_New()) || !(ret = PyList_New(0)))
+		goto exit;
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		PyObject *name = PyUnicode_FromString(c->name), *msg = NULL;
+		if (!name)
+			goto exit;
+		int err = 0;
+		if (!c->renamed) {
+			msg = PyUnicode_FromString(c->error ? c->error : "Not committed due to error of other config");
+			err = !msg || PyDict_SetItem(errors, name, msg);
+		} else
+			err = PyList_Append(ret, name);
+		Py_DECREF(name);
+		Py_XDECREF(msg);
+		if (err)
+			goto exit;
+	}
+	if (PyDict_Size(errors)) {
+		PyObject *value = Py_BuildValue("(sO)", "Commit of some configs failed", errors);
+		if (value) {
+			PyErr_SetObject(UciException, value);
+			Py_DECREF(value);
+		}
+		Py_CLEAR(ret);
+	}
+
+exit:
+	if (PyErr_Occurred())
+		Py_CLEAR(ret);
+	for (i = 0; i < cnt; i++) {
+		struct commit_entry *c = &entries[i];
+		if (c->f)
+			fclose(c->f);
+		if (c->created)
+			unlink(c->tmp);
+		if (c->linked)
+			unlink(c->backup);
+		// Closing of files releases locks
+		if (c->delta)
+			fclose(c->delta);
+		if (c->conf)
+			fclose(c->conf);
+		free(c->name);
+		free(c->path);
+		free(c->target);
+		free(c->tmp);
+		free(c->backup);
+		free(c->error);
+		free(c->warning);
+	}
+	free(entries);
+	free(order);
+	if (ctx)
+		uci_free_context(ctx);
+	Py_XDECREF(errors);
+	return ret;
+}
+
+// Commit all packages that were modified
+static PyObject *commit_dirty(uci_object *self) {
+	struct uci_package **pkgs = malloc((self->dirty_cnt ? self->dirty_cnt : 1) * sizeof *pkgs);
+	if (!pkgs)
+		return PyErr_NoMemory();
+	size_t i, cnt = 0;
+	for (i = 0; i < self->dirty_cnt; i++) {
+		struct uci_element *e = find_element(&self->ctx->root, self->dirty[i]);
+		if (e)
+			pkgs[cnt++] = uci_to_package(e);
 	}
+	PyObject *ret = commit_packages(self, pkgs, cnt);
+	free(pkgs);
+	return ret;
 }
 
+static bool pool_return(uci_object *self);
+
 static PyObject *pyuci_exit(uci_object *self, PyObject *args) {
+	pyuci_invalidate(self, NULL);
+	bool ok = true;
 	if (self->ctx) {
-		if (self->tainted)
-			commit_all(self->ctx);
+		PyObject *committed = commit_dirty(self);
+		ok = committed != NULL;
+		Py_XDECREF(committed);
+		// Context leased from pool is returned to it instead of being freed
+		if (self->pool) {
+			// Error of commit takes precedence over error of return to pool
+			PyObject *type, *value, *traceback;
+			PyErr_Fetch(&type, &value, &traceback);
+			if (!pool_return(self))
+				ok = false;
+			if (type)
+				PyErr_Restore(type, value, traceback);
+			if (!ok)
+				return NULL;
+			Py_RETURN_NONE;
+		}
 		uci_free_context(self->ctx);
 	}
 	self->ctx = NULL;
+	if (!ok)
+		return NULL;
 	Py_RETURN_NONE;
 }
 
@@ -154,315 +880,3425 @@ static PyObject *pyuci_package(struct uci_package *pkg) {
 	return ret;
 }
 
-// Common arguments lookup (package, section, option)
-static bool lookup_ptr(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
-	memset(ptr, 0, sizeof *ptr);
+// Section metadata as returned by Uci.sections() and Uci.iter_sections()
+static PyTypeObject section_info_type;
 
-	if (!PyArg_ParseTuple(args, "s|ss", &ptr->package, &ptr->section, &ptr->option))
-		return false;
-	if (ptr->section == ptr->option && ptr->option == NULL) {
-		const char *str = ptr->package;
-		memset(ptr, 0, sizeof *ptr);
-		uci_lookup_ptr(self->ctx, ptr, (char*)str, true);
+static PyStructSequence_Field section_info_fields[] = {
+	{"name", "Name of section"},
+	{"type", "Type of section"},
+	{"index", "Index of section in package"},
+	{"anonymous", "If section is anonymous"},
+	{NULL}
+};
+
+static PyStructSequence_Desc section_info_desc = {
+	"uci.SectionInfo",
+	"Section metadata: (name, type, index) with additional anonymous attribute",
+	section_info_fields,
+	3,
+};
+
+static PyObject *section_info(struct uci_section *s, int index) {
+	PyObject *ret = PyStructSequence_New(&section_info_type);
+	if (!ret)
+		return NULL;
+	PyObject *name = PyUnicode_FromString(s->e.name);
+	PyObject *type = PyUnicode_FromString(s->type);
+	PyObject *idx = PyLong_FromLong(index);
+	if (!name || !type || !idx) {
+		Py_XDECREF(name);
+		Py_XDECREF(type);
+		Py_XDECREF(idx);
+		Py_DECREF(ret);
+		return NULL;
 	}
-	uci_lookup_ptr(self->ctx, ptr, NULL, true);
-	return true;
+	PyStructSequence_SET_ITEM(ret, 0, name);
+	PyStructSequence_SET_ITEM(ret, 1, type);
+	PyStructSequence_SET_ITEM(ret, 2, idx);
+	PyStructSequence_SET_ITEM(ret, 3, PyBool_FromLong(s->anonymous));
+	return ret;
 }
 
-static PyObject *pyuci_get_common(uci_object *self, PyObject *args, bool all) {
-	struct uci_ptr ptr;
+static void sections_capsule_free(PyObject *capsule) {
+	free(PyCapsule_GetPointer(capsule, "uci.sections"));
+}
 
-	if (!lookup_ptr(self, args, &ptr))
+// Returns borrowed reference to index of sections in package. Index is created
+// when it does not exist and is kept until package is invalidated.
+// Index is tuple of dictionary and capsule with array of sections. Dictionary
+// maps section type to list of SectionInfo of all sections of that type and it
+// also contains list of all sections under None key. Array of sections is in
+// order of sections in package so SectionInfo.index can be used with it.
+static PyObject *type_index(uci_object *self, struct uci_package *p) {
+	if (!self->type_index && !(self->type_index = PyDict_New()))
 		return NULL;
-	uci_lookup_ptr(self->ctx, &ptr, NULL, true);
-	if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
-		PyErr_SetNone(UciExcNotFound);
+	PyObject *ret = PyDict_GetItemString(self->type_index, p->e.name);
+	if (ret)
+		return ret;
+
+	size_t cnt = 0;
+	struct uci_element *e;
+	uci_foreach_element(&p->sections, e)
+		cnt++;
+	struct uci_section **sections = malloc((cnt ? cnt : 1) * sizeof *sections);
+	if (!sections)
+		return PyErr_NoMemory();
+	PyObject *capsule = PyCapsule_New(sections, "uci.sections", sections_capsule_free);
+	if (!capsule) {
+		free(sections);
 		return NULL;
 	}
-
-	struct uci_element *e = ptr.last;
-	switch(e->type) {
-		case UCI_TYPE_PACKAGE:
-			return pyuci_package(ptr.p);
-		case UCI_TYPE_SECTION:
-			if (all)
-				return pyuci_section(ptr.s);
-			else
-				return Py_BuildValue("s", ptr.s->type);
-		case UCI_TYPE_OPTION:
-			return pyuci_option(ptr.o);
-	default:
-		{
-			char *msg;
-			asprintf(&msg, "Type: %d", e->type);
-			PyErr_SetString(PyExc_NotImplementedError, msg);
-			return NULL;
+	PyObject *types = PyDict_New(), *all = PyList_New(0);
+	if (!types || !all || PyDict_SetItem(types, Py_None, all))
+		goto error;
+	int i = 0;
+	uci_foreach_element(&p->sections, e) {
+		struct uci_section *s = uci_to_section(e);
+		sections[i] = s;
+		PyObject *info = section_info(s, i++);
+		if (!info || PyList_Append(all, info)) {
+			Py_XDECREF(info);
+			goto error;
+		}
+		PyObject *list = PyDict_GetItemString(types, s->type);
+		if (!list) {
+			if (!(list = PyList_New(0)) || PyDict_SetItemString(types, s->type, list)) {
+				Py_XDECREF(list);
+				Py_DECREF(info);
+				goto error;
+			}
+			Py_DECREF(list); // Borrowed reference held by dictionary
 		}
+		int err = PyList_Append(list, info);
+		Py_DECREF(info);
+		if (err)
+			goto error;
 	}
+	if (!(ret = PyTuple_Pack(2, types, capsule)))
+		goto error;
+	if (PyDict_SetItemString(self->type_index, p->e.name, ret)) {
+		Py_DECREF(ret);
+		ret = NULL;
+	} else
+		Py_DECREF(ret); // Borrowed reference held by dictionary
+
+error:
+	Py_XDECREF(types);
+	Py_XDECREF(all);
+	Py_DECREF(capsule);
+	return ret;
 }
 
-static PyObject *pyuci_get(uci_object *self, PyObject *args) {
-	return pyuci_get_common(self, args, false);
+// Signature of file used to detect its change
+static PyObject *file_signature(const char *dir, const char *name) {
+	char *path;
+	if (asprintf(&path, "%s/%s", dir, name) < 0)
+		return PyErr_NoMemory();
+	struct stat st;
+	int err = stat(path, &st);
+	free(path);
+	if (err)
+		Py_RETURN_NONE;
+	return Py_BuildValue("(KKKL)", (unsigned long long)st.st_dev, (unsigned long long)st.st_ino,
+		(unsigned long long)st.st_size, st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec);
 }
 
-static PyObject *pyuci_get_all(uci_object *self, PyObject *args) {
-	return pyuci_get_common(self, args, true);
+// Signature of config file and its delta
+static PyObject *package_signature(uci_object *self, const char *name) {
+	PyObject *conf = file_signature(self->ctx->confdir, name);
+	PyObject *delta = conf ? file_signature(self->ctx->savedir, name) : NULL;
+	if (!delta) {
+		Py_XDECREF(conf);
+		return NULL;
+	}
+	return Py_BuildValue("(NN)", conf, delta);
 }
 
-static PyObject *pyuci_set(uci_object *self, PyObject *args) {
-	struct uci_ptr ptr;
-	memset(&ptr, 0, sizeof ptr);
+// Pooled objects record signatures of packages taken before they are loaded so
+// it can be detected later that loaded package is outdated (see ContextPool).
+// Returns new reference to signature, None for object that is not pooled or NULL
+// on error.
+static PyObject *load_signature(uci_object *self, const char *name) {
+	if (!self->signatures)
+		Py_RETURN_NONE;
+	return package_signature(self, name);
+}
 
-	PyObject *data = NULL;
-	switch (PyTuple_Size(args)) {
-		// TODO variant with just one argument?
-	case 4:
-		// Format: uci.set("p", "s", "o", "v")
-		if (!PyArg_ParseTuple(args, "sssO", &ptr.package, &ptr.section, &ptr.option, &data))
-			return NULL;
-		break;
-	case 3:
-		// Format: uci.set("p", "s", "v")
-		if (!PyArg_ParseTuple(args, "ssO", &ptr.package, &ptr.section, &data))
-			return NULL;
-		break;
-	default:
-		PyErr_SetString(UciException, "Invalid number of arguments passed to Uci.set()");
-		return NULL;
+// Record signature returned by load_signature if package was loaded. Reference
+// to signature is stolen.
+static bool load_signature_set(uci_object *self, const char *name, PyObject *sig, bool loaded) {
+	bool ok = !loaded || sig == Py_None || !PyDict_SetItemString(self->signatures, name, sig);
+	Py_DECREF(sig);
+	return ok;
+}
+
+// Call uci_lookup_ptr. GIL is released if package has to be loaded from file.
+static int lookup_load(uci_object *self, struct uci_ptr *ptr) {
+	if (!ptr->package || find_element(&self->ctx->root, ptr->package))
+		return uci_lookup_ptr(self->ctx, ptr, NULL, true);
+	PyObject *sig = load_signature(self, ptr->package);
+	if (!sig)
+		return -1;
+	int err;
+	double start = self->stats ? monotonic() : 0;
+	WITHOUT_GIL(err = uci_lookup_ptr(self->ctx, ptr, NULL, true));
+	if (self->stats && ptr->p) {
+		self->stats->loads++;
+		self->stats->load_time += monotonic() - start;
 	}
+	if (!load_signature_set(self, ptr->p ? ptr->p->e.name : ptr->package, sig, ptr->p))
+		return -1;
+	return err;
+}
 
-	uci_lookup_ptr(self->ctx, &ptr, NULL, true);
+// Resolve extended section syntax (@type[index]) using type index
+// This returns false only on Python error. Syntax that is not handled here is
+// left to libuci.
+static bool lookup_ext_section(uci_object *self, struct uci_ptr *ptr) {
+	if (ptr->s || !ptr->section || ptr->section[0] != '@')
+		return true;
+	const char *type = ptr->section + 1;
+	const char *bracket = strchr(type, '[');
+	if (!bracket)
+		return true;
+	char *end;
+	long idx = strtol(bracket + 1, &end, 10);
+	if (end == bracket + 1 || end[0] != ']' || end[1] != '\0')
+		return true;
 
-	if (is_pytable(data)) {
-		uci_delete(self->ctx, &ptr);
-		int i;
-		for (i = 0; i < pytable_size(data); i++) {
-			if (!(ptr.value = pytable_string(data, i)))
-				return NULL;
-			if (uci_add_list(self->ctx, &ptr))
-				return pyuci_error(self, UciException);
-		}
-	} else if (PyUnicode_Check(data)) {
-		ptr.value = PyUnicode_AsUTF8(data);
-		if (!ptr.value)
-			return NULL;
-		if (uci_set(self->ctx, &ptr))
-			return pyuci_error(self, UciException);
+	struct uci_ptr pptr;
+	memset(&pptr, 0, sizeof pptr);
+	pptr.package = ptr->package;
+	int err = lookup_load(self, &pptr);
+	if (err < 0)
+		return false;
+	if (err || !pptr.p)
+		return true;
+	PyObject *index = type_index(self, pptr.p);
+	if (!index)
+		return false;
+	PyObject *key = PyUnicode_FromStringAndSize(type, bracket - type);
+	if (!key)
+		return false;
+	PyObject *list = PyDict_GetItemWithError(PyTuple_GET_ITEM(index, 0), key);
+	Py_DECREF(key);
+	if (!list)
+		return !PyErr_Occurred();
+	Py_ssize_t size = PyList_GET_SIZE(list);
+	if (idx < 0)
+		idx += size;
+	if (idx < 0 || idx >= size)
+		return true;
+	struct uci_section **sections = PyCapsule_GetPointer(PyTuple_GET_ITEM(index, 1), "uci.sections");
+	PyObject *info = PyList_GET_ITEM(list, idx);
+	ptr->p = pptr.p;
+	ptr->s = sections[PyLong_AsLong(PyStructSequence_GET_ITEM(info, 2))];
+	ptr->section = ptr->s->e.name;
+	ptr->flags &= ~UCI_LOOKUP_EXTENDED;
+	return true;
+}
+
+// Wrapper on top of uci_lookup_ptr that should be used instead of it
+// It returns -1 on Python error (exception is set) or return code of libuci.
+// String (if not NULL) is modified in place same as in case of uci_lookup_ptr.
+static int pyuci_lookup(uci_object *self, struct uci_ptr *ptr, char *str) {
+	if (str) {
+		int err = uci_parse_ptr(self->ctx, ptr, str);
+		if (err)
+			return err;
+	}
+	if (!lookup_ext_section(self, ptr))
+		return -1;
+	return lookup_load(self, ptr);
+}
+
+// Lookup path given either as "p.s.o" string or as table of up to three strings.
+// String is copied to newly allocated buf because libuci modifies it in place.
+// Caller is responsible for freeing buf (it is set to NULL if not used).
+static bool lookup_path(uci_object *self, PyObject *path, struct uci_ptr *ptr, char **buf) {
+	memset(ptr, 0, sizeof *ptr);
+	*buf = NULL;
+
+	const char *str = NULL;
+	Py_ssize_t size = 1;
+	if (PyUnicode_Check(path)) {
+		if (!(str = PyUnicode_AsUTF8(path)))
+			return false;
+	} else if (is_pytable(path) && (size = pytable_size(path)) >= 1 && size <= 3) {
+		if (!(str = pytable_string(path, 0)))
+			return false;
+		if (size > 1 && !(ptr->section = pytable_string(path, 1)))
+			return false;
+		if (size > 2 && !(ptr->option = pytable_string(path, 2)))
+			return false;
 	} else {
-		PyErr_SetString(UciException, "Unsupported value passed to uci.set()");
-		return NULL;
+		PyErr_SetString(PyExc_TypeError, "Path has to be string or table of one to three strings");
+		return false;
 	}
-	self->tainted = true;
 
-	Py_RETURN_NONE;
+	if (size == 1) {
+		if (!(*buf = strdup(str))) {
+			PyErr_NoMemory();
+			return false;
+		}
+		if (pyuci_lookup(self, ptr, *buf) >= 0)
+			return true;
+		free(*buf);
+		*buf = NULL;
+		return false;
+	}
+	ptr->package = str;
+	return pyuci_lookup(self, ptr, NULL) >= 0;
 }
 
-static PyObject *pyuci_delete(uci_object *self, PyObject *args) {
-	struct uci_ptr ptr;
-	if (!lookup_ptr(self, args, &ptr))
-		return NULL;
+// Maximal number of cached lookups per package
+#define PATH_CACHE_SIZE 256
 
-	uci_delete(self->ctx, &ptr);
-	self->tainted = true;
+// Cached result of lookup with buffer that pointers in it might point to
+struct path_entry {
+	struct uci_ptr ptr;
+	char *buf;
+};
 
-	Py_RETURN_NONE;
+static void path_capsule_free(PyObject *capsule) {
+	struct path_entry *entry = PyCapsule_GetPointer(capsule, "uci.path");
+	free(entry->buf);
+	free(entry);
 }
 
-static PyObject *pyuci_add(uci_object *self, PyObject *args) {
-	// TODO we need findpkg
-	PyErr_SetNone(PyExc_NotImplementedError);
-	self->tainted = true;
-	return NULL;
+// Returns name of package path refers to (new reference) or NULL without
+// exception set if path can't be cached.
+static PyObject *path_package(PyObject *path) {
+	if (PyTuple_CheckExact(path) && PyTuple_GET_SIZE(path) > 1) {
+		PyObject *package = PyTuple_GET_ITEM(path, 0);
+		if (!PyUnicode_CheckExact(package))
+			return NULL;
+		Py_INCREF(package);
+		return package;
+	}
+	if (PyTuple_CheckExact(path) && PyTuple_GET_SIZE(path) == 1)
+		path = PyTuple_GET_ITEM(path, 0);
+	if (!PyUnicode_CheckExact(path))
+		return NULL;
+	Py_ssize_t dot = PyUnicode_FindChar(path, '.', 0, PyUnicode_GET_LENGTH(path), 1);
+	if (dot == -2)
+		return NULL;
+	if (dot == -1) {
+		Py_INCREF(path);
+		return path;
+	}
+	return PyUnicode_Substring(path, 0, dot);
 }
 
-static PyObject *pyuci_rename(uci_object *self, PyObject *args) {
-	struct uci_ptr ptr;
-	memset(&ptr, 0, sizeof ptr);
+// Same as lookup_path but result of complete lookup is cached and reused until
+// package is invalidated. Path has to be string or tuple to be cached.
+static bool cached_lookup(uci_object *self, PyObject *path, struct uci_ptr *ptr, char **buf) {
+	if (!self->path_cache && !(self->path_cache = PyDict_New()))
+		return false;
+	PyObject *package = path_package(path);
+	if (!package) {
+		if (PyErr_Occurred())
+			return false;
+		return lookup_path(self, path, ptr, buf);
+	}
+	PyObject *cache = PyDict_GetItemWithError(self->path_cache, package);
+	Py_DECREF(package);
+	PyObject *capsule = cache ? PyDict_GetItemWithError(cache, path) : NULL;
+	if (capsule) {
+		*ptr = ((struct path_entry*)PyCapsule_GetPointer(capsule, "uci.path"))->ptr;
+		*buf = NULL;
+		if (self->stats)
+			self->stats->cache_hits++;
+		return true;
+	}
+	if (self->stats && !PyErr_Occurred())
+		self->stats->cache_misses++;
+	if (PyErr_Occurred() || !lookup_path(self, path, ptr, buf))
+		return false;
+	if (!(ptr->flags & UCI_LOOKUP_COMPLETE))
+		return true;
+
+	// Cache is stored under real package name so it is correctly invalidated
+	if (!(cache = PyDict_GetItemString(self->path_cache, ptr->p->e.name))) {
+		if (!(cache = PyDict_New()) || PyDict_SetItemString(self->path_cache, ptr->p->e.name, cache)) {
+			Py_XDECREF(cache);
+			goto error;
+		}
+		Py_DECREF(cache); // Borrowed reference held by dictionary
+	} else if (PyDict_Size(cache) >= PATH_CACHE_SIZE)
+		PyDict_Clear(cache);
+	struct path_entry *entry = malloc(sizeof *entry);
+	if (!entry) {
+		PyErr_NoMemory();
+		goto error;
+	}
+	entry->ptr = *ptr;
+	entry->buf = *buf; // Ownership is passed to cache
+	*buf = NULL;
+	if (!(capsule = PyCapsule_New(entry, "uci.path", path_capsule_free))) {
+		free(entry->buf);
+		free(entry);
+		goto error;
+	}
+	int err = PyDict_SetItem(cache, path, capsule);
+	Py_DECREF(capsule);
+	if (err)
+		goto error;
+	return true;
+
+error:
+	free(*buf);
+	*buf = NULL;
+	return false;
+}
+
+// Convert found element to python representation
+static PyObject *pyuci_element(struct uci_ptr *ptr, bool all) {
+	struct uci_element *e = ptr->last;
+	switch(e->type) {
+		case UCI_TYPE_PACKAGE:
+			return pyuci_package(ptr->p);
+		case UCI_TYPE_SECTION:
+			if (all)
+				return pyuci_section(ptr->s);
+			else
+				return Py_BuildValue("s", ptr->s->type);
+		case UCI_TYPE_OPTION:
+			return pyuci_option(ptr->o);
+	default:
+		PyErr_Format(PyExc_NotImplementedError, "Type: %d", e->type);
+		return NULL;
+	}
+}
+
+// Functions converting string value to Python object of some type
+typedef PyObject *(*typed_func)(const char *value);
+
+static const struct {
+	const char *word;
+	bool value;
+} bool_words[] = {
+	{"0", false},
+	{"no", false},
+	{"off", false},
+	{"false", false},
+	{"disabled", false},
+	{"1", true},
+	{"yes", true},
+	{"on", true},
+	{"true", true},
+	{"enabled", true},
+};
+
+static PyObject *typed_bool(const char *value) {
+	size_t i;
+	for (i = 0; i < sizeof(bool_words) / sizeof(*bool_words); i++)
+		if (!strcasecmp(value, bool_words[i].word))
+			return PyBool_FromLong(bool_words[i].value);
+	// Value is reported in lower case same as by EUci
+	PyObject *str = PyUnicode_FromString(value);
+	PyObject *lower = str ? PyObject_CallMethod(str, "lower", NULL) : NULL;
+	if (lower)
+		PyErr_Format(PyExc_ValueError, "invalid value '%U' for bool type", lower);
+	Py_XDECREF(str);
+	Py_XDECREF(lower);
+	return NULL;
+}
+
+static PyObject *typed_int(const char *value) {
+	return PyLong_FromString(value, NULL, 10);
+}
+
+static PyObject *typed_str(const char *value) {
+	return PyUnicode_FromString(value);
+}
+
+// Returns converter for given dtype or NULL with exception set if not supported
+static typed_func typed_converter(PyObject *dtype) {
+	if (dtype == (PyObject*)&PyBool_Type)
+		return typed_bool;
+	if (dtype == (PyObject*)&PyLong_Type)
+		return typed_int;
+	if (dtype == (PyObject*)&PyUnicode_Type || dtype == Py_None)
+		return typed_str;
+	PyErr_Format(PyExc_TypeError, "'%R' is not supported type of data", dtype);
+	return NULL;
+}
+
+// Convert found section type or option value using given converter
+static PyObject *typed_element(struct uci_ptr *ptr, typed_func convert) {
+	if (ptr->last->type == UCI_TYPE_SECTION)
+		return convert(ptr->s->type);
+	if (ptr->o->type == UCI_TYPE_STRING)
+		return convert(ptr->o->v.string);
+
+	struct uci_element *e;
+	Py_ssize_t i = 0;
+	uci_foreach_element(&ptr->o->v.list, e)
+		i++;
+	PyObject *ret = PyTuple_New(i);
+	if (!ret)
+		return NULL;
+	i = 0;
+	uci_foreach_element(&ptr->o->v.list, e) {
+		PyObject *value = convert(e->name);
+		if (!value) {
+			Py_DECREF(ret);
+			return NULL;
+		}
+		PyTuple_SET_ITEM(ret, i++, value);
+	}
+	return ret;
+}
+
+static PyObject *pyuci_get_common(uci_object *self, PyObject *args, bool all, typed_func convert) {
+	struct uci_ptr ptr;
+	char *buf;
+
+	if (!cached_lookup(self, args, &ptr, &buf))
+		return NULL;
+	PyObject *ret = NULL;
+	if (!(ptr.flags & UCI_LOOKUP_COMPLETE))
+		PyErr_SetNone(UciExcNotFound);
+	else if (convert && ptr.last->type != UCI_TYPE_PACKAGE)
+		ret = typed_element(&ptr, convert);
+	else
+		ret = pyuci_element(&ptr, all);
+	free(buf);
+	return ret;
+}
+
+static PyObject *pyuci_get(uci_object *self, PyObject *args, PyObject *kwds) {
+	typed_func convert = NULL;
+	// Format: uci.get("p", "s", "o", dtype=bool)
+	if (kwds && PyDict_Size(kwds)) {
+		PyObject *dtype = PyDict_GetItemString(kwds, "dtype");
+		if (!dtype || PyDict_Size(kwds) > 1) {
+			PyErr_SetString(PyExc_TypeError, "Uci.get() accepts only dtype keyword argument");
+			return NULL;
+		}
+		if (!(convert = typed_converter(dtype)))
+			return NULL;
+	}
+	return pyuci_get_common(self, args, false, convert);
+}
+
+static PyObject *pyuci_get_all(uci_object *self, PyObject *args) {
+	return pyuci_get_common(self, args, true, NULL);
+}
+
+// Get value for single path or provided default if it is not found.
+// Default can be NULL and in such case UciExceptionNotFound is raised.
+static PyObject *pyuci_get_path(uci_object *self, PyObject *path, PyObject *def) {
+	struct uci_ptr ptr;
+	char *buf;
+	if (!cached_lookup(self, path, &ptr, &buf))
+		return NULL;
+
+	PyObject *ret = NULL;
+	if (ptr.flags & UCI_LOOKUP_COMPLETE)
+		ret = pyuci_element(&ptr, false);
+	else if (def) {
+		Py_INCREF(def);
+		ret = def;
+	} else
+		PyErr_Format(UciExcNotFound, "%R", path);
+	free(buf);
+	return ret;
+}
+
+static PyObject *pyuci_get_many(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"paths", "default", NULL};
+	PyObject *paths, *def = NULL;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", (char**)keys, &paths, &def))
+		return NULL;
+
+	PyObject *path, *value;
+	if (PyDict_Check(paths)) {
+		// Format: uci.get_many({path: default, ...})
+		PyObject *ret = PyDict_New();
+		if (!ret)
+			return NULL;
+		Py_ssize_t pos = 0;
+		PyObject *pdef;
+		while (PyDict_Next(paths, &pos, &path, &pdef)) {
+			if (!(value = pyuci_get_path(self, path, pdef)) || PyDict_SetItem(ret, path, value)) {
+				Py_XDECREF(value);
+				Py_DECREF(ret);
+				return NULL;
+			}
+			Py_DECREF(value);
+		}
+		return ret;
+	}
+
+	// Format: uci.get_many([path, ...], default=None)
+	PyObject *iter = PyObject_GetIter(paths);
+	if (!iter)
+		return NULL;
+	PyObject *ret = PyList_New(0);
+	while (ret && (path = PyIter_Next(iter))) {
+		value = pyuci_get_path(self, path, def);
+		Py_DECREF(path);
+		if (!value || PyList_Append(ret, value))
+			Py_CLEAR(ret);
+		Py_XDECREF(value);
+	}
+	Py_DECREF(iter);
+	if (PyErr_Occurred())
+		Py_CLEAR(ret);
+	return ret;
+}
+
+// Following op_* functions implement modifications shared by their standalone
+// methods and Uci.apply(). They return false with exception set on error and
+// fill in ptr so caller can see what package was affected.
+
+// Add value of option to value index
+static bool value_index_add(PyObject *index, const char *value, PyObject *entry) {
+	PyObject *list = PyDict_GetItemString(index, value);
+	if (list) {
+		// List can contain same value multiple times
+		Py_ssize_t size = PyList_GET_SIZE(list);
+		if (size && PyList_GET_ITEM(list, size - 1) == entry)
+			return true;
+		return !PyList_Append(list, entry);
+	}
+	if (!(list = PyList_New(0)) || PyList_Append(list, entry) || PyDict_SetItemString(index, value, list)) {
+		Py_XDECREF(list);
+		return false;
+	}
+	Py_DECREF(list); // Borrowed reference held by dictionary
+	return true;
+}
+
+// Add values of option to value index
+static bool value_index_option(PyObject *index, struct uci_section *s, struct uci_option *o) {
+	PyObject *entry = Py_BuildValue("(sss)", s->e.name, o->e.name, s->type);
+	if (!entry)
+		return false;
+	bool ok = true;
+	if (o->type == UCI_TYPE_STRING)
+		ok = value_index_add(index, o->v.string, entry);
+	else {
+		struct uci_element *e;
+		uci_foreach_element(&o->v.list, e)
+			if (!(ok = value_index_add(index, e->name, entry)))
+				break;
+	}
+	Py_DECREF(entry);
+	return ok;
+}
+
+// Remove entries of option from list of value index
+static bool value_index_remove_value(PyObject *index, const char *value, struct uci_option *o) {
+	PyObject *list = PyDict_GetItemString(index, value);
+	if (!list)
+		return true;
+	Py_ssize_t i = PyList_GET_SIZE(list);
+	while (i--) {
+		PyObject *entry = PyList_GET_ITEM(list, i);
+		if (!PyUnicode_CompareWithASCIIString(PyTuple_GET_ITEM(entry, 0), o->section->e.name) &&
+				!PyUnicode_CompareWithASCIIString(PyTuple_GET_ITEM(entry, 1), o->e.name) &&
+				PyList_SetSlice(list, i, i + 1, NULL))
+			return false;
+	}
+	return PyList_GET_SIZE(list) || !PyDict_DelItemString(index, value);
+}
+
+// Remove values of option from value index
+static bool value_index_remove(PyObject *index, struct uci_option *o) {
+	if (o->type == UCI_TYPE_STRING)
+		return value_index_remove_value(index, o->v.string, o);
+	struct uci_element *e;
+	uci_foreach_element(&o->v.list, e)
+		if (!value_index_remove_value(index, e->name, o))
+			return false;
+	return true;
+}
+
+// Returns borrowed reference to value index of package if it was already built
+static PyObject *value_index_built(uci_object *self, struct uci_package *p) {
+	return self->value_index ? PyDict_GetItemString(self->value_index, p->e.name) : NULL;
+}
+
+// Remove entries of option or section (depending on pointer) that is going to be
+// modified from value index
+static bool value_index_unset(PyObject *index, struct uci_ptr *ptr) {
+	if (ptr->option)
+		return !ptr->o || value_index_remove(index, ptr->o);
+	if (!ptr->s)
+		return true;
+	struct uci_element *e;
+	uci_foreach_element(&ptr->s->options, e)
+		if (!value_index_remove(index, uci_to_option(e)))
+			return false;
+	return true;
+}
+
+// Add entries of option or section (depending on pointer) that was set to value
+// index
+// Section is looked up again as setting might have replaced it.
+static bool value_index_set(PyObject *index, struct uci_ptr *ptr) {
+	struct uci_element *e = find_element(&ptr->p->sections, ptr->section);
+	if (!e)
+		return true;
+	struct uci_section *s = uci_to_section(e);
+	uci_foreach_element(&s->options, e)
+		if ((!ptr->option || !strcmp(e->name, ptr->option)) && !value_index_option(index, s, uci_to_option(e)))
+			return false;
+	return true;
+}
+
+static bool set_value(uci_object *self, struct uci_ptr *ptr, PyObject *data);
+
+static bool op_set(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
+	memset(ptr, 0, sizeof *ptr);
+
+	PyObject *data = NULL;
+	switch (PyTuple_Size(args)) {
+		// TODO variant with just one argument?
+	case 4:
+		// Format: uci.set("p", "s", "o", "v")
+		if (!PyArg_ParseTuple(args, "sssO", &ptr->package, &ptr->section, &ptr->option, &data))
+			return false;
+		break;
+	case 3:
+		// Format: uci.set("p", "s", "v")
+		if (!PyArg_ParseTuple(args, "ssO", &ptr->package, &ptr->section, &data))
+			return false;
+		break;
+	default:
+		PyErr_SetString(UciException, "Invalid number of arguments passed to Uci.set()");
+		return false;
+	}
+
+	if (pyuci_lookup(self, ptr, NULL) < 0)
+		return false;
+	// Value index is updated instead of being rebuilt on next use
+	PyObject *index = ptr->p ? value_index_built(self, ptr->p) : NULL;
+	Py_XINCREF(index);
+	bool indexed = index && value_index_unset(index, ptr);
+	if (index && !indexed)
+		PyErr_Clear(); // Index is dropped bellow
+	bool ok = set_value(self, ptr, data);
+	if (index && !(indexed && ok && value_index_set(index, ptr))) {
+		if (ok)
+			PyErr_Clear(); // Failed update of index is not an error of operation
+		value_index_drop(self, ptr->p->e.name);
+	}
+	Py_XDECREF(index);
+	return ok;
+}
+
+// Set value (string or table of strings) to option of already looked up pointer
+static bool set_value(uci_object *self, struct uci_ptr *ptr, PyObject *data) {
+	if (is_pytable(data)) {
+		if (ptr->o)
+			uci_delete(self->ctx, ptr);
+		int i;
+		for (i = 0; i < pytable_size(data); i++) {
+			if (!(ptr->value = pytable_string(data, i)))
+				return false;
+			if (uci_add_list(self->ctx, ptr)) {
+				pyuci_error(self, UciException);
+				return false;
+			}
+		}
+	} else if (PyUnicode_Check(data)) {
+		ptr->value = PyUnicode_AsUTF8(data);
+		if (!ptr->value)
+			return false;
+		if (uci_set(self->ctx, ptr)) {
+			pyuci_error(self, UciException);
+			return false;
+		}
+	} else {
+		PyErr_SetString(UciException, "Unsupported value passed to uci.set()");
+		return false;
+	}
+	return true;
+}
+
+static bool op_delete(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
+	// Path can be passed as single table as well (such as in Uci.apply)
+	if (PyTuple_Check(args) && PyTuple_GET_SIZE(args) == 1 && is_pytable(PyTuple_GET_ITEM(args, 0)))
+		args = PyTuple_GET_ITEM(args, 0);
+	char *buf;
+	if (!lookup_path(self, args, ptr, &buf))
+		return false;
+	// Deleting what does not exist is not an error
+	if (!(ptr->flags & UCI_LOOKUP_COMPLETE)) {
+		free(buf);
+		return true;
+	}
+
+	// Value index is updated instead of being rebuilt on next use
+	PyObject *index = value_index_built(self, ptr->p);
+	bool indexed = index && value_index_unset(index, ptr);
+	if (index && !indexed)
+		PyErr_Clear(); // Failed update of index is not an error of operation
+	bool ok = !uci_delete(self->ctx, ptr);
+	if (!ok)
+		pyuci_error(self, UciException);
+	if (index && !(indexed && ok))
+		value_index_drop(self, ptr->p->e.name);
+	// Names in pointer might point to buffer so only ptr->p can be used further
+	free(buf);
+	return ok;
+}
+
+static bool op_rename(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
+	memset(ptr, 0, sizeof *ptr);
 
 	switch(PyTuple_Size(args)) {
 		// TODO? Format: uci.rename("p.s.o=v") or uci.set("p.s=v")
 	case 4:
 		// Format: uci.rename("p", "s", "o", "v")
-		if (!PyArg_ParseTuple(args, "ssss", &ptr.package, &ptr.section, &ptr.option, &ptr.value))
-			return NULL;
+		if (!PyArg_ParseTuple(args, "ssss", &ptr->package, &ptr->section, &ptr->option, &ptr->value))
+			return false;
 		break;
 	case 3:
 		// Format: uci.rename("p", "s", "v")
-		if (!PyArg_ParseTuple(args, "sss", &ptr.package, &ptr.section, &ptr.value))
-			return NULL;
+		if (!PyArg_ParseTuple(args, "sss", &ptr->package, &ptr->section, &ptr->value))
+			return false;
 		break;
 	default:
 		PyErr_SetString(UciException, "Invalid number of arguments passed to Uci.rename()");
-		return NULL;
+		return false;
 	}
 
-	if (uci_lookup_ptr(self->ctx, &ptr, NULL, true))
-		return pyuci_error(self, UciException);
+	int err = pyuci_lookup(self, ptr, NULL);
+	if (err) {
+		if (err > 0)
+			pyuci_error(self, UciException);
+		return false;
+	}
 
-	if (((ptr.s == NULL) && (ptr.option != NULL)) || (ptr.value == NULL)) {
+	if (((ptr->s == NULL) && (ptr->option != NULL)) || (ptr->value == NULL)) {
 		// TODO really?
 		PyErr_SetString(UciException, "Internal uci error");
-		return NULL;
+		return false;
 	}
 
-	if(uci_rename(self->ctx, &ptr))
-		return pyuci_error(self, UciException);
-	self->tainted = true;
+	// Value index refers to elements by their names
+	value_index_drop(self, ptr->p->e.name);
+	if(uci_rename(self->ctx, ptr)) {
+		pyuci_error(self, UciException);
+		return false;
+	}
+	return true;
+}
 
+static bool op_reorder(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
+	memset(ptr, 0, sizeof *ptr);
+	int pos = 0;
+
+	// Format: uci.reorder("p", "s", v)
+	if (!PyArg_ParseTuple(args, "ssi", &ptr->package, &ptr->section, &pos))
+		return false;
+
+	int err = pyuci_lookup(self, ptr, NULL);
+	if (err) {
+		if (err > 0)
+			pyuci_error(self, UciException);
+		return false;
+	}
+
+	if (ptr->s == NULL) {
+		PyErr_SetNone(UciExcNotFound);
+		return false;
+	}
+
+	if(uci_reorder_section(self->ctx, ptr->s, pos)) {
+		pyuci_error(self, UciException);
+		return false;
+	}
+	return true;
+}
+
+static bool op_add(uci_object *self, PyObject *args, struct uci_ptr *ptr) {
+	memset(ptr, 0, sizeof *ptr);
+	const char *type;
+
+	// Format: uci.add("p", "t")
+	if (!PyArg_ParseTuple(args, "ss", &ptr->package, &type))
+		return false;
+
+	int err = pyuci_lookup(self, ptr, NULL);
+	if (err) {
+		if (err > 0)
+			pyuci_error(self, UciException);
+		return false;
+	}
+
+	struct uci_section *s;
+	if (uci_add_section(self->ctx, ptr->p, type, &s)) {
+		pyuci_error(self, UciException);
+		return false;
+	}
+	ptr->s = s;
+	ptr->section = s->e.name;
+	return true;
+}
+
+// Invalidate and mark package modified by operation as dirty
+// Invalidation is done even if operation failed as it might be partially done.
+// Value index is kept as operations update it themselves.
+static PyObject *pyuci_modified(uci_object *self, struct uci_ptr *ptr, bool ok) {
+	if (ptr->p)
+		lookups_invalidate(self, ptr->p->e.name);
+	if (!ok)
+		return NULL;
+	if (ptr->p && !dirty_mark(self, ptr->p->e.name))
+		return NULL;
 	Py_RETURN_NONE;
 }
 
-static PyObject *pyuci_reorder(uci_object *self, PyObject *args) {
+static PyObject *pyuci_set(uci_object *self, PyObject *args) {
 	struct uci_ptr ptr;
-	memset(&ptr, 0, sizeof ptr);
-	int pos = 0;
+	return pyuci_modified(self, &ptr, op_set(self, args, &ptr));
+}
 
-	// Format: uci.reorder("p", "s", v)
-	if (!PyArg_ParseTuple(args, "ssi", &ptr.package, &ptr.section, &pos))
+static PyObject *pyuci_delete(uci_object *self, PyObject *args) {
+	struct uci_ptr ptr;
+	return pyuci_modified(self, &ptr, op_delete(self, args, &ptr));
+}
+
+static PyObject *pyuci_add(uci_object *self, PyObject *args) {
+	struct uci_ptr ptr;
+	PyObject *ret = pyuci_modified(self, &ptr, op_add(self, args, &ptr));
+	if (!ret)
 		return NULL;
+	Py_DECREF(ret);
+	return PyUnicode_FromString(ptr.section);
+}
 
-	if (uci_lookup_ptr(self->ctx, &ptr, NULL, true))
-		return pyuci_error(self, UciException);
+// Set options from mapping to newly added section
+static bool add_options(uci_object *self, struct uci_ptr *ptr, PyObject *options) {
+	PyObject *items = PyMapping_Items(options);
+	if (!items)
+		return false;
+	bool ok = true;
+	Py_ssize_t i;
+	for (i = 0; ok && i < PyList_GET_SIZE(items); i++) {
+		PyObject *item = PyList_GET_ITEM(items, i);
+		// Section is new so there is no need to look up option
+		ptr->o = NULL;
+		ptr->flags = UCI_LOOKUP_DONE;
+		ok = (ptr->option = PyUnicode_AsUTF8(PyTuple_GET_ITEM(item, 0))) &&
+			set_value(self, ptr, PyTuple_GET_ITEM(item, 1));
+	}
+	Py_DECREF(items);
+	return ok;
+}
 
-	if ((ptr.s == NULL)  || (ptr.value == NULL)) {
-		// TODO really?
-		PyErr_SetString(UciException, "Internal uci error");
+static PyObject *pyuci_add_many(uci_object *self, PyObject *args) {
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	const char *type;
+	PyObject *sections;
+	// Format: uci.add_many("p", "t", [{"o": "v"}, ...])
+	if (!PyArg_ParseTuple(args, "ssO", &ptr.package, &type, &sections))
+		return NULL;
+
+	int err = pyuci_lookup(self, &ptr, NULL);
+	if (err) {
+		if (err > 0)
+			pyuci_error(self, UciException);
 		return NULL;
 	}
+	struct uci_package *p = ptr.p;
 
-	if(uci_reorder_section(self->ctx, ptr.s, pos))
-		return pyuci_error(self, UciException);
-	self->tainted = true;
+	PyObject *iter = PyObject_GetIter(sections), *options;
+	if (!iter)
+		return NULL;
+	PyObject *ret = PyList_New(0);
+	while (ret && (options = PyIter_Next(iter))) {
+		struct uci_section *s;
+		PyObject *name = NULL;
+		if (uci_add_section(self->ctx, p, type, &s))
+			pyuci_error(self, UciException);
+		else {
+			memset(&ptr, 0, sizeof ptr);
+			ptr.p = p;
+			ptr.s = s;
+			ptr.package = p->e.name;
+			ptr.section = s->e.name;
+			if (add_options(self, &ptr, options))
+				name = PyUnicode_FromString(s->e.name);
+		}
+		Py_DECREF(options);
+		if (!name || PyList_Append(ret, name))
+			Py_CLEAR(ret);
+		Py_XDECREF(name);
+	}
+	Py_DECREF(iter);
+	if (PyErr_Occurred())
+		Py_CLEAR(ret);
 
-	Py_RETURN_NONE;
+	// Sections added before failure are kept same as with Uci.apply
+	pyuci_invalidate(self, p->e.name);
+	if (!dirty_mark(self, p->e.name))
+		Py_CLEAR(ret);
+	return ret;
 }
 
-enum pkg_cmd {
-	CMD_SAVE,
-	CMD_COMMIT,
-	CMD_REVERT
+static PyObject *pyuci_rename(uci_object *self, PyObject *args) {
+	struct uci_ptr ptr;
+	return pyuci_modified(self, &ptr, op_rename(self, args, &ptr));
+}
+
+static PyObject *pyuci_reorder(uci_object *self, PyObject *args) {
+	struct uci_ptr ptr;
+	return pyuci_modified(self, &ptr, op_reorder(self, args, &ptr));
+}
+
+static const struct {
+	const char *name;
+	bool (*func)(uci_object *self, PyObject *args, struct uci_ptr *ptr);
+} apply_ops[] = {
+	{"set", op_set},
+	{"add", op_add},
+	{"delete", op_delete},
+	{"rename", op_rename},
+	{"reorder", op_reorder},
+	{NULL}
+};
+
+// Run single operation for Uci.apply(). Operation is table where first item is
+// name of operation and rest are arguments as for appropriate method.
+static bool apply_op(uci_object *self, PyObject *op, struct uci_ptr *ptr) {
+	memset(ptr, 0, sizeof *ptr);
+	if (!is_pytable(op) || pytable_size(op) < 1) {
+		PyErr_SetString(PyExc_TypeError, "Operation has to be table with operation name as first item");
+		return false;
+	}
+	const char *name = pytable_string(op, 0);
+	if (!name)
+		return false;
+
+	int i;
+	for (i = 0; apply_ops[i].name; i++) {
+		if (strcmp(apply_ops[i].name, name))
+			continue;
+		PyObject *args = pytable_tuple_slice(op, 1);
+		if (!args)
+			return false;
+		bool ret = apply_ops[i].func(self, args, ptr);
+		Py_DECREF(args);
+		return ret;
+	}
+	PyErr_Format(UciException, "Unknown operation passed to Uci.apply(): %s", name);
+	return false;
+}
+
+struct delta_copy {
+	enum uci_command cmd;
+	char *section, *option, *value;
+};
+
+// Package touched by Uci.apply() with its changes done before it was touched
+struct apply_pkg {
+	struct uci_package *p;
+	char *name;
+	struct delta_copy *deltas;
+	size_t deltas_cnt;
 };
 
-static PyObject *package_cmd(uci_object *self, PyObject *args, enum pkg_cmd cmd) {
-	struct uci_ptr ptr;
-	if (!lookup_ptr(self, args, &ptr))
+static void apply_pkg_free(struct apply_pkg *a) {
+	size_t i;
+	for (i = 0; i < a->deltas_cnt; i++) {
+		free(a->deltas[i].section);
+		free(a->deltas[i].option);
+		free(a->deltas[i].value);
+	}
+	free(a->deltas);
+	free(a->name);
+}
+
+static char *strdup_null(const char *str, bool *ok) {
+	char *ret = str ? strdup(str) : NULL;
+	*ok = *ok && (ret || !str);
+	return ret;
+}
+
+// Remember package before it is modified by Uci.apply() so it can be rolled back.
+// Changes are not remembered for package loaded by operation as it had none.
+static bool apply_pkg_init(struct apply_pkg *a, struct uci_package *p, bool loaded) {
+	memset(a, 0, sizeof *a);
+	a->p = p;
+	struct uci_element *e;
+	size_t cnt = 0;
+	if (!loaded)
+		uci_foreach_element(&p->delta, e)
+			cnt++;
+	bool ok = (a->name = strdup(p->e.name)) && (!cnt || (a->deltas = calloc(cnt, sizeof *a->deltas)));
+	uci_foreach_element(&p->delta, e) {
+		if (!ok || a->deltas_cnt == cnt)
+			break;
+		struct uci_delta *h = uci_to_delta(e);
+		struct delta_copy *d = &a->deltas[a->deltas_cnt++];
+		d->cmd = h->cmd;
+		d->section = strdup_null(h->section, &ok);
+		d->option = strdup_null(e->name, &ok);
+		d->value = strdup_null(h->value, &ok);
+	}
+	if (!ok) {
+		apply_pkg_free(a);
+		PyErr_NoMemory();
+	}
+	return ok;
+}
+
+// Roll package back to state before Uci.apply(). Package is reloaded and changes
+// done before are performed again. Changes of packages that are not tracked by
+// deltas (outside of confdir) can't be restored and they are just unloaded.
+static bool apply_pkg_rollback(uci_object *self, struct apply_pkg *a) {
+	pyuci_invalidate(self, a->name);
+	bool tracked = a->p->has_delta;
+	uci_unload(self->ctx, a->p);
+	a->p = NULL;
+	if (!tracked || !a->deltas_cnt)
+		return true; // Package is loaded again on next access
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	ptr.package = a->name;
+	int err = lookup_load(self, &ptr);
+	if (err || !ptr.p) {
+		if (err >= 0)
+			pyuci_error(self, UciException);
+		return false;
+	}
+	size_t i;
+	for (i = 0; i < a->deltas_cnt; i++) {
+		struct delta_copy *d = &a->deltas[i];
+		memset(&ptr, 0, sizeof ptr);
+		ptr.package = a->name;
+		ptr.section = d->section;
+		ptr.option = d->option;
+		ptr.value = d->value;
+		if (delta_apply(self->ctx, d->cmd, &ptr)) {
+			pyuci_error(self, UciException);
+			return false;
+		}
+	}
+	return true;
+}
+
+// Locate or create package that exists only in memory
+static bool memory_package(uci_object *self, const char *name, struct uci_package **p) {
+	struct uci_element *e = find_element(&self->ctx->root, name);
+	if (e) {
+		*p = uci_to_package(e);
+		return true;
+	}
+	static char empty[] = "\n";
+	FILE *f = fmemopen(empty, 1, "r");
+	if (!f) {
+		PyErr_SetFromErrno(PyExc_OSError);
+		return false;
+	}
+	int err = uci_import(self->ctx, f, name, p, true);
+	fclose(f);
+	if (err || !*p) {
+		pyuci_error(self, UciException);
+		return false;
+	}
+	return true;
+}
+
+// Create empty package for config that does not exist. Package is only in memory
+// but it is given path in confdir and changes are tracked so commit creates file.
+static bool create_package(uci_object *self, const char *name, struct uci_package **p) {
+	char *path;
+	if (asprintf(&path, "%s/%s", self->ctx->confdir, name) < 0) {
+		PyErr_NoMemory();
+		return false;
+	}
+	if (!memory_package(self, name, p)) {
+		free(path);
+		return false;
+	}
+	(*p)->path = path; // Freed by libuci with package
+	(*p)->has_delta = true;
+	return true;
+}
+
+// Check if operation adds content so config it modifies is created if missing
+static bool apply_op_creates(PyObject *op) {
+	const char *name = pytable_string(op, 0);
+	if (!name) {
+		PyErr_Clear(); // Reported by operation itself
+		return false;
+	}
+	return !strcmp(name, "set") || !strcmp(name, "add");
+}
+
+// Locate package operation is going to modify if it is already loaded. Package is
+// first part of path that is either separate argument, "p.s.o" string or table.
+// Config that does not exist is created for operations that add content.
+// It returns false only on Python error.
+static bool apply_op_package(uci_object *self, PyObject *op, struct uci_package **p) {
+	*p = NULL;
+	if (!is_pytable(op) || pytable_size(op) < 2)
+		return true;
+	PyObject *path = PySequence_GetItem(op, 1);
+	if (path && is_pytable(path) && pytable_size(path) >= 1) {
+		PyObject *first = PySequence_GetItem(path, 0);
+		Py_DECREF(path);
+		path = first;
+	}
+	const char *str = path && PyUnicode_Check(path) ? PyUnicode_AsUTF8(path) : NULL;
+	char *name = str ? strndup(str, strcspn(str, ".")) : NULL;
+	Py_XDECREF(path);
+	if (!name) {
+		if (str) {
+			PyErr_NoMemory();
+			return false;
+		}
+		PyErr_Clear(); // Invalid operation is reported by operation itself
+		return true;
+	}
+	struct uci_element *e = find_element(&self->ctx->root, name);
+	bool ok = true;
+	if (e)
+		*p = uci_to_package(e);
+	else if (apply_op_creates(op)) {
+		struct uci_ptr ptr;
+		memset(&ptr, 0, sizeof ptr);
+		ptr.package = name;
+		int err = lookup_load(self, &ptr);
+		if (err < 0)
+			ok = false;
+		else if (err == UCI_ERR_NOTFOUND && !ptr.p)
+			ok = create_package(self, name, p);
+		// Package loaded by lookup has no changes to remember and other errors
+		// are reported by operation itself.
+	}
+	free(name);
+	return ok;
+}
+
+// Add package to list of packages touched by Uci.apply() if it is not there yet
+static bool apply_touch(struct apply_pkg **pkgs, size_t *cnt, size_t *size, struct uci_package *p, bool loaded) {
+	size_t i;
+	for (i = 0; i < *cnt; i++)
+		if ((*pkgs)[i].p == p)
+			return true;
+	if (*cnt == *size) {
+		size_t nsize = *size ? 2 * *size : 4;
+		struct apply_pkg *npkgs = realloc(*pkgs, nsize * sizeof *npkgs);
+		if (!npkgs) {
+			PyErr_NoMemory();
+			return false;
+		}
+		*pkgs = npkgs;
+		*size = nsize;
+	}
+	if (!apply_pkg_init(&(*pkgs)[*cnt], p, loaded))
+		return false;
+	(*cnt)++;
+	return true;
+}
+
+static PyObject *pyuci_apply(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"ops", "commit", NULL};
+	PyObject *ops;
+	int commit = 0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|p", (char**)keys, &ops, &commit))
+		return NULL;
+
+	PyObject *iter = PyObject_GetIter(ops);
+	if (!iter)
+		return NULL;
+
+	// Packages touched by operations. There are commonly just few of them so
+	// simple array is enough.
+	struct apply_pkg *pkgs = NULL;
+	size_t pkgs_cnt = 0, pkgs_size = 0, i;
+	PyObject *ret = NULL, *op;
+	struct uci_ptr ptr;
+	bool ok = true;
+	while (ok && (op = PyIter_Next(iter))) {
+		// Package is remembered before it is modified. Package that is not
+		// loaded yet has no changes to remember.
+		struct uci_package *p;
+		memset(&ptr, 0, sizeof ptr);
+		ok = apply_op_package(self, op, &p) &&
+			(!p || apply_touch(&pkgs, &pkgs_cnt, &pkgs_size, p, false));
+		ok = ok && apply_op(self, op, &ptr);
+		Py_DECREF(op);
+		if (ptr.p) { // Following operations might use indexes
+			lookups_invalidate(self, ptr.p->e.name);
+			if (!apply_touch(&pkgs, &pkgs_cnt, &pkgs_size, ptr.p, true))
+				ok = false;
+		}
+	}
+	Py_DECREF(iter);
+	if (PyErr_Occurred())
+		ok = false;
+
+	if (!ok) {
+		// Batch is atomic so all touched packages are rolled back
+		PyObject *type, *value, *traceback;
+		PyErr_Fetch(&type, &value, &traceback);
+		for (i = 0; i < pkgs_cnt; i++)
+			if (!apply_pkg_rollback(self, &pkgs[i]))
+				PyErr_WriteUnraisable((PyObject*)self);
+		PyErr_Restore(type, value, traceback);
+		goto exit;
+	}
+	for (i = 0; i < pkgs_cnt; i++)
+		if (!dirty_mark(self, pkgs[i].name))
+			goto exit;
+	if (!(ret = PyList_New(pkgs_cnt)))
+		goto exit;
+	for (i = 0; i < pkgs_cnt; i++)
+		PyList_SET_ITEM(ret, i, PyUnicode_FromString(pkgs[i].name));
+	if (commit) {
+		struct uci_package **commit_pkgs = malloc((pkgs_cnt ? pkgs_cnt : 1) * sizeof *commit_pkgs);
+		if (!commit_pkgs) {
+			PyErr_NoMemory();
+			Py_CLEAR(ret);
+			goto exit;
+		}
+		for (i = 0; i < pkgs_cnt; i++)
+			commit_pkgs[i] = pkgs[i].p;
+		PyObject *committed = commit_packages(self, commit_pkgs, pkgs_cnt);
+		free(commit_pkgs);
+		if (!committed)
+			Py_CLEAR(ret);
+		Py_XDECREF(committed);
+	}
+
+exit:
+	lookups_invalidate(self, NULL);
+	for (i = 0; i < pkgs_cnt; i++)
+		apply_pkg_free(&pkgs[i]);
+	free(pkgs);
+	return ret;
+}
+
+enum pkg_cmd {
+	CMD_SAVE,
+	CMD_COMMIT,
+	CMD_REVERT
+};
+
+static PyObject *package_cmd(uci_object *self, PyObject *args, enum pkg_cmd cmd) {
+	struct uci_ptr ptr;
+	char *buf;
+	if (!lookup_path(self, args, &ptr, &buf))
+		return NULL;
+	if (!ptr.p) { // Package is not available so there is nothing to do
+		free(buf);
+		Py_RETURN_NONE;
+	}
+	pyuci_invalidate(self, ptr.p->e.name);
+
+	bool dirty = dirty_check(self, ptr.p->e.name);
+	// Partial revert keeps other changes in package
+	if (cmd != CMD_REVERT || !ptr.section)
+		dirty_clear(self, ptr.p->e.name);
+	int err = UCI_OK;
+	switch (cmd) {
+	case CMD_SAVE:
+		if (dirty)
+			WITHOUT_GIL(err = uci_save(self->ctx, ptr.p));
+		break;
+	case CMD_COMMIT:
+		// There might also be changes saved by some other instance
+		if (dirty || !uci_list_empty(&ptr.p->delta) || !uci_list_empty(&ptr.p->saved_delta))
+			err = commit_package(self, &ptr.p);
+		break;
+	case CMD_REVERT:
+		WITHOUT_GIL(err = uci_revert(self->ctx, &ptr));
+		break;
+	}
+	free(buf);
+	if (err)
+		return pyuci_error(self, UciException);
+	Py_RETURN_NONE;
+}
+
+static PyObject *pyuci_commit_many(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"configs", NULL};
+	PyObject *configs = Py_None;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O", (char**)keys, &configs))
+		return NULL;
+	if (configs == Py_None)
+		return commit_dirty(self);
+
+	PyObject *iter = PyObject_GetIter(configs), *config;
+	if (!iter)
+		return NULL;
+	struct uci_package **pkgs = NULL;
+	size_t cnt = 0, size = 0;
+	while ((config = PyIter_Next(iter))) {
+		struct uci_ptr ptr;
+		memset(&ptr, 0, sizeof ptr);
+		ptr.package = PyUnicode_AsUTF8(config);
+		int err = ptr.package ? pyuci_lookup(self, &ptr, NULL) : -1;
+		Py_DECREF(config);
+		if (err || !ptr.p) {
+			if (err == UCI_ERR_NOTFOUND || !err)
+				PyErr_SetNone(UciExcNotFound);
+			else if (err > 0)
+				pyuci_error(self, UciException);
+			break;
+		}
+		// Only packages with changes are committed
+		if (!dirty_check(self, ptr.p->e.name) && uci_list_empty(&ptr.p->delta) && uci_list_empty(&ptr.p->saved_delta))
+			continue;
+		size_t i;
+		for (i = 0; i < cnt && pkgs[i] != ptr.p; i++);
+		if (i < cnt)
+			continue;
+		if (cnt == size) {
+			size = size ? 2 * size : 4;
+			struct uci_package **npkgs = realloc(pkgs, size * sizeof *pkgs);
+			if (!npkgs) {
+				PyErr_NoMemory();
+				break;
+			}
+			pkgs = npkgs;
+		}
+		pkgs[cnt++] = ptr.p;
+	}
+	Py_DECREF(iter);
+	PyObject *ret = PyErr_Occurred() ? NULL : commit_packages(self, pkgs, cnt);
+	free(pkgs);
+	return ret;
+}
+
+static PyObject *pyuci_dirty_packages(uci_object *self, PyObject *args __attribute__((unused))) {
+	PyObject *ret = PyList_New(self->dirty_cnt);
+	if (!ret)
+		return NULL;
+	size_t i;
+	for (i = 0; i < self->dirty_cnt; i++)
+		PyList_SET_ITEM(ret, i, PyUnicode_FromString(self->dirty[i]));
+	return ret;
+}
+
+static PyObject *pyuci_save(uci_object *self, PyObject *args) {
+	return package_cmd(self, args, CMD_SAVE);
+}
+
+static PyObject *pyuci_commit(uci_object *self, PyObject *args) {
+	return package_cmd(self, args, CMD_COMMIT);
+}
+
+static PyObject *pyuci_revert(uci_object *self, PyObject *args) {
+	return package_cmd(self, args, CMD_REVERT);
+}
+
+// Common implementation of load and unload. Every argument is name of package.
+static PyObject *package_lifecycle(uci_object *self, PyObject *args, bool load) {
+	Py_ssize_t i;
+	for (i = 0; i < PyTuple_Size(args); i++) {
+		PyObject *arg = PyTuple_GET_ITEM(args, i);
+		if (!PyUnicode_Check(arg)) {
+			PyErr_SetString(PyExc_TypeError, "Config name has to be string");
+			return NULL;
+		}
+		const char *name = PyUnicode_AsUTF8(arg);
+		if (!name)
+			return NULL;
+
+		pyuci_invalidate(self, name);
+		dirty_clear(self, name);
+		struct uci_element *e = find_element(&self->ctx->root, name);
+		if (e && uci_unload(self->ctx, uci_to_package(e)))
+			return pyuci_error(self, UciException);
+		if (!load)
+			continue;
+		PyObject *sig = load_signature(self, name);
+		if (!sig)
+			return NULL;
+		struct uci_package *p = NULL;
+		int err;
+		double start = self->stats ? monotonic() : 0;
+		WITHOUT_GIL(err = uci_load(self->ctx, name, &p));
+		if (!load_signature_set(self, name, sig, p))
+			return NULL;
+		if (err)
+			return pyuci_error(self, UciException);
+		if (self->stats) {
+			self->stats->loads++;
+			self->stats->load_time += monotonic() - start;
+		}
+	}
+	Py_RETURN_NONE;
+}
+
+static PyObject *pyuci_unload(uci_object *self, PyObject *args) {
+	return package_lifecycle(self, args, false);
+}
+
+static PyObject *pyuci_load(uci_object *self, PyObject *args) {
+	return package_lifecycle(self, args, true);
+}
+
+static PyObject *pyuci_loaded(uci_object *self, PyObject *args __attribute__((unused))) {
+	PyObject *ret = PyList_New(0);
+	if (!ret)
+		return NULL;
+	struct uci_element *e;
+	uci_foreach_element(&self->ctx->root, e) {
+		PyObject *name = PyUnicode_FromString(e->name);
+		if (!name || PyList_Append(ret, name)) {
+			Py_XDECREF(name);
+			Py_DECREF(ret);
+			return NULL;
+		}
+		Py_DECREF(name);
+	}
+	return ret;
+}
+
+// Change record as returned by Uci.changes()
+static PyTypeObject change_type;
+
+static PyStructSequence_Field change_fields[] = {
+	{"command", "Type of change"},
+	{"config", "Name of config"},
+	{"section", "Name of section"},
+	{"option", "Name of option or None"},
+	{"value", "Value or None"},
+	{NULL}
+};
+
+static PyStructSequence_Desc change_desc = {
+	"uci.Change",
+	"Change record: (command, config, section, option, value)",
+	change_fields,
+	5,
+};
+
+static const char *change_commands[] = {
+	[UCI_CMD_ADD] = "add",
+	[UCI_CMD_REMOVE] = "delete",
+	[UCI_CMD_CHANGE] = "set",
+	[UCI_CMD_RENAME] = "rename",
+	[UCI_CMD_REORDER] = "reorder",
+	[UCI_CMD_LIST_ADD] = "add_list",
+	[UCI_CMD_LIST_DEL] = "del_list",
+};
+
+// Append changes recorded in given delta list to Python list
+static bool changes_append(PyObject *ret, struct uci_package *p, struct uci_list *deltas) {
+	struct uci_element *e;
+	uci_foreach_element(deltas, e) {
+		struct uci_delta *d = uci_to_delta(e);
+		const char *cmd = NULL;
+		if (d->cmd >= 0 && d->cmd < sizeof(change_commands) / sizeof(*change_commands))
+			cmd = change_commands[d->cmd];
+		PyObject *change = PyStructSequence_New(&change_type);
+		if (!change)
+			return false;
+		const char *values[] = {cmd, p->e.name, d->section, e->name, d->value};
+		size_t i;
+		for (i = 0; i < sizeof(values) / sizeof(*values); i++) {
+			PyObject *value = Py_BuildValue("z", values[i]);
+			if (!value) {
+				Py_DECREF(change);
+				return false;
+			}
+			PyStructSequence_SET_ITEM(change, i, value);
+		}
+		int err = PyList_Append(ret, change);
+		Py_DECREF(change);
+		if (err)
+			return false;
+	}
+	return true;
+}
+
+// Check if there is delta file for given package in savedir
+static bool savedir_has_delta(uci_object *self, const char *name) {
+	char *path;
+	if (asprintf(&path, "%s/%s", self->ctx->savedir, name) < 0)
+		return false;
+	struct stat st;
+	bool ret = !stat(path, &st) && st.st_size > 0;
+	free(path);
+	return ret;
+}
+
+static PyObject *pyuci_changes(uci_object *self, PyObject *args) {
+	const char *config = NULL;
+	// Format: uci.changes("p") or uci.changes()
+	if (!PyArg_ParseTuple(args, "|z", &config))
+		return NULL;
+
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	if (config) {
+		ptr.package = config;
+		if (pyuci_lookup(self, &ptr, NULL) < 0)
+			return NULL;
+		if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
+			PyErr_SetNone(UciExcNotFound);
+			return NULL;
+		}
+	} else {
+		// Load packages with saved changes. Packages without them have only
+		// changes done in this context and those have to be loaded already.
+		DIR *dir = opendir(self->ctx->savedir);
+		struct dirent *ent;
+		while (dir && (ent = readdir(dir))) {
+			if (ent->d_name[0] == '.' || find_element(&self->ctx->root, ent->d_name))
+				continue;
+			if (!savedir_has_delta(self, ent->d_name))
+				continue;
+			memset(&ptr, 0, sizeof ptr);
+			ptr.package = ent->d_name;
+			if (pyuci_lookup(self, &ptr, NULL) < 0) {
+				closedir(dir);
+				return NULL;
+			}
+		}
+		if (dir)
+			closedir(dir);
+	}
+
+	PyObject *ret = PyList_New(0);
+	if (!ret)
+		return NULL;
+	struct uci_element *e;
+	uci_foreach_element(&self->ctx->root, e) {
+		struct uci_package *p = uci_to_package(e);
+		if (config && p != ptr.p)
+			continue;
+		if (!changes_append(ret, p, &p->saved_delta) || !changes_append(ret, p, &p->delta)) {
+			Py_DECREF(ret);
+			return NULL;
+		}
+	}
+	return ret;
+}
+
+static PyObject *pyuci_has_changes(uci_object *self, PyObject *args) {
+	const char *config;
+	// Format: uci.has_changes("p")
+	if (!PyArg_ParseTuple(args, "s", &config))
+		return NULL;
+
+	struct uci_element *e = find_element(&self->ctx->root, config);
+	if (e) {
+		struct uci_package *p = uci_to_package(e);
+		return PyBool_FromLong(dirty_check(self, config) ||
+				!uci_list_empty(&p->delta) || !uci_list_empty(&p->saved_delta));
+	}
+	return PyBool_FromLong(savedir_has_delta(self, config));
+}
+
+static PyObject *pyuci_list_configs(uci_object *self, PyObject *args) {
+	char **configs = NULL;
+	char **ptr;
+	int err;
+
+	WITHOUT_GIL(err = uci_list_configs(self->ctx, &configs));
+	if (err != UCI_OK || !configs)
+		return pyuci_error(self, UciException);
+
+	PyObject *ret = PyList_New(0);
+	for (ptr = configs; ret && *ptr; ptr++) {
+		PyObject *name = PyUnicode_FromString(*ptr);
+		if (!name || PyList_Append(ret, name))
+			Py_CLEAR(ret);
+		Py_XDECREF(name);
+	}
+	free(configs);
+	return ret;
+}
+
+// Search of options
+// Sections are scanned directly unless value index is requested. Value index of
+// package is dictionary mapping values to list of (section, option, type) tuples.
+// It is created on first use, updated by set and delete and dropped when package
+// is modified in other way.
+
+static bool option_has_value(struct uci_option *o, const char *value) {
+	if (o->type == UCI_TYPE_STRING)
+		return !strcmp(o->v.string, value);
+	struct uci_element *e;
+	uci_foreach_element(&o->v.list, e)
+		if (!strcmp(e->name, value))
+			return true;
+	return false;
+}
+
+static bool find_append(PyObject *ret, const char *config, const char *section, const char *option) {
+	PyObject *match = Py_BuildValue("(sss)", config, section, option);
+	if (!match)
+		return false;
+	int err = PyList_Append(ret, match);
+	Py_DECREF(match);
+	return !err;
+}
+
+// Returns borrowed reference to value index of package
+static PyObject *value_index(uci_object *self, struct uci_package *p) {
+	if (!self->value_index && !(self->value_index = PyDict_New()))
+		return NULL;
+	PyObject *index = PyDict_GetItemString(self->value_index, p->e.name);
+	if (index)
+		return index;
+	if (!(index = PyDict_New()))
+		return NULL;
+	struct uci_element *se, *oe;
+	uci_foreach_element(&p->sections, se) {
+		struct uci_section *s = uci_to_section(se);
+		uci_foreach_element(&s->options, oe)
+			if (!value_index_option(index, s, uci_to_option(oe))) {
+				Py_DECREF(index);
+				return NULL;
+			}
+	}
+	int err = PyDict_SetItemString(self->value_index, p->e.name, index);
+	Py_DECREF(index);
+	return err ? NULL : index;
+}
+
+static bool find_indexed(uci_object *self, PyObject *ret, struct uci_package *p, const char *option, const char *value, const char *type) {
+	PyObject *index = value_index(self, p);
+	if (!index)
+		return false;
+	PyObject *list = PyDict_GetItemString(index, value);
+	if (!list)
+		return true;
+	PyObject *config = PyUnicode_FromString(p->e.name);
+	if (!config)
+		return false;
+	bool ok = true;
+	Py_ssize_t i;
+	// Entries are (section, option, type) tuples of strings
+	for (i = 0; ok && i < PyList_GET_SIZE(list); i++) {
+		PyObject *entry = PyList_GET_ITEM(list, i);
+		if ((option && PyUnicode_CompareWithASCIIString(PyTuple_GET_ITEM(entry, 1), option)) ||
+				(type && PyUnicode_CompareWithASCIIString(PyTuple_GET_ITEM(entry, 2), type)))
+			continue;
+		PyObject *match = PyTuple_Pack(3, config, PyTuple_GET_ITEM(entry, 0), PyTuple_GET_ITEM(entry, 1));
+		ok = match && !PyList_Append(ret, match);
+		Py_XDECREF(match);
+	}
+	Py_DECREF(config);
+	return ok;
+}
+
+static bool find_scan(PyObject *ret, struct uci_package *p, const char *option, const char *value, const char *type) {
+	struct uci_element *se, *oe;
+	uci_foreach_element(&p->sections, se) {
+		struct uci_section *s = uci_to_section(se);
+		if (type && strcmp(type, s->type))
+			continue;
+		if (option) {
+			oe = find_element(&s->options, option);
+			if (oe && (!value || option_has_value(uci_to_option(oe), value)) &&
+					!find_append(ret, p->e.name, se->name, oe->name))
+				return false;
+			continue;
+		}
+		uci_foreach_element(&s->options, oe)
+			if ((!value || option_has_value(uci_to_option(oe), value)) &&
+					!find_append(ret, p->e.name, se->name, oe->name))
+				return false;
+	}
+	return true;
+}
+
+static PyObject *pyuci_find(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"configs", "option", "value", "section_type", "index", NULL};
+	PyObject *configs = Py_None;
+	const char *option = NULL, *value = NULL, *type = NULL;
+	int indexed = 0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|Ozzzp", (char**)keys,
+				&configs, &option, &value, &type, &indexed))
+		return NULL;
+
+	PyObject *iter = configs == Py_None ? NULL : PyObject_GetIter(configs);
+	if (configs == Py_None) {
+		PyObject *all = pyuci_list_configs(self, NULL);
+		iter = all ? PyObject_GetIter(all) : NULL;
+		Py_XDECREF(all);
+	}
+	if (!iter)
+		return NULL;
+	PyObject *ret = PyList_New(0), *config;
+	while (ret && (config = PyIter_Next(iter))) {
+		struct uci_ptr ptr;
+		memset(&ptr, 0, sizeof ptr);
+		ptr.package = PyUnicode_AsUTF8(config);
+		int err = ptr.package ? pyuci_lookup(self, &ptr, NULL) : -1;
+		if (err == UCI_ERR_NOTFOUND || (!err && !ptr.p))
+			PyErr_SetObject(UciExcNotFound, config);
+		else if (err > 0)
+			pyuci_error(self, UciException);
+		Py_DECREF(config);
+		if (err || !ptr.p ||
+				!(value && indexed ?
+					find_indexed(self, ret, ptr.p, option, value, type) :
+					find_scan(ret, ptr.p, option, value, type)))
+			Py_CLEAR(ret);
+	}
+	Py_DECREF(iter);
+	if (PyErr_Occurred())
+		Py_CLEAR(ret);
+	return ret;
+}
+
+// Growing buffer used to serialize configs
+struct buffer {
+	char *data;
+	size_t len, size;
+};
+
+static bool buffer_append(struct buffer *b, const void *data, size_t len) {
+	if (b->len + len > b->size) {
+		size_t size = b->size ? b->size : 4096;
+		while (size < b->len + len)
+			size *= 2;
+		char *data = realloc(b->data, size);
+		if (!data) {
+			PyErr_NoMemory();
+			return false;
+		}
+		b->data = data;
+		b->size = size;
+	}
+	memcpy(b->data + b->len, data, len);
+	b->len += len;
+	return true;
+}
+
+static bool buffer_str(struct buffer *b, const char *str) {
+	return buffer_append(b, str, strlen(str));
+}
+
+// Append string as JSON string
+static bool buffer_json(struct buffer *b, const char *str) {
+	if (!buffer_append(b, "\"", 1))
+		return false;
+	const char *start = str;
+	for (; *str; str++) {
+		unsigned char c = *str;
+		if (c >= 0x20 && c != '"' && c != '\\')
+			continue;
+		char esc[7];
+		switch (c) {
+		case '"':
+			strcpy(esc, "\\\"");
+			break;
+		case '\\':
+			strcpy(esc, "\\\\");
+			break;
+		case '\n':
+			strcpy(esc, "\\n");
+			break;
+		case '\t':
+			strcpy(esc, "\\t");
+			break;
+		default:
+			snprintf(esc, sizeof esc, "\\u%04x", c);
+		}
+		if (!buffer_append(b, start, str - start) || !buffer_str(b, esc))
+			return false;
+		start = str + 1;
+	}
+	return buffer_append(b, start, str - start) && buffer_append(b, "\"", 1);
+}
+
+static bool buffer_u32(struct buffer *b, uint32_t value) {
+	unsigned char data[4] = {value & 0xff, (value >> 8) & 0xff, (value >> 16) & 0xff, value >> 24};
+	return buffer_append(b, data, 4);
+}
+
+// Append string in binary format (length followed by data)
+static bool buffer_binary(struct buffer *b, const char *str) {
+	size_t len = strlen(str);
+	return buffer_u32(b, len) && buffer_append(b, str, len);
+}
+
+// Binary export format:
+// It starts with magic EXPORT_MAGIC followed by records. Every record starts
+// with tag byte and has following fields:
+//  'P' package name
+//  'S' section type, section name and byte with 1 for anonymous section
+//  'O' option name and value
+//  'L' list name, 32-bit count of values and values
+// Strings are encoded as 32-bit length followed by data without terminating
+// null byte. All integers are little endian.
+#define EXPORT_MAGIC "UCI\x01"
+
+enum export_format {
+	EXPORT_JSON,
+	EXPORT_BINARY
+};
+
+// JSON export format is same as used by ubus (object of configs with objects
+// of sections with .name, .type, .anonymous and .index keys on top of options).
+static bool export_json(struct buffer *b, struct uci_package *p) {
+	if (!buffer_json(b, p->e.name) || !buffer_str(b, ":{"))
+		return false;
+	struct uci_element *se, *oe, *le;
+	int index = 0;
+	uci_foreach_element(&p->sections, se) {
+		struct uci_section *s = uci_to_section(se);
+		char idx[32];
+		snprintf(idx, sizeof idx, ",\".index\":%d", index);
+		if ((index++ && !buffer_str(b, ",")) ||
+				!buffer_json(b, se->name) ||
+				!buffer_str(b, s->anonymous ? ":{\".anonymous\":true" : ":{\".anonymous\":false") ||
+				!buffer_str(b, ",\".type\":") || !buffer_json(b, s->type) ||
+				!buffer_str(b, ",\".name\":") || !buffer_json(b, se->name) ||
+				!buffer_str(b, idx))
+			return false;
+		uci_foreach_element(&s->options, oe) {
+			struct uci_option *o = uci_to_option(oe);
+			if (!buffer_str(b, ",") || !buffer_json(b, oe->name) || !buffer_str(b, ":"))
+				return false;
+			if (o->type == UCI_TYPE_STRING) {
+				if (!buffer_json(b, o->v.string))
+					return false;
+				continue;
+			}
+			if (!buffer_str(b, "["))
+				return false;
+			uci_foreach_element(&o->v.list, le)
+				if ((le->list.prev != &o->v.list && !buffer_str(b, ",")) || !buffer_json(b, le->name))
+					return false;
+			if (!buffer_str(b, "]"))
+				return false;
+		}
+		if (!buffer_str(b, "}"))
+			return false;
+	}
+	return buffer_str(b, "}");
+}
+
+static bool export_binary(struct buffer *b, struct uci_package *p) {
+	if (!buffer_str(b, "P") || !buffer_binary(b, p->e.name))
+		return false;
+	struct uci_element *se, *oe, *le;
+	uci_foreach_element(&p->sections, se) {
+		struct uci_section *s = uci_to_section(se);
+		if (!buffer_str(b, "S") || !buffer_binary(b, s->type) || !buffer_binary(b, se->name) ||
+				!buffer_append(b, s->anonymous ? "\x01" : "\x00", 1))
+			return false;
+		uci_foreach_element(&s->options, oe) {
+			struct uci_option *o = uci_to_option(oe);
+			if (o->type == UCI_TYPE_STRING) {
+				if (!buffer_str(b, "O") || !buffer_binary(b, oe->name) || !buffer_binary(b, o->v.string))
+					return false;
+				continue;
+			}
+			uint32_t cnt = 0;
+			uci_foreach_element(&o->v.list, le)
+				cnt++;
+			if (!buffer_str(b, "L") || !buffer_binary(b, oe->name) || !buffer_u32(b, cnt))
+				return false;
+			uci_foreach_element(&o->v.list, le)
+				if (!buffer_binary(b, le->name))
+					return false;
+		}
+	}
+	return true;
+}
+
+static PyObject *pyuci_export(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"configs", "format", NULL};
+	PyObject *configs = Py_None;
+	const char *format_name = "json";
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|Os", (char**)keys, &configs, &format_name))
+		return NULL;
+	enum export_format format;
+	if (!strcmp(format_name, "json"))
+		format = EXPORT_JSON;
+	else if (!strcmp(format_name, "binary"))
+		format = EXPORT_BINARY;
+	else {
+		PyErr_Format(PyExc_ValueError, "Unsupported export format: %s", format_name);
+		return NULL;
+	}
+
+	PyObject *iter;
+	if (configs == Py_None) {
+		PyObject *all = pyuci_list_configs(self, NULL);
+		if (!all)
+			return NULL;
+		iter = PyObject_GetIter(all);
+		Py_DECREF(all);
+	} else
+		iter = PyObject_GetIter(configs);
+	if (!iter)
+		return NULL;
+
+	struct buffer b = {NULL, 0, 0};
+	bool ok = buffer_str(&b, format == EXPORT_JSON ? "{" : EXPORT_MAGIC);
+	PyObject *config;
+	bool first = true;
+	while (ok && (config = PyIter_Next(iter))) {
+		struct uci_ptr ptr;
+		memset(&ptr, 0, sizeof ptr);
+		if (!PyUnicode_Check(config)) {
+			PyErr_SetString(PyExc_TypeError, "Config name has to be string");
+			ok = false;
+		} else if (!(ptr.package = PyUnicode_AsUTF8(config)) || pyuci_lookup(self, &ptr, NULL) < 0)
+			ok = false;
+		else if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
+			PyErr_Format(UciExcNotFound, "%R", config);
+			ok = false;
+		} else if (format == EXPORT_JSON)
+			ok = (first || buffer_str(&b, ",")) && export_json(&b, ptr.p);
+		else
+			ok = export_binary(&b, ptr.p);
+		first = false;
+		Py_DECREF(config);
+	}
+	Py_DECREF(iter);
+
+	PyObject *ret = NULL;
+	if (ok && !PyErr_Occurred() && (format != EXPORT_JSON || buffer_str(&b, "}")))
+		ret = PyBytes_FromStringAndSize(b.data, b.len);
+	free(b.data);
+	return ret;
+}
+
+// State of import. Content is imported by calling import_package,
+// import_section and import_option in order it should be created in.
+struct import_state {
+	uci_object *self;
+	struct uci_package *p;
+	const char *section; // Name of current section
+	PyObject *configs; // List of imported configs
+	bool memory; // Import only to memory without accessing confdir
+};
+
+// Start import of package. Existing content of package is removed.
+static bool import_package(struct import_state *st, const char *name) {
+	uci_object *self = st->self;
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	ptr.package = name;
+	int err = UCI_OK;
+	if (st->memory) {
+		if (!memory_package(self, name, &ptr.p))
+			return false;
+	} else
+		err = pyuci_lookup(self, &ptr, NULL);
+	if (err == UCI_ERR_NOTFOUND && !ptr.p) {
+		if (!create_package(self, name, &ptr.p))
+			return false;
+		err = UCI_OK;
+	}
+	if (err < 0)
+		return false;
+	if (err || !ptr.p) {
+		pyuci_error(self, UciException);
+		return false;
+	}
+	st->p = ptr.p;
+	st->section = NULL;
+	pyuci_invalidate(self, ptr.p->e.name);
+	if (!st->memory && !dirty_mark(self, ptr.p->e.name))
+		return false;
+	PyObject *pyname = PyUnicode_FromString(ptr.p->e.name);
+	if (!pyname || PyList_Append(st->configs, pyname)) {
+		Py_XDECREF(pyname);
+		return false;
+	}
+	Py_DECREF(pyname);
+
+	struct uci_element *e, *tmp;
+	uci_foreach_element_safe(&ptr.p->sections, tmp, e) {
+		struct uci_ptr sptr;
+		memset(&sptr, 0, sizeof sptr);
+		sptr.package = ptr.p->e.name;
+		sptr.section = e->name;
+		if (uci_delete(self->ctx, &sptr)) {
+			pyuci_error(self, UciException);
+			return false;
+		}
+	}
+	return true;
+}
+
+static bool import_section(struct import_state *st, const char *type, const char *name, bool anonymous) {
+	if (!st->p) {
+		PyErr_SetString(PyExc_ValueError, "Section imported outside of config");
+		return false;
+	}
+	if (anonymous) {
+		struct uci_section *s;
+		if (uci_add_section(st->self->ctx, st->p, type, &s)) {
+			pyuci_error(st->self, UciException);
+			return false;
+		}
+		st->section = s->e.name;
+		return true;
+	}
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	ptr.package = st->p->e.name;
+	ptr.section = name;
+	if (pyuci_lookup(st->self, &ptr, NULL) < 0)
+		return false;
+	ptr.value = type;
+	if (uci_set(st->self->ctx, &ptr) || !ptr.s) {
+		pyuci_error(st->self, UciException);
+		return false;
+	}
+	st->section = ptr.s->e.name;
+	return true;
+}
+
+static bool import_option(struct import_state *st, const char *name, const char *const *values, size_t cnt, bool list) {
+	if (!st->section) {
+		PyErr_SetString(PyExc_ValueError, "Option imported outside of section");
+		return false;
+	}
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	ptr.package = st->p->e.name;
+	ptr.section = st->section;
+	ptr.option = name;
+	if (pyuci_lookup(st->self, &ptr, NULL) < 0)
+		return false;
+	int err = UCI_OK;
+	if (list) {
+		uci_delete(st->self->ctx, &ptr);
+		size_t i;
+		for (i = 0; !err && i < cnt; i++) {
+			ptr.value = values[i];
+			err = uci_add_list(st->self->ctx, &ptr);
+		}
+	} else {
+		ptr.value = values[0];
+		err = uci_set(st->self->ctx, &ptr);
+	}
+	if (err) {
+		pyuci_error(st->self, UciException);
+		return false;
+	}
+	return true;
+}
+
+// Reader of binary export format
+struct reader {
+	const unsigned char *data;
+	size_t len, pos;
+};
+
+static bool read_invalid(void) {
+	PyErr_SetString(PyExc_ValueError, "Invalid or truncated binary export");
+	return false;
+}
+
+static bool read_u32(struct reader *r, uint32_t *value) {
+	if (r->len - r->pos < 4)
+		return read_invalid();
+	const unsigned char *d = r->data + r->pos;
+	*value = d[0] | d[1] << 8 | d[2] << 16 | (uint32_t)d[3] << 24;
+	r->pos += 4;
+	return true;
+}
+
+// Read string as newly allocated null terminated string
+static char *read_str(struct reader *r) {
+	uint32_t len;
+	if (!read_u32(r, &len))
+		return NULL;
+	if (r->len - r->pos < len || memchr(r->data + r->pos, '\0', len)) {
+		read_invalid();
+		return NULL;
+	}
+	char *ret = strndup((const char*)r->data + r->pos, len);
+	if (!ret)
+		PyErr_NoMemory();
+	r->pos += len;
+	return ret;
+}
+
+static bool import_binary(struct import_state *st, struct reader *r) {
+	bool ok = true;
+	while (ok && r->pos < r->len) {
+		char *str[2] = {NULL, NULL};
+		switch (r->data[r->pos++]) {
+		case 'P':
+			ok = (str[0] = read_str(r)) && import_package(st, str[0]);
+			break;
+		case 'S':
+			ok = (str[0] = read_str(r)) && (str[1] = read_str(r));
+			if (ok && r->pos >= r->len)
+				ok = read_invalid();
+			ok = ok && import_section(st, str[0], str[1], r->data[r->pos++]);
+			break;
+		case 'O':
+			ok = (str[0] = read_str(r)) && (str[1] = read_str(r)) &&
+				import_option(st, str[0], (const char *const *)&str[1], 1, false);
+			break;
+		case 'L':
+			{
+				uint32_t cnt, i;
+				if (!(str[0] = read_str(r)) || !read_u32(r, &cnt)) {
+					ok = false;
+					break;
+				}
+				// Every value takes at least four bytes
+				if (cnt > (r->len - r->pos) / 4) {
+					ok = read_invalid();
+					break;
+				}
+				char **values = calloc(cnt ? cnt : 1, sizeof *values);
+				if (!values) {
+					PyErr_NoMemory();
+					ok = false;
+					break;
+				}
+				for (i = 0; ok && i < cnt; i++)
+					ok = (values[i] = read_str(r)) != NULL;
+				ok = ok && import_option(st, str[0], (const char *const *)values, cnt, true);
+				for (i = 0; i < cnt; i++)
+					free(values[i]);
+				free(values);
+			}
+			break;
+		default:
+			ok = read_invalid();
+		}
+		free(str[0]);
+		free(str[1]);
+	}
+	return ok;
+}
+
+// Import of JSON as produced by export (parsed by json module)
+static bool import_json(struct import_state *st, PyObject *data) {
+	if (!PyDict_Check(data)) {
+		PyErr_SetString(PyExc_TypeError, "Imported JSON has to be object of configs");
+		return false;
+	}
+	PyObject *config, *sections;
+	Py_ssize_t pos = 0;
+	while (PyDict_Next(data, &pos, &config, &sections)) {
+		const char *name = PyUnicode_Check(config) ? PyUnicode_AsUTF8(config) : NULL;
+		if (!name || !PyDict_Check(sections)) {
+			if (!PyErr_Occurred())
+				PyErr_SetString(PyExc_TypeError, "Imported config has to be object of sections");
+			return false;
+		}
+		if (!import_package(st, name))
+			return false;
+		PyObject *section, *options;
+		Py_ssize_t spos = 0;
+		while (PyDict_Next(sections, &spos, &section, &options)) {
+			PyObject *type = PyDict_Check(options) ? PyDict_GetItemString(options, ".type") : NULL;
+			if (!PyUnicode_Check(section) || !type || !PyUnicode_Check(type)) {
+				PyErr_SetString(PyExc_TypeError, "Imported section has to be object with string .type");
+				return false;
+			}
+			PyObject *anonymous = PyDict_GetItemString(options, ".anonymous");
+			int anon = anonymous ? PyObject_IsTrue(anonymous) : 0;
+			const char *sname = PyUnicode_AsUTF8(section), *stype = PyUnicode_AsUTF8(type);
+			if (anon < 0 || !sname || !stype || !import_section(st, stype, sname, anon))
+				return false;
+			PyObject *option, *value;
+			Py_ssize_t opos = 0;
+			while (PyDict_Next(options, &opos, &option, &value)) {
+				const char *oname = PyUnicode_Check(option) ? PyUnicode_AsUTF8(option) : NULL;
+				if (!oname)
+					return PyErr_Occurred() ? false : read_invalid();
+				if (oname[0] == '.')
+					continue;
+				if (PyUnicode_Check(value)) {
+					const char *ovalue = PyUnicode_AsUTF8(value);
+					if (!ovalue || !import_option(st, oname, &ovalue, 1, false))
+						return false;
+				} else if (PyList_Check(value)) {
+					Py_ssize_t i, cnt = PyList_GET_SIZE(value);
+					const char **values = malloc((cnt ? cnt : 1) * sizeof *values);
+					if (!values) {
+						PyErr_NoMemory();
+						return false;
+					}
+					bool ok = true;
+					for (i = 0; ok && i < cnt; i++) {
+						PyObject *item = PyList_GET_ITEM(value, i);
+						if (!PyUnicode_Check(item)) {
+							PyErr_SetString(PyExc_TypeError, "Imported list has to contain only strings");
+							ok = false;
+						} else
+							ok = (values[i] = PyUnicode_AsUTF8(item)) != NULL;
+					}
+					ok = ok && import_option(st, oname, values, cnt, true);
+					free(values);
+					if (!ok)
+						return false;
+				} else {
+					PyErr_SetString(PyExc_TypeError, "Imported option has to be string or list of strings");
+					return false;
+				}
+			}
+		}
+	}
+	return true;
+}
+
+// Import blob in any of supported formats
+static bool import_blob(struct import_state *st, Py_buffer *blob) {
+	size_t magic_len = strlen(EXPORT_MAGIC);
+	if ((size_t)blob->len >= magic_len && !memcmp(blob->buf, EXPORT_MAGIC, magic_len)) {
+		struct reader r = {blob->buf, blob->len, magic_len};
+		return import_binary(st, &r);
+	}
+	PyObject *data = NULL, *json = PyImport_ImportModule("json");
+	PyObject *bytes = PyBytes_FromStringAndSize(blob->buf, blob->len);
+	if (json && bytes)
+		data = PyObject_CallMethod(json, "loads", "O", bytes);
+	Py_XDECREF(json);
+	Py_XDECREF(bytes);
+	bool ok = data && import_json(st, data);
+	Py_XDECREF(data);
+	return ok;
+}
+
+static PyObject *pyuci_import(uci_object *self, PyObject *args) {
+	Py_buffer blob;
+	// Format: uci.import_(b"...")
+	if (!PyArg_ParseTuple(args, "s*", &blob))
+		return NULL;
+
+	struct import_state st = {self, NULL, NULL, PyList_New(0), false};
+	bool ok = st.configs && import_blob(&st, &blob);
+	PyBuffer_Release(&blob);
+	// Changes are kept in memory even if import failed
+	pyuci_invalidate(self, NULL);
+	if (!ok)
+		Py_CLEAR(st.configs);
+	return st.configs;
+}
+
+// Config diff
+// Sections are matched by name. Anonymous sections that are not matched by name
+// are matched by order within sections of same type. Named sections that are not
+// matched are renamed if there is section with same content. Order is fixed by
+// moving sections that are not in longest sequence of sections already in order.
+
+static bool option_equal(struct uci_option *a, struct uci_option *b) {
+	if (a->type != b->type)
+		return false;
+	if (a->type == UCI_TYPE_STRING)
+		return !strcmp(a->v.string, b->v.string);
+	struct uci_list *la = a->v.list.next, *lb = b->v.list.next;
+	for (; la != &a->v.list && lb != &b->v.list; la = la->next, lb = lb->next)
+		if (strcmp(list_to_element(la)->name, list_to_element(lb)->name))
+			return false;
+	return la == &a->v.list && lb == &b->v.list;
+}
+
+static bool section_equal(struct uci_section *a, struct uci_section *b) {
+	if (strcmp(a->type, b->type))
+		return false;
+	size_t cnt = 0;
+	struct uci_element *e, *f;
+	uci_foreach_element(&a->options, e)
+		cnt++;
+	uci_foreach_element(&b->options, e) {
+		if (!cnt--)
+			return false;
+		if (!(f = find_element(&a->options, e->name)) || !option_equal(uci_to_option(f), uci_to_option(e)))
+			return false;
+	}
+	return cnt == 0;
+}
+
+// Append operation built from given format to list
+static bool diff_op(PyObject *ops, const char *format, ...) {
+	va_list args;
+	va_start(args, format);
+	PyObject *op = Py_VaBuildValue(format, args);
+	va_end(args);
+	if (!op)
+		return false;
+	int err = PyList_Append(ops, op);
+	Py_DECREF(op);
+	return !err;
+}
+
+// Operations changing content of section a (referred to as name) to content of b
+static bool diff_options(PyObject *ops, const char *config, const char *name, struct uci_section *a, struct uci_section *b) {
+	struct uci_element *e, *f;
+	if (a) {
+		if (strcmp(a->type, b->type) && !diff_op(ops, "(ssss)", "set", config, name, b->type))
+			return false;
+		uci_foreach_element(&a->options, e)
+			if (!find_element(&b->options, e->name) && !diff_op(ops, "(ssss)", "delete", config, name, e->name))
+				return false;
+	}
+	uci_foreach_element(&b->options, e) {
+		struct uci_option *o = uci_to_option(e);
+		if (a && (f = find_element(&a->options, e->name)) && option_equal(uci_to_option(f), o))
+			continue;
+		if (!diff_op(ops, "(ssssN)", "set", config, name, e->name, pyuci_option(o)))
+			return false;
+	}
+	return true;
+}
+
+struct diff_entry {
+	struct uci_section *s;
+	size_t index;
+};
+
+static int diff_entry_name_cmp(const void *a, const void *b) {
+	return strcmp(((const struct diff_entry*)a)->s->e.name, ((const struct diff_entry*)b)->s->e.name);
+}
+
+static int diff_entry_type_cmp(const void *a, const void *b) {
+	const struct diff_entry *ea = a, *eb = b;
+	int ret = strcmp(ea->s->type, eb->s->type);
+	if (ret)
+		return ret;
+	return ea->index < eb->index ? -1 : ea->index > eb->index;
+}
+
+// Returns array of sections of package (that might be NULL) and their count
+static struct uci_section **diff_sections(struct uci_package *p, size_t *cnt) {
+	*cnt = 0;
+	struct uci_element *e;
+	if (p)
+		uci_foreach_element(&p->sections, e)
+			(*cnt)++;
+	struct uci_section **ret = malloc((*cnt ? *cnt : 1) * sizeof *ret);
+	if (!ret)
+		return NULL;
+	size_t i = 0;
+	if (p)
+		uci_foreach_element(&p->sections, e)
+			ret[i++] = uci_to_section(e);
+	return ret;
+}
+
+// Mark values of longest increasing subsequence of seq in lis
+static bool mark_lis(const size_t *seq, size_t cnt, bool *lis) {
+	if (!cnt)
+		return true;
+	size_t *tails = malloc(cnt * sizeof *tails), *prev = malloc(cnt * sizeof *prev);
+	if (!tails || !prev) {
+		free(tails);
+		free(prev);
+		return false;
+	}
+	size_t len = 0, i;
+	for (i = 0; i < cnt; i++) {
+		size_t lo = 0, hi = len;
+		while (lo < hi) {
+			size_t mid = (lo + hi) / 2;
+			if (seq[tails[mid]] < seq[i])
+				lo = mid + 1;
+			else
+				hi = mid;
+		}
+		prev[i] = lo ? tails[lo - 1] : SIZE_MAX;
+		tails[lo] = i;
+		if (lo == len)
+			len++;
+	}
+	for (i = tails[len - 1]; i != SIZE_MAX; i = prev[i])
+		lis[seq[i]] = true;
+	free(tails);
+	free(prev);
+	return true;
+}
+
+static size_t diff_find(const size_t *seq, size_t cnt, size_t value) {
+	size_t i;
+	for (i = 0; i < cnt && seq[i] != value; i++);
+	return i;
+}
+
+// Append operations changing package a to package b. Any of them might be NULL.
+static bool diff_package(PyObject *ops, const char *config, struct uci_package *pa, struct uci_package *pb) {
+	size_t na, nb, i, j;
+	struct uci_section **sa = diff_sections(pa, &na), **sb = diff_sections(pb, &nb);
+	size_t n = (na > nb ? na : nb) + 1;
+	size_t *ma = malloc(n * sizeof *ma), *mb = malloc(n * sizeof *mb), *sim = malloc(n * sizeof *sim);
+	const char **refs = malloc(n * sizeof *refs);
+	struct diff_entry *ea = malloc(n * sizeof *ea), *eb = malloc(n * sizeof *eb);
+	bool *lis = calloc(n, sizeof *lis);
+	bool ok = false;
+	if (!sa || !sb || !ma || !mb || !sim || !refs || !ea || !eb || !lis) {
+		PyErr_NoMemory();
+		goto exit;
+	}
+	for (i = 0; i < n; i++)
+		ma[i] = mb[i] = SIZE_MAX;
+
+	// Match by name
+	for (i = 0; i < na; i++)
+		ea[i] = (struct diff_entry){sa[i], i};
+	qsort(ea, na, sizeof *ea, diff_entry_name_cmp);
+	for (j = 0; j < nb; j++) {
+		struct diff_entry key = {sb[j], j};
+		struct diff_entry *found = bsearch(&key, ea, na, sizeof *ea, diff_entry_name_cmp);
+		if (found && found->s->anonymous == sb[j]->anonymous) {
+			ma[found->index] = j;
+			mb[j] = found->index;
+			refs[j] = found->s->e.name;
+		}
+	}
+	// Match anonymous sections by order within type
+	size_t ka = 0, kb = 0;
+	for (i = 0; i < na; i++)
+		if (ma[i] == SIZE_MAX && sa[i]->anonymous)
+			ea[ka++] = (struct diff_entry){sa[i], i};
+	for (j = 0; j < nb; j++)
+		if (mb[j] == SIZE_MAX && sb[j]->anonymous)
+			eb[kb++] = (struct diff_entry){sb[j], j};
+	qsort(ea, ka, sizeof *ea, diff_entry_type_cmp);
+	qsort(eb, kb, sizeof *eb, diff_entry_type_cmp);
+	for (i = 0, j = 0; i < ka && j < kb;) {
+		int cmp = strcmp(ea[i].s->type, eb[j].s->type);
+		if (cmp < 0)
+			i++;
+		else if (cmp > 0)
+			j++;
+		else {
+			ma[ea[i].index] = eb[j].index;
+			mb[eb[j].index] = ea[i].index;
+			refs[eb[j].index] = ea[i].s->e.name;
+			i++;
+			j++;
+		}
+	}
+	// Rename named sections with same content
+	for (j = 0; j < nb; j++) {
+		if (mb[j] != SIZE_MAX || sb[j]->anonymous)
+			continue;
+		for (i = 0; i < na; i++) {
+			if (ma[i] != SIZE_MAX || sa[i]->anonymous || !section_equal(sa[i], sb[j]))
+				continue;
+			if (!diff_op(ops, "(ssss)", "rename", config, sa[i]->e.name, sb[j]->e.name))
+				goto exit;
+			ma[i] = j;
+			mb[j] = i;
+			refs[j] = sb[j]->e.name;
+			break;
+		}
+	}
+
+	// Remove sections that are not matched and modify matched ones
+	for (i = 0; i < na; i++)
+		if (ma[i] == SIZE_MAX && !diff_op(ops, "(sss)", "delete", config, sa[i]->e.name))
+			goto exit;
+	for (j = 0; j < nb; j++)
+		if (mb[j] != SIZE_MAX && !diff_options(ops, config, refs[j], sa[mb[j]], sb[j]))
+			goto exit;
+
+	// Add new sections and fix order. We simulate order of sections in sim
+	// (indexes of sections in b) to get positions for reorder.
+	size_t len = 0;
+	for (i = 0; i < na; i++)
+		if (ma[i] != SIZE_MAX)
+			sim[len++] = ma[i];
+	if (!mark_lis(sim, len, lis)) {
+		PyErr_NoMemory();
+		goto exit;
+	}
+	for (j = 0; j < nb; j++) {
+		char *ref = NULL;
+		if (mb[j] == SIZE_MAX) {
+			if (sb[j]->anonymous) {
+				// New anonymous section is the last one of its type
+				if (!diff_op(ops, "(sss)", "add", config, sb[j]->type))
+					goto exit;
+				if (asprintf(&ref, "@%s[-1]", sb[j]->type) < 0) {
+					PyErr_NoMemory();
+					goto exit;
+				}
+			} else if (!diff_op(ops, "(ssss)", "set", config, sb[j]->e.name, sb[j]->type))
+				goto exit;
+			refs[j] = ref ? ref : sb[j]->e.name;
+			sim[len++] = j;
+			if (!diff_options(ops, config, refs[j], NULL, sb[j])) {
+				free(ref);
+				goto exit;
+			}
+		} else if (lis[j])
+			continue;
+		// Move section right after its predecessor
+		size_t k = diff_find(sim, len, j);
+		memmove(sim + k, sim + k + 1, (len - k - 1) * sizeof *sim);
+		size_t pos = j ? diff_find(sim, len - 1, j - 1) + 1 : 0;
+		memmove(sim + pos + 1, sim + pos, (len - pos - 1) * sizeof *sim);
+		sim[pos] = j;
+		bool err = pos != k && !diff_op(ops, "(sssn)", "reorder", config, refs[j], (Py_ssize_t)pos);
+		free(ref);
+		if (err)
+			goto exit;
+	}
+	ok = true;
+
+exit:
+	free(sa);
+	free(sb);
+	free(ma);
+	free(mb);
+	free(sim);
+	free(refs);
+	free(ea);
+	free(eb);
+	free(lis);
+	return ok;
+}
+
+static PyTypeObject uci_type;
+
+// Locate package for diff. Package is set to NULL if it does not exist.
+static bool diff_lookup(uci_object *uci, const char *name, bool memory, struct uci_package **p) {
+	if (memory) {
+		struct uci_element *e = find_element(&uci->ctx->root, name);
+		*p = e ? uci_to_package(e) : NULL;
+		return true;
+	}
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	ptr.package = name;
+	int err = pyuci_lookup(uci, &ptr, NULL);
+	if (err < 0)
+		return false;
+	if (err && err != UCI_ERR_NOTFOUND) {
+		pyuci_error(uci, UciException);
+		return false;
+	}
+	*p = ptr.p;
+	return true;
+}
+
+// Add names of configs (to dictionary used as ordered set)
+static bool diff_names(PyObject *names, PyObject *configs) {
+	if (!configs)
+		return false;
+	PyObject *iter = PyObject_GetIter(configs), *config;
+	Py_DECREF(configs);
+	if (!iter)
+		return false;
+	while ((config = PyIter_Next(iter))) {
+		int err = PyDict_SetItem(names, config, Py_None);
+		Py_DECREF(config);
+		if (err)
+			break;
+	}
+	Py_DECREF(iter);
+	return !PyErr_Occurred();
+}
+
+static PyObject *pyuci_diff(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"other", "configs", NULL};
+	PyObject *other, *configs = Py_None;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", (char**)keys, &other, &configs))
+		return NULL;
+
+	uci_object *uci;
+	bool memory = !PyObject_TypeCheck(other, &uci_type);
+	if (memory) {
+		// Snapshot is imported to memory of new context
+		Py_buffer blob;
+		if (!PyArg_Parse(other, "s*", &blob))
+			return NULL;
+		PyObject *noargs = PyTuple_New(0);
+		PyObject *kwargs = Py_BuildValue("{ssss}", "confdir", self->ctx->confdir,
+				"savedir", self->ctx->savedir);
+		uci = noargs && kwargs ? (uci_object*)PyObject_Call((PyObject*)&uci_type, noargs, kwargs) : NULL;
+		Py_XDECREF(noargs);
+		Py_XDECREF(kwargs);
+		struct import_state st = {uci, NULL, NULL, PyList_New(0), true};
+		bool ok = uci && st.configs && import_blob(&st, &blob);
+		PyBuffer_Release(&blob);
+		if (!ok) {
+			Py_XDECREF(st.configs);
+			Py_XDECREF(uci);
+			return NULL;
+		}
+		if (configs == Py_None)
+			configs = st.configs;
+		Py_INCREF(configs);
+		Py_DECREF(st.configs);
+	} else {
+		// Other object is locked by pyuci_diff_locked
+		uci = (uci_object*)other;
+		Py_INCREF(uci);
+		Py_INCREF(configs);
+	}
+
+	PyObject *ret = NULL, *names = PyDict_New();
+	if (!names)
+		goto exit;
+	if (configs != Py_None) {
+		Py_INCREF(configs);
+		if (!diff_names(names, configs))
+			goto exit;
+	} else if (!diff_names(names, pyuci_list_configs(self, NULL)) ||
+			!diff_names(names, pyuci_list_configs(uci, NULL)))
+		goto exit;
+
+	if (!(ret = PyList_New(0)))
+		goto exit;
+	PyObject *config, *value;
+	Py_ssize_t pos = 0;
+	while (PyDict_Next(names, &pos, &config, &value)) {
+		const char *name = PyUnicode_Check(config) ? PyUnicode_AsUTF8(config) : NULL;
+		struct uci_package *pa, *pb;
+		if (!name) {
+			if (!PyErr_Occurred())
+				PyErr_SetString(PyExc_TypeError, "Config name has to be string");
+			Py_CLEAR(ret);
+			break;
+		}
+		if (!diff_lookup(self, name, false, &pa) || !diff_lookup(uci, name, memory, &pb) ||
+				!diff_package(ret, name, pa, pb)) {
+			Py_CLEAR(ret);
+			break;
+		}
+	}
+
+exit:
+	Py_DECREF(configs);
+	Py_XDECREF(names);
+	Py_DECREF(uci);
+	return ret;
+}
+
+static PyObject *pyuci_confdir(uci_object *self, PyObject *args __attribute__((unused))) {
+	return PyUnicode_FromString(self->ctx->confdir);
+}
+
+static PyObject *pyuci_set_confdir(uci_object *self, PyObject *args) {
+	const char *dir;
+	if (PyArg_ParseTuple(args, "s", &dir))
+		return NULL;
+	if (uci_set_confdir(self->ctx, dir))
+		return pyuci_error(self, UciException);
+	Py_RETURN_NONE;
+}
+
+static PyObject *pyuci_savedir(uci_object *self, PyObject *args __attribute__((unused))) {
+	return PyUnicode_FromString(self->ctx->savedir);
+}
+
+static PyObject *pyuci_set_savedir(uci_object *self, PyObject *args) {
+	const char *dir;
+	if (PyArg_ParseTuple(args, "s", &dir))
+		return NULL;
+	if (uci_set_savedir(self->ctx, dir))
+		return pyuci_error(self, UciException);
+	Py_RETURN_NONE;
+}
+
+// Iterator over sections of package or options of section
+// It holds pointer to next element so it has to be invalidated on modification.
+typedef struct iter_object iter_object;
+typedef PyObject *(*iter_item_func)(iter_object *self, struct uci_element *e);
+
+struct iter_object {
+	PyObject_HEAD
+	uci_object *uci;
+	unsigned long generation;
+	struct uci_list *list;
+	struct uci_element *next;
+	int index;
+	PyObject *type; // Section type filter or NULL
+	iter_item_func item;
+};
+
+static PyTypeObject iter_type;
+
+static PyObject *iter_new(uci_object *uci, struct uci_list *list, PyObject *type, iter_item_func item) {
+	iter_object *self = PyObject_New(iter_object, &iter_type);
+	if (!self)
+		return NULL;
+	Py_INCREF(uci);
+	self->uci = uci;
+	self->generation = uci->generation;
+	self->list = list;
+	self->next = list_to_element(list->next);
+	self->index = 0;
+	Py_XINCREF(type);
+	self->type = type;
+	self->item = item;
+	return (PyObject*)self;
+}
+
+static void iter_dealloc(iter_object *self) {
+	Py_DECREF(self->uci);
+	Py_XDECREF(self->type);
+	PyObject_Del(self);
+}
+
+static PyObject *iter_next(iter_object *self) {
+	const char *type = NULL;
+	if (self->type && !(type = PyUnicode_AsUTF8(self->type)))
+		return NULL;
+	if (!uci_lock(self->uci))
+		return NULL;
+	PyObject *ret = NULL;
+	if (self->generation != self->uci->generation)
+		PyErr_SetString(PyExc_RuntimeError, "Uci was modified during iteration");
+	else
+		while (&self->next->list != self->list) {
+			struct uci_element *e = self->next;
+			self->next = list_to_element(e->list.next);
+			self->index++;
+			if (!type || !strcmp(uci_to_section(e)->type, type)) {
+				ret = self->item(self, e);
+				break;
+			}
+		}
+	uci_unlock(self->uci);
+	return ret;
+}
+
+static PyObject *iter_name(iter_object *self, struct uci_element *e) {
+	return PyUnicode_FromString(e->name);
+}
+
+static PyObject *iter_section_info(iter_object *self, struct uci_element *e) {
+	return section_info(uci_to_section(e), self->index - 1);
+}
+
+static PyObject *iter_section_item(iter_object *self, struct uci_element *e) {
+	PyObject *sec = pyuci_section(uci_to_section(e));
+	if (!sec)
+		return NULL;
+	return Py_BuildValue("(sN)", e->name, sec);
+}
+
+static PyObject *iter_option_item(iter_object *self, struct uci_element *e) {
+	PyObject *opt = pyuci_option(uci_to_option(e));
+	if (!opt)
+		return NULL;
+	return Py_BuildValue("(sN)", e->name, opt);
+}
+
+static PyTypeObject iter_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"uci.Iterator", /* tp_name */
+	sizeof(iter_object), /* tp_basicsize */
+	0, /* tp_itemsize */
+	(destructor)iter_dealloc, /* tp_dealloc */
+	0, /* tp_print */
+	0, /* tp_getattr */
+	0, /* tp_setattr */
+	0, /* tp_reserved */
+	0, /* tp_repr */
+	0, /* tp_as_number */
+	0, /* tp_as_sequence */
+	0, /* tp_as_mapping */
+	0, /* tp_hash  */
+	0, /* tp_call */
+	0, /* tp_str */
+	0, /* tp_getattro */
+	0, /* tp_setattro */
+	0, /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT, /* tp_flgs */
+	"Iterator over uci sections or options", /* tp_doc */
+	0, /* tp_traverse */
+	0, /* tp_clear */
+	0, /* tp_richcompare */
+	0, /* tp_weaklistoffset */
+	PyObject_SelfIter, /* tp_iter */
+	(iternextfunc)iter_next, /* tp_iternext */
+};
+
+// Common implementation of iter_sections, iter_options and foreach
+static PyObject *pyuci_iter_common(uci_object *self, PyObject *args, PyObject *kwds, bool options, iter_item_func item) {
+	static const char *section_keys[] = {"config", "type", NULL};
+	static const char *option_keys[] = {"config", "section", NULL};
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	PyObject *type = NULL;
+
+	if (options) {
+		if (!PyArg_ParseTupleAndKeywords(args, kwds, "ss", (char**)option_keys, &ptr.package, &ptr.section))
+			return NULL;
+	} else {
+		if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|O", (char**)section_keys, &ptr.package, &type))
+			return NULL;
+		if (type == Py_None)
+			type = NULL;
+		if (type && !PyUnicode_Check(type)) {
+			PyErr_SetString(PyExc_TypeError, "Section type has to be string or None");
+			return NULL;
+		}
+	}
+
+	if (pyuci_lookup(self, &ptr, NULL) < 0)
+		return NULL;
+	if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
+		PyErr_SetNone(UciExcNotFound);
+		return NULL;
+	}
+	if (options)
+		return iter_new(self, &ptr.s->options, NULL, item);
+	return iter_new(self, &ptr.p->sections, type, item);
+}
+
+static PyObject *pyuci_iter_sections(uci_object *self, PyObject *args, PyObject *kwds) {
+	return pyuci_iter_common(self, args, kwds, false, iter_section_info);
+}
+
+static PyObject *pyuci_iter_options(uci_object *self, PyObject *args, PyObject *kwds) {
+	return pyuci_iter_common(self, args, kwds, true, iter_option_item);
+}
+
+static PyObject *pyuci_foreach(uci_object *self, PyObject *args, PyObject *kwds) {
+	return pyuci_iter_common(self, args, kwds, false, iter_section_item);
+}
+
+static PyObject *pyuci_sections(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"config", "type", NULL};
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+	PyObject *type = Py_None;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|O", (char**)keys, &ptr.package, &type))
+		return NULL;
+	if (type != Py_None && !PyUnicode_Check(type)) {
+		PyErr_SetString(PyExc_TypeError, "Section type has to be string or None");
+		return NULL;
+	}
+
+	if (pyuci_lookup(self, &ptr, NULL) < 0)
+		return NULL;
+	if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
+		PyErr_SetNone(UciExcNotFound);
+		return NULL;
+	}
+	PyObject *index = type_index(self, ptr.p);
+	if (!index)
+		return NULL;
+	PyObject *list = PyDict_GetItemWithError(PyTuple_GET_ITEM(index, 0), type);
+	if (!list)
+		return PyErr_Occurred() ? NULL : PyList_New(0);
+	return PyList_GetSlice(list, 0, PyList_GET_SIZE(list));
+}
+
+// Read-only mapping views over package or section
+// These are not holding any libuci pointer. Package and section are located by
+// name on every access so they are never invalid, they just might not exist.
+typedef struct {
+	PyObject_HEAD
+	uci_object *uci;
+	PyObject *package;
+	PyObject *section; // NULL for package view
+} view_object;
+
+static PyTypeObject package_view_type;
+static PyTypeObject section_view_type;
+
+static PyObject *view_new(uci_object *uci, PyObject *package, PyObject *section) {
+	view_object *self = PyObject_New(view_object, section ? &section_view_type : &package_view_type);
+	if (!self)
+		return NULL;
+	Py_INCREF(uci);
+	self->uci = uci;
+	Py_INCREF(package);
+	self->package = package;
+	Py_XINCREF(section);
+	self->section = section;
+	return (PyObject*)self;
+}
+
+static void view_dealloc(view_object *self) {
+	Py_DECREF(self->uci);
+	Py_DECREF(self->package);
+	Py_XDECREF(self->section);
+	PyObject_Del(self);
+}
+
+// Returns section view is backed by (or package for package view)
+static struct uci_element *view_element(view_object *self) {
+	if (!self->uci->ctx) {
+		PyErr_SetString(UciException, "Uci context is not initialized");
+		return NULL;
+	}
+	const char *name = PyUnicode_AsUTF8(self->package);
+	if (!name)
+		return NULL;
+	struct uci_element *e = find_element(&self->uci->ctx->root, name);
+	if (e && self->section) {
+		if (!(name = PyUnicode_AsUTF8(self->section)))
+			return NULL;
+		e = find_element(&uci_to_package(e)->sections, name);
+	}
+	if (!e)
+		PyErr_SetNone(UciExcNotFound);
+	return e;
+}
+
+// Returns list of elements view is backed by
+static struct uci_list *view_list(view_object *self) {
+	struct uci_element *e = view_element(self);
+	if (!e)
+		return NULL;
+	if (self->section)
+		return &uci_to_section(e)->options;
+	return &uci_to_package(e)->sections;
+}
+
+// Lookup element for given key. Raises KeyError if there is no such element.
+static struct uci_element *view_lookup(view_object *self, PyObject *key) {
+	struct uci_list *list = view_list(self);
+	if (!list)
+		return NULL;
+	if (PyUnicode_Check(key)) {
+		const char *name = PyUnicode_AsUTF8(key);
+		if (!name)
+			return NULL;
+		struct uci_element *e = find_element(list, name);
+		if (e)
+			return e;
+	}
+	PyErr_SetObject(PyExc_KeyError, key);
+	return NULL;
+}
+
+// Python representation of element in view
+static PyObject *view_value(view_object *self, struct uci_element *e, PyObject *name) {
+	if (self->section)
+		return pyuci_option(uci_to_option(e));
+	if (name)
+		return view_new(self->uci, self->package, name);
+	if (!(name = PyUnicode_FromString(e->name)))
+		return NULL;
+	PyObject *ret = view_new(self->uci, self->package, name);
+	Py_DECREF(name);
+	return ret;
+}
+
+static Py_ssize_t view_length(view_object *self) {
+	if (!uci_lock(self->uci))
+		return -1;
+	Py_ssize_t ret = -1;
+	struct uci_list *list = view_list(self);
+	if (list) {
+		struct uci_element *e;
+		ret = 0;
+		uci_foreach_element(list, e)
+			ret++;
+	}
+	uci_unlock(self->uci);
+	return ret;
+}
+
+static PyObject *view_subscript(view_object *self, PyObject *key) {
+	if (!uci_lock(self->uci))
 		return NULL;
+	PyObject *ret = NULL;
+	struct uci_element *e = view_lookup(self, key);
+	if (e)
+		ret = view_value(self, e, key);
+	uci_unlock(self->uci);
+	return ret;
+}
 
-	struct uci_element *e, *tmp;
-	uci_foreach_element_safe(&self->ctx->root, tmp, e) {
-		struct uci_package *p = uci_to_package(e);
-		if (ptr.p && (ptr.p != p))
-			continue;
-		ptr.p = p;
-		switch (cmd) {
-		case CMD_SAVE:
-			uci_save(self->ctx, p);
-			break;
-		case CMD_COMMIT:
-			uci_commit(self->ctx, &p, false);
-			break;
-		case CMD_REVERT:
-			uci_revert(self->ctx, &ptr);
-			break;
+static int view_contains(view_object *self, PyObject *key) {
+	if (!uci_lock(self->uci))
+		return -1;
+	int ret = 1;
+	if (!view_lookup(self, key)) {
+		ret = -1;
+		if (PyErr_ExceptionMatches(PyExc_KeyError)) {
+			PyErr_Clear();
+			ret = 0;
 		}
 	}
-	self->tainted = false;
-	Py_RETURN_NONE;
+	uci_unlock(self->uci);
+	return ret;
 }
 
-static PyObject *pyuci_save(uci_object *self, PyObject *args) {
-	return package_cmd(self, args, CMD_SAVE);
+// Classes of collections.abc used for keys(), values() and items() of views
+static PyObject *keys_view_class;
+static PyObject *values_view_class;
+static PyObject *items_view_class;
+
+static PyObject *view_keys(view_object *self, PyObject *args __attribute__((unused))) {
+	return PyObject_CallFunctionObjArgs(keys_view_class, (PyObject*)self, NULL);
 }
 
-static PyObject *pyuci_commit(uci_object *self, PyObject *args) {
-	return package_cmd(self, args, CMD_COMMIT);
+static PyObject *view_values(view_object *self, PyObject *args __attribute__((unused))) {
+	return PyObject_CallFunctionObjArgs(values_view_class, (PyObject*)self, NULL);
 }
 
-static PyObject *pyuci_revert(uci_object *self, PyObject *args) {
-	return package_cmd(self, args, CMD_REVERT);
+static PyObject *view_items(view_object *self, PyObject *args __attribute__((unused))) {
+	return PyObject_CallFunctionObjArgs(items_view_class, (PyObject*)self, NULL);
 }
 
-static PyObject *pyuci_unload(uci_object *self, PyObject *args) {
-	// TODO
-	PyErr_SetNone(PyExc_NotImplementedError);
-	return NULL;
+static PyObject *view_get(view_object *self, PyObject *args) {
+	PyObject *key, *def = Py_None;
+	if (!PyArg_ParseTuple(args, "O|O", &key, &def))
+		return NULL;
+	if (!uci_lock(self->uci))
+		return NULL;
+	PyObject *ret = NULL;
+	struct uci_element *e = view_lookup(self, key);
+	if (e)
+		ret = view_value(self, e, key);
+	else if (PyErr_ExceptionMatches(PyExc_KeyError)) {
+		PyErr_Clear();
+		Py_INCREF(def);
+		ret = def;
+	}
+	uci_unlock(self->uci);
+	return ret;
 }
 
-static PyObject *pyuci_load(uci_object *self, PyObject *args) {
-	// TODO
-	PyErr_SetNone(PyExc_NotImplementedError);
-	return NULL;
+static PyObject *view_iter(view_object *self) {
+	if (!uci_lock(self->uci))
+		return NULL;
+	PyObject *ret = NULL;
+	struct uci_list *list = view_list(self);
+	if (list)
+		ret = iter_new(self->uci, list, NULL, iter_name);
+	uci_unlock(self->uci);
+	return ret;
 }
 
-static PyObject *pyuci_changes(uci_object *self, PyObject *args) {
-	// TODO
-	PyErr_SetNone(PyExc_NotImplementedError);
-	return NULL;
+static PyObject *view_get_name(view_object *self, void *closure __attribute__((unused))) {
+	Py_INCREF(self->section);
+	return self->section;
 }
 
-static PyObject *pyuci_list_configs(uci_object *self, PyObject *args) {
-	char **configs = NULL;
-	char **ptr;
+static PyObject *view_get_type(view_object *self, void *closure __attribute__((unused))) {
+	if (!uci_lock(self->uci))
+		return NULL;
+	PyObject *ret = NULL;
+	struct uci_element *e = view_element(self);
+	if (e)
+		ret = PyUnicode_FromString(uci_to_section(e)->type);
+	uci_unlock(self->uci);
+	return ret;
+}
 
-	if ((uci_list_configs(self->ctx, &configs) != UCI_OK) || !configs)
-		return pyuci_error(self, UciException);
+static PyMappingMethods view_as_mapping = {
+	(lenfunc)view_length, /* mp_length */
+	(binaryfunc)view_subscript, /* mp_subscript */
+	0, /* mp_ass_subscript */
+};
 
-	PyObject *ret = PyList_New(0);
-	for (ptr = configs; *ptr; ptr++)
-		if (PyList_Append(ret, PyUnicode_FromString(*ptr)))
-			return NULL;
+static PySequenceMethods view_as_sequence = {
+	0, /* sq_length */
+	0, /* sq_concat */
+	0, /* sq_repeat */
+	0, /* sq_item */
+	0, /* was_sq_slice */
+	0, /* sq_ass_item */
+	0, /* was_sq_ass_slice */
+	(objobjproc)view_contains, /* sq_contains */
+	0, /* sq_inplace_concat */
+	0, /* sq_inplace_repeat */
+};
 
-	return ret;
-}
+static PyMethodDef view_methods[] = {
+	{"keys", (PyCFunction)view_keys, METH_NOARGS, "Set-like view of keys"},
+	{"values", (PyCFunction)view_values, METH_NOARGS, "View of values"},
+	{"items", (PyCFunction)view_items, METH_NOARGS, "Set-like view of key and value pairs"},
+	{"get", (PyCFunction)view_get, METH_VARARGS, "Get value for key or default"},
+	{NULL}
+};
 
-static PyObject *pyuci_confdir(uci_object *self, PyObject *args __attribute__((unused))) {
-	return PyUnicode_FromString(self->ctx->confdir);
+static PyGetSetDef section_view_getset[] = {
+	{"name", (getter)view_get_name, NULL, "Name of section", NULL},
+	{"type", (getter)view_get_type, NULL, "Type of section", NULL},
+	{NULL}
+};
+
+static PyTypeObject package_view_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"uci.PackageView", /* tp_name */
+	sizeof(view_object), /* tp_basicsize */
+	0, /* tp_itemsize */
+	(destructor)view_dealloc, /* tp_dealloc */
+	0, /* tp_print */
+	0, /* tp_getattr */
+	0, /* tp_setattr */
+	0, /* tp_reserved */
+	0, /* tp_repr */
+	0, /* tp_as_number */
+	&view_as_sequence, /* tp_as_sequence */
+	&view_as_mapping, /* tp_as_mapping */
+	0, /* tp_hash  */
+	0, /* tp_call */
+	0, /* tp_str */
+	0, /* tp_getattro */
+	0, /* tp_setattro */
+	0, /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT, /* tp_flgs */
+	"Read-only mapping of section names to section views of uci package", /* tp_doc */
+	0, /* tp_traverse */
+	0, /* tp_clear */
+	0, /* tp_richcompare */
+	0, /* tp_weaklistoffset */
+	(getiterfunc)view_iter, /* tp_iter */
+	0, /* tp_iternext */
+	view_methods, /* tp_method */
+	0, /* tp_members */
+	0, /* tp_getset */
+};
+
+static PyTypeObject section_view_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"uci.SectionView", /* tp_name */
+	sizeof(view_object), /* tp_basicsize */
+	0, /* tp_itemsize */
+	(destructor)view_dealloc, /* tp_dealloc */
+	0, /* tp_print */
+	0, /* tp_getattr */
+	0, /* tp_setattr */
+	0, /* tp_reserved */
+	0, /* tp_repr */
+	0, /* tp_as_number */
+	&view_as_sequence, /* tp_as_sequence */
+	&view_as_mapping, /* tp_as_mapping */
+	0, /* tp_hash  */
+	0, /* tp_call */
+	0, /* tp_str */
+	0, /* tp_getattro */
+	0, /* tp_setattro */
+	0, /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT, /* tp_flgs */
+	"Read-only mapping of option names to values of uci section", /* tp_doc */
+	0, /* tp_traverse */
+	0, /* tp_clear */
+	0, /* tp_richcompare */
+	0, /* tp_weaklistoffset */
+	(getiterfunc)view_iter, /* tp_iter */
+	0, /* tp_iternext */
+	view_methods, /* tp_method */
+	0, /* tp_members */
+	section_view_getset, /* tp_getset */
+};
+
+static PyObject *pyuci_view(uci_object *self, PyObject *args) {
+	PyObject *package, *section = NULL;
+	struct uci_ptr ptr;
+	memset(&ptr, 0, sizeof ptr);
+
+	if (!PyArg_ParseTuple(args, "U|U", &package, &section))
+		return NULL;
+	if (!(ptr.package = PyUnicode_AsUTF8(package)))
+		return NULL;
+	if (section && !(ptr.section = PyUnicode_AsUTF8(section)))
+		return NULL;
+	if (pyuci_lookup(self, &ptr, NULL) < 0)
+		return NULL;
+	if (!(ptr.flags & UCI_LOOKUP_COMPLETE)) {
+		PyErr_SetNone(UciExcNotFound);
+		return NULL;
+	}
+	return view_new(self, package, section);
 }
 
-static PyObject *pyuci_set_confdir(uci_object *self, PyObject *args) {
-	const char *dir;
-	if (PyArg_ParseTuple(args, "s", &dir))
+static PyObject *pyuci_set_stats(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"enabled", "slow_callback", "slow_threshold", NULL};
+	int enabled = 1;
+	PyObject *callback = Py_None;
+	double threshold = 0.1;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|pOd", (char**)keys, &enabled, &callback, &threshold))
 		return NULL;
-	if (uci_set_confdir(self->ctx, dir))
-		return pyuci_error(self, UciException);
+	if (callback != Py_None && !PyCallable_Check(callback)) {
+		PyErr_SetString(PyExc_TypeError, "slow_callback has to be callable");
+		return NULL;
+	}
+	if (!enabled) {
+		stats_free(self);
+		Py_RETURN_NONE;
+	}
+	// Counters are kept if statistics are already enabled
+	if (!self->stats && !(self->stats = calloc(1, sizeof *self->stats)))
+		return PyErr_NoMemory();
+	Py_CLEAR(self->stats->slow_callback);
+	if (callback != Py_None) {
+		Py_INCREF(callback);
+		self->stats->slow_callback = callback;
+	}
+	self->stats->slow_threshold = threshold;
 	Py_RETURN_NONE;
 }
 
-static PyObject *pyuci_savedir(uci_object *self, PyObject *args __attribute__((unused))) {
-	return PyUnicode_FromString(self->ctx->savedir);
+static PyObject *pyuci_stats(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"reset", NULL};
+	int reset = 0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|p", (char**)keys, &reset))
+		return NULL;
+	struct uci_stats *stats = self->stats;
+	if (!stats)
+		Py_RETURN_NONE;
+
+	PyObject *methods = PyDict_New();
+	if (!methods)
+		return NULL;
+	size_t i;
+	for (i = 0; i < stats->methods_cnt; i++) {
+		struct stats_method *m = &stats->methods[i];
+		PyObject *value = Py_BuildValue("{s:k,s:d,s:d}", "calls", m->calls, "total", m->total, "max", m->max);
+		if (!value || PyDict_SetItemString(methods, m->name, value)) {
+			Py_XDECREF(value);
+			Py_DECREF(methods);
+			return NULL;
+		}
+		Py_DECREF(value);
+	}
+	PyObject *ret = Py_BuildValue("{s:N,s:k,s:d,s:k,s:K,s:d,s:k,s:k}",
+		"methods", methods,
+		"loads", stats->loads,
+		"load_time", stats->load_time,
+		"commits", stats->commits,
+		"commit_bytes", stats->commit_bytes,
+		"commit_time", stats->commit_time,
+		"cache_hits", stats->cache_hits,
+		"cache_misses", stats->cache_misses);
+	if (ret && reset) {
+		// Configuration of slow callback is kept
+		PyObject *callback = stats->slow_callback;
+		double threshold = stats->slow_threshold;
+		memset(stats, 0, sizeof *stats);
+		stats->slow_callback = callback;
+		stats->slow_threshold = threshold;
+	}
+	return ret;
 }
 
-static PyObject *pyuci_set_savedir(uci_object *self, PyObject *args) {
-	const char *dir;
-	if (PyArg_ParseTuple(args, "s", &dir))
+// Define variant NAME_locked of method NAME that holds object lock during the call
+// and records it in statistics
+#define LOCKED(NAME) \
+	static PyObject *NAME##_locked(uci_object *self, PyObject *args) { \
+		if (!uci_lock(self)) \
+			return NULL; \
+		double start = self->stats ? monotonic() : 0; \
+		PyObject *ret = NAME(self, args); \
+		uci_unlock(self); \
+		return stats_method(self, #NAME + strlen("pyuci_"), start, ret); \
+	}
+#define LOCKED_KW(NAME) \
+	static PyObject *NAME##_locked(uci_object *self, PyObject *args, PyObject *kwds) { \
+		if (!uci_lock(self)) \
+			return NULL; \
+		double start = self->stats ? monotonic() : 0; \
+		PyObject *ret = NAME(self, args, kwds); \
+		uci_unlock(self); \
+		return stats_method(self, #NAME + strlen("pyuci_"), start, ret); \
+	}
+
+LOCKED(pyuci_enter)
+LOCKED(pyuci_exit)
+LOCKED_KW(pyuci_get)
+LOCKED(pyuci_get_all)
+LOCKED_KW(pyuci_get_many)
+LOCKED(pyuci_view)
+LOCKED_KW(pyuci_iter_sections)
+LOCKED_KW(pyuci_iter_options)
+LOCKED_KW(pyuci_foreach)
+LOCKED_KW(pyuci_sections)
+LOCKED(pyuci_set)
+LOCKED(pyuci_delete)
+LOCKED(pyuci_add)
+LOCKED(pyuci_add_many)
+LOCKED(pyuci_rename)
+LOCKED(pyuci_reorder)
+LOCKED_KW(pyuci_apply)
+LOCKED(pyuci_save)
+LOCKED(pyuci_commit)
+LOCKED_KW(pyuci_commit_many)
+LOCKED(pyuci_revert)
+LOCKED(pyuci_dirty_packages)
+LOCKED(pyuci_unload)
+LOCKED(pyuci_load)
+LOCKED(pyuci_loaded)
+LOCKED(pyuci_changes)
+LOCKED(pyuci_has_changes)
+LOCKED(pyuci_list_configs)
+LOCKED_KW(pyuci_export)
+LOCKED(pyuci_import)
+LOCKED_KW(pyuci_find)
+LOCKED(pyuci_confdir)
+LOCKED(pyuci_set_confdir)
+LOCKED(pyuci_savedir)
+LOCKED(pyuci_set_savedir)
+
+// Diff with other Uci object requires locks of both objects. They are always
+// taken in order of their addresses so a.diff(b) and b.diff(a) called
+// concurrently can't deadlock.
+static PyObject *pyuci_diff_locked(uci_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"other", "configs", NULL};
+	PyObject *other, *configs;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", (char**)keys, &other, &configs))
 		return NULL;
-	if (uci_set_savedir(self->ctx, dir))
-		return pyuci_error(self, UciException);
-	Py_RETURN_NONE;
+	uci_object *first = self, *second = NULL;
+	if (PyObject_TypeCheck(other, &uci_type) && other != (PyObject*)self) {
+		second = (uci_object*)other;
+		if (second < first) {
+			second = self;
+			first = (uci_object*)other;
+		}
+	}
+	if (!uci_lock(first))
+		return NULL;
+	if (second && !uci_lock(second)) {
+		uci_unlock(first);
+		return NULL;
+	}
+	double start = self->stats ? monotonic() : 0;
+	PyObject *ret = pyuci_diff(self, args, kwds);
+	if (second)
+		uci_unlock(second);
+	uci_unlock(first);
+	return stats_method(self, "diff", start, ret);
 }
 
 static PyMethodDef uci_methods[] = {
-	{"__enter__", (PyCFunction)pyuci_enter, METH_VARARGS, "Enter context"},
-	{"__exit__", (PyCFunction)pyuci_exit, METH_VARARGS, "Exit context"},
-	{"get", (PyCFunction)pyuci_get, METH_VARARGS, "Get value"},
-	{"get_all", (PyCFunction)pyuci_get_all, METH_VARARGS, "Get all values even for sections"},
-	{"set", (PyCFunction)pyuci_set, METH_VARARGS, "Set value"},
-	{"delete", (PyCFunction)pyuci_delete, METH_VARARGS, "Delete option"},
-	{"add", (PyCFunction)pyuci_add, METH_VARARGS, "Add new anonymous section"},
-	{"rename", (PyCFunction)pyuci_rename, METH_VARARGS, "Rename an element"},
-	{"reorder", (PyCFunction)pyuci_reorder, METH_VARARGS, "Reposition a section"},
-	{"save", (PyCFunction)pyuci_save, METH_VARARGS, "Save change delta for given package"},
-	{"commit", (PyCFunction)pyuci_commit, METH_VARARGS, "Commit changed configuration to coresponding file in confdir"},
-	{"revert", (PyCFunction)pyuci_revert, METH_VARARGS, "Revert all changes config item"},
-	{"unload", (PyCFunction)pyuci_unload, METH_VARARGS, "Unload a config file from uci object"},
-	{"load", (PyCFunction)pyuci_load, METH_VARARGS, "Parse an uci file and store it in the uci object"},
-	{"changes", (PyCFunction)pyuci_changes, METH_VARARGS, "Return set of changes in loaded configuration"},
-	{"list_configs", (PyCFunction)pyuci_list_configs, METH_VARARGS, "List available config files"},
-	{"confdir", (PyCFunction)pyuci_confdir, METH_VARARGS, "Returns current confdir"},
-	{"set_confdir", (PyCFunction)pyuci_set_confdir, METH_VARARGS, "Change used confdir"},
-	{"savedir", (PyCFunction)pyuci_savedir, METH_VARARGS, "Returns current savedir"},
-	{"set_savedir", (PyCFunction)pyuci_set_savedir, METH_VARARGS, "Change used savedir"},
-	// TODO somehow allow iteration
+	{"__enter__", (PyCFunction)pyuci_enter_locked, METH_VARARGS, "Enter context"},
+	{"__exit__", (PyCFunction)pyuci_exit_locked, METH_VARARGS, "Exit context"},
+	{"get", (PyCFunction)pyuci_get_locked, METH_VARARGS | METH_KEYWORDS, "Get value"},
+	{"get_all", (PyCFunction)pyuci_get_all_locked, METH_VARARGS, "Get all values even for sections"},
+	{"get_many", (PyCFunction)pyuci_get_many_locked, METH_VARARGS | METH_KEYWORDS, "Get values for multiple paths at once"},
+	{"view", (PyCFunction)pyuci_view_locked, METH_VARARGS, "Get read-only mapping view of package or section"},
+	{"iter_sections", (PyCFunction)pyuci_iter_sections_locked, METH_VARARGS | METH_KEYWORDS, "Iterate over sections of package"},
+	{"iter_options", (PyCFunction)pyuci_iter_options_locked, METH_VARARGS | METH_KEYWORDS, "Iterate over options of section"},
+	{"foreach", (PyCFunction)pyuci_foreach_locked, METH_VARARGS | METH_KEYWORDS, "Iterate over sections of package with their content"},
+	{"sections", (PyCFunction)pyuci_sections_locked, METH_VARARGS | METH_KEYWORDS, "List metadata of sections in package"},
+	{"set", (PyCFunction)pyuci_set_locked, METH_VARARGS, "Set value"},
+	{"delete", (PyCFunction)pyuci_delete_locked, METH_VARARGS, "Delete option"},
+	{"add", (PyCFunction)pyuci_add_locked, METH_VARARGS, "Add new anonymous section"},
+	{"add_many", (PyCFunction)pyuci_add_many_locked, METH_VARARGS, "Add multiple anonymous sections with options"},
+	{"rename", (PyCFunction)pyuci_rename_locked, METH_VARARGS, "Rename an element"},
+	{"reorder", (PyCFunction)pyuci_reorder_locked, METH_VARARGS, "Reposition a section"},
+	{"apply", (PyCFunction)pyuci_apply_locked, METH_VARARGS | METH_KEYWORDS, "Apply multiple modifications at once"},
+	{"save", (PyCFunction)pyuci_save_locked, METH_VARARGS, "Save change delta for given package"},
+	{"commit", (PyCFunction)pyuci_commit_locked, METH_VARARGS, "Commit changed configuration to coresponding file in confdir"},
+	{"commit_many", (PyCFunction)pyuci_commit_many_locked, METH_VARARGS | METH_KEYWORDS, "Commit multiple configs at once"},
+	{"revert", (PyCFunction)pyuci_revert_locked, METH_VARARGS, "Revert all changes config item"},
+	{"dirty_packages", (PyCFunction)pyuci_dirty_packages_locked, METH_NOARGS, "List packages modified since their last save, commit or revert"},
+	{"unload", (PyCFunction)pyuci_unload_locked, METH_VARARGS, "Unload a config file from uci object"},
+	{"load", (PyCFunction)pyuci_load_locked, METH_VARARGS, "Parse an uci file and store it in the uci object"},
+	{"loaded", (PyCFunction)pyuci_loaded_locked, METH_NOARGS, "List configs loaded in uci object"},
+	{"changes", (PyCFunction)pyuci_changes_locked, METH_VARARGS, "Return list of changes that are not committed"},
+	{"has_changes", (PyCFunction)pyuci_has_changes_locked, METH_VARARGS, "Check if there are changes that are not committed"},
+	{"export", (PyCFunction)pyuci_export_locked, METH_VARARGS | METH_KEYWORDS, "Serialize configs to JSON or binary format"},
+	{"import_", (PyCFunction)pyuci_import_locked, METH_VARARGS, "Import configs serialized by export"},
+	{"find", (PyCFunction)pyuci_find_locked, METH_VARARGS | METH_KEYWORDS, "Find options by name, value and section type"},
+	{"diff", (PyCFunction)pyuci_diff_locked, METH_VARARGS | METH_KEYWORDS, "Operations changing configs to state of other Uci or snapshot"},
+	{"list_configs", (PyCFunction)pyuci_list_configs_locked, METH_VARARGS, "List available config files"},
+	{"confdir", (PyCFunction)pyuci_confdir_locked, METH_VARARGS, "Returns current confdir"},
+	{"set_confdir", (PyCFunction)pyuci_set_confdir_locked, METH_VARARGS, "Change used confdir"},
+	{"savedir", (PyCFunction)pyuci_savedir_locked, METH_VARARGS, "Returns current savedir"},
+	{"set_savedir", (PyCFunction)pyuci_set_savedir_locked, METH_VARARGS, "Change used savedir"},
+	// Statistics do not access context so they are protected just by GIL and
+	// calls of these methods are not recorded in them.
+	{"set_stats", (PyCFunction)pyuci_set_stats, METH_VARARGS | METH_KEYWORDS, "Enable or disable statistics"},
+	{"stats", (PyCFunction)pyuci_stats, METH_VARARGS | METH_KEYWORDS, "Get collected statistics"},
 	{NULL}
 };
 
@@ -514,6 +4350,261 @@ static PyTypeObject uci_type = {
 	0, /* tp_weaklist */
 };
 
+// Pool of reusable Uci objects
+// Objects are kept with loaded packages when they are returned to pool. Packages
+// with files that changed since they were loaded are unloaded on next lease.
+
+typedef struct {
+	PyObject_HEAD
+	PyObject *factory; // Type of pooled objects (Uci or its subtype)
+	PyObject *kwargs; // Keyword arguments for factory (confdir and savedir)
+	PyObject *preload; // Tuple of configs loaded on lease
+	Py_ssize_t size; // Maximum number of idle objects
+	PyObject *idle; // List of idle objects
+} pool_object;
+
+// Unload package of pooled object. Changes that were not saved are dropped.
+static bool pool_unload(uci_object *self, struct uci_package *p) {
+	pyuci_invalidate(self, p->e.name);
+	dirty_clear(self, p->e.name);
+	if (PyDict_DelItemString(self->signatures, p->e.name)) {
+		if (!PyErr_ExceptionMatches(PyExc_KeyError))
+			return false;
+		PyErr_Clear();
+	}
+	uci_unload(self->ctx, p);
+	return true;
+}
+
+// Prepare object for lease. Packages that changed are unloaded and configs to
+// preload are loaded.
+static bool pool_prepare(pool_object *pool, uci_object *self) {
+	struct uci_element *e, *tmp;
+	uci_foreach_element_safe(&self->ctx->root, tmp, e) {
+		PyObject *sig = package_signature(self, e->name);
+		if (!sig)
+			return false;
+		PyObject *old = PyDict_GetItemString(self->signatures, e->name);
+		int same = old ? PyObject_RichCompareBool(old, sig, Py_EQ) : 0;
+		Py_DECREF(sig);
+		if (same < 0 || (!same && !pool_unload(self, uci_to_package(e))))
+			return false;
+	}
+
+	Py_ssize_t i;
+	for (i = 0; i < PyTuple_GET_SIZE(pool->preload); i++) {
+		const char *name = PyUnicode_AsUTF8(PyTuple_GET_ITEM(pool->preload, i));
+		if (!name)
+			return false;
+		struct uci_ptr ptr;
+		memset(&ptr, 0, sizeof ptr);
+		ptr.package = name;
+		int err = lookup_load(self, &ptr);
+		if (err || !ptr.p) {
+			if (err >= 0)
+				pyuci_error(self, UciException);
+			return false;
+		}
+	}
+	return true;
+}
+
+// Reset object returned to pool. Changes that were not saved are dropped.
+// Packages without recorded signature are unloaded as it is unknown what state of
+// files they were loaded from.
+static bool pool_reset(uci_object *self) {
+	pyuci_invalidate(self, NULL);
+	struct uci_element *e, *tmp;
+	uci_foreach_element_safe(&self->ctx->root, tmp, e)
+		if ((dirty_check(self, e->name) || !PyDict_GetItemString(self->signatures, e->name)) &&
+				!pool_unload(self, uci_to_package(e)))
+			return false;
+	dirty_free(self);
+	return true;
+}
+
+// Return leased object to its pool. Object has to be locked. Object can't be used
+// after this until it is leased again (that is never if it is dropped).
+static bool pool_return(uci_object *self) {
+	pool_object *pool = (pool_object*)self->pool;
+	self->pool = NULL;
+	self->released = true;
+	bool ok = pool_reset(self);
+	// Object is dropped if pool is full or if it can't be reset
+	if (ok && PyList_GET_SIZE(pool->idle) < pool->size)
+		ok = !PyList_Append(pool->idle, (PyObject*)self);
+	Py_DECREF(pool);
+	return ok;
+}
+
+static void pool_dealloc(pool_object *self) {
+	Py_XDECREF(self->factory);
+	Py_XDECREF(self->kwargs);
+	Py_XDECREF(self->preload);
+	Py_XDECREF(self->idle);
+	Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static int pool_init(pool_object *self, PyObject *args, PyObject *kwds) {
+	static const char *keys[] = {"confdir", "savedir", "size", "preload", "factory", NULL};
+	PyObject *confdir = Py_None, *savedir = Py_None, *preload = NULL, *factory = (PyObject*)&uci_type;
+	Py_ssize_t size = 4;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOnOO", (char**)keys,
+				&confdir, &savedir, &size, &preload, &factory))
+		return -1;
+	if (!PyType_Check(factory) || !PyType_IsSubtype((PyTypeObject*)factory, &uci_type)) {
+		PyErr_SetString(PyExc_TypeError, "factory has to be uci.Uci or its subtype");
+		return -1;
+	}
+
+	PyObject *kwargs = PyDict_New();
+	PyObject *configs = preload ? PySequence_Tuple(preload) : PyTuple_New(0);
+	bool ok = kwargs && configs &&
+		(confdir == Py_None || !PyDict_SetItemString(kwargs, "confdir", confdir)) &&
+		(savedir == Py_None || !PyDict_SetItemString(kwargs, "savedir", savedir));
+	Py_ssize_t i;
+	for (i = 0; ok && i < PyTuple_GET_SIZE(configs); i++)
+		if (!PyUnicode_Check(PyTuple_GET_ITEM(configs, i))) {
+			PyErr_SetString(PyExc_TypeError, "Names of configs to preload have to be strings");
+			ok = false;
+		}
+	if (!ok) {
+		Py_XDECREF(kwargs);
+		Py_XDECREF(configs);
+		return -1;
+	}
+
+	Py_XDECREF(self->kwargs);
+	self->kwargs = kwargs;
+	Py_XDECREF(self->preload);
+	self->preload = configs;
+	Py_INCREF(factory);
+	Py_XDECREF(self->factory);
+	self->factory = factory;
+	self->size = size;
+	Py_XDECREF(self->idle);
+	self->idle = PyList_New(0);
+	return self->idle ? 0 : -1;
+}
+
+static PyObject *pool_acquire(pool_object *self, PyObject *args __attribute__((unused))) {
+	if (!self->idle) {
+		PyErr_SetString(PyExc_RuntimeError, "ContextPool is not initialized");
+		return NULL;
+	}
+	uci_object *uci;
+	Py_ssize_t cnt = PyList_GET_SIZE(self->idle);
+	if (cnt) {
+		uci = (uci_object*)PyList_GET_ITEM(self->idle, cnt - 1);
+		Py_INCREF(uci);
+		if (PyList_SetSlice(self->idle, cnt - 1, cnt, NULL)) {
+			Py_DECREF(uci);
+			return NULL;
+		}
+		uci->released = false;
+	} else {
+		PyObject *noargs = PyTuple_New(0);
+		uci = noargs ? (uci_object*)PyObject_Call(self->factory, noargs, self->kwargs) : NULL;
+		Py_XDECREF(noargs);
+		if (!uci)
+			return NULL;
+		if (!uci->signatures && !(uci->signatures = PyDict_New())) {
+			Py_DECREF(uci);
+			return NULL;
+		}
+	}
+
+	if (!uci_lock(uci)) {
+		Py_DECREF(uci);
+		return NULL;
+	}
+	bool ok = uci->ctx != NULL;
+	if (!ok)
+		PyErr_SetString(UciException, "Uci object is not initialized");
+	ok = ok && pool_prepare(self, uci);
+	if (ok) {
+		Py_INCREF(self);
+		uci->pool = (PyObject*)self;
+	}
+	uci_unlock(uci);
+	if (!ok) {
+		Py_DECREF(uci);
+		return NULL;
+	}
+	return (PyObject*)uci;
+}
+
+static PyObject *pool_release(pool_object *self, PyObject *args) {
+	uci_object *uci;
+	if (!PyArg_ParseTuple(args, "O!", &uci_type, &uci))
+		return NULL;
+	if (uci->pool != (PyObject*)self) {
+		PyErr_SetString(PyExc_ValueError, "Uci object is not leased from this pool");
+		return NULL;
+	}
+	if (!uci_lock(uci))
+		return NULL;
+	bool ok = pool_return(uci);
+	uci_unlock(uci);
+	if (!ok)
+		return NULL;
+	Py_RETURN_NONE;
+}
+
+static PyObject *pool_clear(pool_object *self, PyObject *args __attribute__((unused))) {
+	if (self->idle && PyList_SetSlice(self->idle, 0, PyList_GET_SIZE(self->idle), NULL))
+		return NULL;
+	Py_RETURN_NONE;
+}
+
+static PyMethodDef pool_methods[] = {
+	{"acquire", (PyCFunction)pool_acquire, METH_NOARGS, "Lease Uci object from pool"},
+	{"release", (PyCFunction)pool_release, METH_VARARGS, "Return leased Uci object to pool"},
+	{"clear", (PyCFunction)pool_clear, METH_NOARGS, "Drop all idle Uci objects"},
+	{NULL}
+};
+
+static PyTypeObject pool_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"uci.ContextPool", /* tp_name */
+	sizeof(pool_object), /* tp_basicsize */
+	0, /* tp_itemsize */
+	(destructor)pool_dealloc, /* tp_dealloc */
+	0, /* tp_print */
+	0, /* tp_getattr */
+	0, /* tp_setattr */
+	0, /* tp_reserved */
+	0, /* tp_repr */
+	0, /* tp_as_number */
+	0, /* tp_as_sequence */
+	0, /* tp_as_mapping */
+	0, /* tp_hash  */
+	0, /* tp_call */
+	0, /* tp_str */
+	0, /* tp_getattro */
+	0, /* tp_setattro */
+	0, /* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT, /* tp_flgs */
+	"Pool of reusable Uci objects with preloaded configs", /* tp_doc */
+	0, /* tp_traverse */
+	0, /* tp_clear */
+	0, /* tp_richcompare */
+	0, /* tp_weaklistoffset */
+	0, /* tp_iter */
+	0, /* tp_iternext */
+	pool_methods, /* tp_method */
+	0, /* tp_members */
+	0, /* tp_getset */
+	0, /* tp_base */
+	0, /* tp_dict */
+	0, /* tp_descr_get */
+	0, /* tp_descr_set */
+	0, /* tp_disctoffset */
+	(initproc)pool_init, /* tp_init */
+	PyType_GenericAlloc, /* tp_alloc */
+	PyType_GenericNew, /* tp_new */
+};
+
 bool pyuci_object_init(PyObject *module) {
 	if (PyType_Ready(&uci_type) < 0)
 		return false;
@@ -521,6 +4612,52 @@ bool pyuci_object_init(PyObject *module) {
 	Py_INCREF(&uci_type);
 	PyModule_AddObject(module, "Uci", (PyObject*)&uci_type);
 
+	if (PyType_Ready(&iter_type) < 0)
+		return false;
+
+	if (PyType_Ready(&pool_type) < 0)
+		return false;
+	Py_INCREF(&pool_type);
+	PyModule_AddObject(module, "ContextPool", (PyObject*)&pool_type);
+
+	if (PyStructSequence_InitType2(&section_info_type, &section_info_desc) < 0)
+		return false;
+	Py_INCREF(&section_info_type);
+	PyModule_AddObject(module, "SectionInfo", (PyObject*)&section_info_type);
+
+	if (PyStructSequence_InitType2(&change_type, &change_desc) < 0)
+		return false;
+	Py_INCREF(&change_type);
+	PyModule_AddObject(module, "Change", (PyObject*)&change_type);
+
+	// Views are registered as virtual subclasses of collections.abc.Mapping
+	PyObject *abc = PyImport_ImportModule("collections.abc");
+	if (!abc)
+		return false;
+	keys_view_class = PyObject_GetAttrString(abc, "KeysView");
+	values_view_class = PyObject_GetAttrString(abc, "ValuesView");
+	items_view_class = PyObject_GetAttrString(abc, "ItemsView");
+	PyObject *mapping = PyObject_GetAttrString(abc, "Mapping");
+	Py_DECREF(abc);
+	if (!keys_view_class || !values_view_class || !items_view_class || !mapping) {
+		Py_XDECREF(mapping);
+		return false;
+	}
+	PyTypeObject *view_types[] = {&package_view_type, &section_view_type, NULL};
+	PyTypeObject **type;
+	for (type = view_types; *type; type++) {
+		PyObject *reg = NULL;
+		if (PyType_Ready(*type) < 0 ||
+				!(reg = PyObject_CallMethod(mapping, "register", "O", (PyObject*)*type))) {
+			Py_DECREF(mapping);
+			return false;
+		}
+		Py_DECREF(reg);
+		Py_INCREF(*type);
+		PyModule_AddObject(module, strchr((*type)->tp_name, '.') + 1, (PyObject*)*type);
+	}
+	Py_DECREF(mapping);
+
 	UciException = PyErr_NewException("uci.UciException", NULL, NULL);
 	Py_INCREF(UciException);
 	PyModule_AddObject(module, "UciException", UciException);
@@ -0,0 +1,90 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import pytest
+import euci
+from euci.aio import AsyncEUci
+
+
+def test_aio(tmpdir):
+    'Test get, set and commit of AsyncEUci'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled '1'
+    option count '0'
+""")
+    confdir = tmpdir.strpath
+    savedir = tmpdir.mkdir('save').strpath
+
+    async def run():
+        async with AsyncEUci(size=2, confdir=confdir, savedir=savedir) as u:
+            assert await u.get('test', 'testing', 'enabled', dtype=bool)
+            assert await u.get_many([('test', 'testing', 'count'), 'test.testing.missing'],
+                                    dtype=int, default=7) == [0, 7]
+            await asyncio.gather(*(u.set('test', 'testing', 'opt' + str(i), i) for i in range(8)))
+            assert await u.get('test', 'testing', 'opt7', dtype=int) == 7
+            await u.set('test.testing.dotted', 'value')
+            assert await u.get('test', 'testing', 'dotted') == 'value'
+            with pytest.raises(euci.UciExceptionNotFound):
+                await u.get('test', 'missing')
+            await u.commit('test')
+    asyncio.run(run())
+
+    u = euci.EUci(confdir=confdir, savedir=tmpdir.mkdir('save2').strpath)
+    for i in range(8):
+        assert u.get('test', 'testing', 'opt' + str(i), dtype=int) == i
+    assert u.get('test', 'testing', 'dotted') == 'value'
+
+
+def test_aio_loops(tmpdir):
+    'Test that AsyncEUci can be used from multiple event loops'
+    tmpdir.join('test').write("""
+config testing 'testing'
+""")
+    u = AsyncEUci(size=1, confdir=tmpdir.strpath, savedir=tmpdir.mkdir('save').strpath)
+
+    async def run(value):
+        await u.set('test', 'testing', 'one', value)
+        return await u.get('test', 'testing', 'one')
+    try:
+        assert asyncio.run(run('1')) == '1'
+        assert asyncio.run(run('2')) == '2'
+        assert not u._locks
+    finally:
+        u.close()
+
+
+def test_aio_external(tmpdir):
+    'Test that AsyncEUci sees changes done by other contexts'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+""")
+    confdir = tmpdir.strpath
+    savedir = tmpdir.mkdir('save').strpath
+
+    async def run():
+        async with AsyncEUci(size=1, confdir=confdir, savedir=savedir) as u:
+            assert await u.get('test', 'testing', 'one') == '0'
+            with euci.EUci(confdir=confdir, savedir=savedir) as other:
+                other.set('test', 'testing', 'one', 'changed')
+            assert await u.get('test', 'testing', 'one') == 'changed'
+            assert await u.get('test.testing.one') == 'changed'
+            with euci.EUci(confdir=confdir, savedir=savedir) as other:
+                other.set('test', 'testing', 'one', 'dotted')
+            assert await u.get('test.testing.one') == 'dotted'
+    asyncio.run(run())
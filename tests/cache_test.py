@@ -0,0 +1,121 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import pytest
+import euci
+from euci.cache import ConfigCache
+
+
+def test_cache_get(tmpdir):
+    'Test get from cache with type conversion'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled '1'
+    list list '1'
+    list list '2'
+""")
+    cache = ConfigCache()
+    confdir = tmpdir.strpath
+    savedir = tmpdir.mkdir('save').strpath
+    assert cache.get('test', 'testing', confdir=confdir, savedir=savedir) == 'testing'
+    assert cache.get('test', 'testing', 'enabled', dtype=bool, confdir=confdir, savedir=savedir)
+    assert cache.get('test', 'testing', 'list', dtype=int, confdir=confdir, savedir=savedir) == (1, 2)
+    assert dict(cache.get('test', confdir=confdir, savedir=savedir)['testing']) == {
+        'enabled': '1',
+        'list': ('1', '2'),
+    }
+    with pytest.raises(euci.UciExceptionNotFound):
+        cache.get('test', 'testing', 'missing', confdir=confdir, savedir=savedir)
+    assert cache.get('test', 'testing', 'missing', default=42, dtype=int,
+                     confdir=confdir, savedir=savedir) == 42
+    assert cache.get('missing', default=None, confdir=confdir, savedir=savedir) is None
+    stats = cache.stats()
+    assert stats['misses'] == 2
+    assert stats['hits'] == 5
+    assert cache.get('test.testing.list', dtype=int, confdir=confdir, savedir=savedir) == (1, 2)
+    assert cache.get('test.testing', confdir=confdir, savedir=savedir) == 'testing'
+    assert cache.get('test', '@testing[0]', 'enabled', dtype=bool, confdir=confdir, savedir=savedir)
+    assert cache.get('test.@testing[-1].enabled', confdir=confdir, savedir=savedir) == '1'
+    with pytest.raises(euci.UciExceptionNotFound):
+        cache.get('test', '@testing[1]', 'enabled', confdir=confdir, savedir=savedir)
+    with pytest.raises(TypeError):
+        cache.get('test', 'testing', 'enabled', invalid=True, confdir=confdir, savedir=savedir)
+
+
+def test_cache_invalidation(tmpdir):
+    'Test that cache is invalidated on commit and save'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+""")
+    cache = ConfigCache()
+    confdir = tmpdir.strpath
+    savedir = tmpdir.mkdir('save').strpath
+    assert cache.get('test', 'testing', 'one', confdir=confdir, savedir=savedir) == '0'
+    u = euci.EUci(confdir=confdir, savedir=savedir)
+    u.set('test', 'testing', 'one', '1')
+    u.save('test')
+    assert cache.get('test', 'testing', 'one', confdir=confdir, savedir=savedir) == '1'
+    u.set('test', 'testing', 'one', '2')
+    u.commit('test')
+    assert cache.get('test', 'testing', 'one', confdir=confdir, savedir=savedir) == '2'
+    assert cache.stats()['misses'] == 3
+
+
+def test_cache_eviction(tmpdir):
+    'Test that least recently used configs are evicted'
+    for name in ('one', 'two', 'three'):
+        tmpdir.join(name).write("""
+config testing 'testing'
+    option value '{}'
+""".format(name))
+    confdir = tmpdir.strpath
+    cache = ConfigCache(max_size=1)
+    for name in ('one', 'two', 'three'):
+        assert cache.get(name, 'testing', 'value', confdir=confdir) == name
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['evictions'] == 2
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_euci(tmpdir):
+    'Test EUci reading through cache'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+""")
+    cache = ConfigCache()
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=tmpdir.mkdir('save').strpath, cache=cache)
+    assert u.get('test', 'testing', 'one', dtype=int) == 0
+    assert u.get('test.testing.one', dtype=int) == 0
+    assert cache.stats()['hits'] == 1
+    # Config loaded by modification is read from object
+    u.set('test', 'testing', 'one', '1')
+    assert u.get('test', 'testing', 'one') == '1'
+    u.save('test')
+    assert u.get('test', 'testing', 'one') == '1'
+    assert cache.stats()['misses'] == 1
+    # External change is not visible until config is unloaded from object
+    other = euci.EUci(confdir=tmpdir.strpath, savedir=u.savedir())
+    other.set('test', 'testing', 'one', '2')
+    other.commit('test')
+    assert u.get('test', 'testing', 'one') == '1'
+    assert u.get_all('test', 'testing')['one'] == '1'
+    u.unload('test')
+    assert u.get('test', 'testing', 'one') == '2'
+    assert cache.stats()['misses'] == 2
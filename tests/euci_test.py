@@ -87,6 +87,8 @@ config list 'list'
     assert not u.get('test', 'bool', 'false', dtype=bool)
     assert not u.get('test', 'bled', 'false', dtype=bool)
     assert u.get('test', 'list', 'false', dtype=bool) == (False, False)
+    assert u.get('test.list.true', dtype=bool) == (True, True)
+    assert u.get('test.list.false', dtype=bool, list=False) is False
 
 
 def test_set_boolean(tmpdir):
@@ -103,6 +105,14 @@ config testing 'testing'
     assert u.get('test', 'testing', 'list') == ('1', '0', '1', '0')
 
 
+def test_add_many(tmpdir):
+    'Test add_many with type conversion'
+    tmpdir.join('test').write("")
+    u = euci.EUci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    names = u.add_many('test', 'host', [{'enabled': True, 'port': 22, 'list': (1, 2)}])
+    assert u.get_all('test', names[0]) == {'enabled': '1', 'port': '22', 'list': ('1', '2')}
+
+
 def test_get_integer(tmpdir):
     'Test get for dtype int'
     tmpdir.join('test').write("""
@@ -149,6 +159,43 @@ config testing 'testing'
     assert u.get('test', 'str', 'foo', dtype=int, default='-42') == -42
 
 
+def test_get_conversion(tmpdir):
+    'Test that conversion done by Uci.get and by EUci itself behaves same'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option invalid 'Maybe'
+""")
+    u = euci.EUci(confdir=tmpdir.strpath)
+    with pytest.raises(ValueError) as native:
+        u.get('test', 'testing', 'invalid', dtype=bool)
+    with pytest.raises(ValueError) as python:
+        u.get('test', 'testing', 'missing', dtype=bool, default='Maybe')
+    assert str(native.value) == str(python.value) == "invalid value 'maybe' for bool type"
+    assert u.get('test', 'testing', 'invalid', dtype=None) == 'Maybe'
+    assert u.get('test', 'testing', 'missing', dtype=None, default=1) == '1'
+
+
+def test_get_many(tmpdir):
+    'Test get_many with type conversion'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled 'yes'
+    option disabled 'off'
+    list list '1'
+    list list '0'
+""")
+    u = euci.EUci(confdir=tmpdir.strpath)
+    assert u.get_many([
+        ('test', 'testing', 'enabled'),
+        ('test', 'testing', 'disabled'),
+        ('test', 'testing', 'list'),
+    ], dtype=bool) == [True, False, (True, False)]
+    assert u.get_many(['test.testing.enabled', 'test.testing.missing'], dtype=bool, list=True,
+                      default='no') == [(True,), (False,)]
+    assert u.get_many({('test', 'testing', 'list'): 0, ('test', 'testing', 'missing'): 42},
+                      dtype=int) == {('test', 'testing', 'list'): (1, 0), ('test', 'testing', 'missing'): 42}
+
+
 def test_context(tmpdir):
     'Test context with EUci'
     tmpdir.join('test').write("""
@@ -0,0 +1,80 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import pytest
+import euci
+from euci.mapped import MappedUci
+
+
+def test_mapped_get(tmpdir):
+    'Test get from mapped index with type conversion'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled '1'
+    list list '1'
+    list list '2'
+config other
+    option b 'b'
+    option a 'a'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    mapped = MappedUci(confdir=tmpdir.strpath, savedir=savedir)
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    assert mapped.get('test', 'testing') == 'testing'
+    assert mapped.get('test', 'testing', 'enabled', dtype=bool)
+    assert mapped.get('test', 'testing', 'list', dtype=int) == (1, 2)
+    assert mapped.get('test', 'testing', 'missing', default=42) == 42
+    assert list(mapped.get_all('test').items()) == list(u.get_all('test').items())
+    anonymous = u.sections('test', 'other')[0].name
+    assert list(mapped.get_all('test', anonymous)) == ['b', 'a']
+    assert mapped.get('test.testing.list', dtype=int) == (1, 2)
+    assert mapped.get('test', '@other[0]', 'a') == 'a'
+    assert mapped.get('test.@testing[-1]') == 'testing'
+    assert mapped.get_all('test.@other[0].b') == 'b'
+    assert mapped.get('missing', default=None) is None
+    with pytest.raises(euci.UciExceptionNotFound):
+        mapped.get('test', '@other[1]', 'a')
+    with pytest.raises(TypeError):
+        mapped.get('test', 'testing', 'enabled', invalid=True)
+    with pytest.raises(euci.UciExceptionNotFound):
+        mapped.get('test', 'testing', 'missing')
+    with pytest.raises(euci.UciExceptionNotFound):
+        mapped.get('missing')
+    assert mapped.rebuilds == 1
+    assert tmpdir.join('save', '.index', 'test').check()
+
+
+def test_mapped_rebuild(tmpdir):
+    'Test that index is shared and rebuilt on change of config'
+    conf = tmpdir.join('test')
+    conf.write("""
+config testing 'testing'
+    option value 'old'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    first = MappedUci(confdir=tmpdir.strpath, savedir=savedir)
+    second = MappedUci(confdir=tmpdir.strpath, savedir=savedir)
+    assert first.get('test', 'testing', 'value') == 'old'
+    assert second.get('test', 'testing', 'value') == 'old'
+    assert (first.rebuilds, second.rebuilds) == (1, 0)
+
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    u.set('test', 'testing', 'value', 'saved')
+    u.save('test')
+    assert second.get('test', 'testing', 'value') == 'saved'
+    u.commit('test')
+    assert first.get('test', 'testing', 'value') == 'saved'
+    assert (first.rebuilds, second.rebuilds) == (2, 1)
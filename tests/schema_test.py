@@ -0,0 +1,170 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import dataclasses
+import gc
+import pytest
+import euci
+from euci import section as section_module
+from euci.schema import Option
+
+from ipaddress import IPv4Address
+
+
+def test_schema_section(tmpdir):
+    'Test reading of section using schema'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled 'yes'
+    option port '22'
+    option address '192.168.1.1'
+    list hosts 'a'
+    list hosts 'b'
+    option extra 'ignored'
+""")
+    with euci.EUci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath) as u:
+        schema = u.schema({
+            'enabled': bool,
+            'port': int,
+            'address': IPv4Address,
+            'hosts': Option(str, list=True),
+            'single': Option(str, list=True, default=()),
+            'timeout': Option(int, default=None),
+        })
+        assert schema.read_section(u, 'test', 'testing') == {
+            'enabled': True,
+            'port': 22,
+            'address': IPv4Address('192.168.1.1'),
+            'hosts': ('a', 'b'),
+            'single': (),
+            'timeout': None,
+        }
+        with pytest.raises(euci.UciExceptionNotFound):
+            u.schema({'missing': str}).read_section(u, 'test', 'testing')
+        with pytest.raises(ValueError):
+            u.schema({'address': int}).read_section(u, 'test', 'testing')
+        with pytest.raises(TypeError):
+            u.schema({'address': float})
+
+
+
+def test_schema_empty_list():
+    'Test that empty list is handled as missing option if single value is expected'
+    schema = euci.EUci.schema({
+        'required': Option(str, list=False),
+        'default': Option(int, list=False, default=3),
+        'listed': Option(str, list=True),
+    })
+    assert schema.typed({'required': ('a', 'b'), 'default': (), 'listed': ()}) == {
+        'required': 'a',
+        'default': 3,
+        'listed': (),
+    }
+    with pytest.raises(euci.UciExceptionNotFound):
+        schema.typed({'required': (), 'listed': ()})
+
+
+def test_option_repr():
+    'Test that required option is distinguishable from one with default None'
+    assert repr(Option(int)) == "Option(<class 'int'>, list=None)"
+    assert repr(Option(int, default=None)) == "Option(<class 'int'>, list=None, default=None)"
+
+
+def test_schema_package(tmpdir):
+    'Test reading of whole package to dataclasses'
+    tmpdir.join('test').write("""
+config host 'one'
+    option port '1'
+config other 'other'
+config host 'two'
+    option port '2'
+    option enabled '0'
+""")
+
+    @dataclasses.dataclass
+    class Host:
+        port: int
+        enabled: bool
+
+    with euci.EUci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath) as u:
+        schema = u.schema({'port': int, 'enabled': Option(bool, default=True)}, Host)
+        assert schema.read_package(u, 'test', 'host') == {
+            'one': Host(1, True),
+            'two': Host(2, False),
+        }
+
+
+def test_get_sections(tmpdir):
+    'Test reading of sections as compact immutable objects'
+    tmpdir.join('test').write("""
+config host 'first'
+    option port '22'
+    list names 'a'
+    list names 'b'
+
+config host 'second'
+    option port '22'
+    list names 'a'
+    list names 'b'
+
+config other
+    option port '80'
+""")
+    with euci.EUci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath) as u:
+        first, second = u.get_sections('test', 'host')
+        assert first.name == 'first'
+        assert first.type == 'host'
+        assert first['port'] == '22'
+        assert first.names == ('a', 'b')
+        assert dict(first) == {'names': ('a', 'b'), 'port': '22'}
+        assert type(first) is type(second)
+        assert first != second
+        with pytest.raises(AttributeError):
+            first.port = '23'
+        with pytest.raises(KeyError):
+            first['missing']
+
+        sections = u.get_sections('test')
+        assert len(sections) == 3
+        assert sections[2].type == 'other'
+        assert sections[:2] == (first, second)
+        assert len({first, second, *u.get_sections('test', 'host')}) == 2
+
+        schema = u.schema({'port': int, 'names': Option(str, list=True, default=())})
+        typed = u.get_sections('test', schema=schema)
+        assert [section.port for section in typed] == [22, 22, 80]
+        assert typed[2].names == ()
+
+
+def test_section_layouts():
+    'Test that classes of section layouts are dropped with their sections'
+    first = section_module.section('first', 'test', {'layout_unique': '1'})
+    second = section_module.section('second', 'test', {'layout_unique': '2'})
+    assert type(first) is type(second)
+    assert ('layout_unique',) in section_module._LAYOUTS
+    del first, second
+    gc.collect()
+    assert ('layout_unique',) not in section_module._LAYOUTS
+
+
+def test_section_reserved():
+    'Test that attributes of section take precedence over options'
+    reserved = ('name', 'type', 'keys', 'values', 'items', 'get', 'count', 'index', '_keys')
+    sec = section_module.section('sec', 'test', {name: 'option' for name in reserved + ('other',)})
+    assert sec.other == 'option'
+    for name in reserved:
+        assert sec[name] == 'option'
+        assert getattr(sec, name) != 'option'
@@ -14,6 +14,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import collections.abc
+import json
+import os
+import threading
 import pytest
 import uci
 
@@ -44,6 +48,31 @@ config testlist 'testlist'
     assert u.get('test', 'testlist', 'list2') == ('once', 'twice', 'thrice')
 
 
+def test_get_many(tmpdir):
+    'Test get_many method. This depends on working test_get.'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+    list list '1'
+    list list '2'
+""")
+    u = uci.Uci(confdir=tmpdir.strpath)
+    assert u.get_many([
+        ('test', 'testing'),
+        ('test', 'testing', 'one'),
+        'test.testing.list',
+    ]) == ['testing', '0', ('1', '2')]
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get_many([('test', 'testing', 'one'), ('test', 'testing', 'two')])
+    assert u.get_many(['test.testing.one', 'test.testing.two'], default=None) == ['0', None]
+    assert u.get_many({
+        ('test', 'testing', 'one'): '1',
+        'test.testing.two': '2',
+    }) == {('test', 'testing', 'one'): '0', 'test.testing.two': '2'}
+    with pytest.raises(TypeError):
+        u.get_many([42])
+
+
 def test_set(tmpdir):
     'Test set method. This depends on working test_get.'
     tmpdir.join('test').write("")
@@ -54,6 +83,28 @@ def test_set(tmpdir):
     assert u.get('test', 'testing', 'variable') == 'value'
 
 
+def test_add(tmpdir):
+    'Test add and add_many methods. This depends on working test_set.'
+    tmpdir.join('test').write("")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    name = u.add('test', 'host')
+    u.set('test', name, 'name', 'first')
+    names = u.add_many('test', 'host', [
+        {'name': 'second', 'list': ('a', 'b')},
+        {},
+    ])
+    assert len(names) == 2 and name not in names
+    assert u.get('test', '@host[0]', 'name') == 'first'
+    assert u.get_all('test', names[0]) == {'name': 'second', 'list': ('a', 'b')}
+    assert u.get_all('test', names[1]) == {}
+    assert [s.name for s in u.sections('test', 'host')] == [name] + names
+    assert u.dirty_packages() == ['test']
+    with pytest.raises(uci.UciException):
+        u.add_many('test', 'host', [{'name': 42}])
+    with pytest.raises(uci.UciException):
+        u.add('missing', 'host')
+
+
 def test_commit(tmpdir):
     'Test commit method. This depends on working test_set.'
     cnf = tmpdir.join('test')
@@ -109,7 +160,7 @@ config testing 'testing'
     assert u.get('test', 'deploy', 'two') == '1'
 
 
-def no_test_reorder(tmpdir):
+def test_reorder(tmpdir):
     'Test delete method. This depends on working test_commit.'
     cnf = tmpdir.join('test')
     cnf.write("""
@@ -133,6 +184,70 @@ config testing 'testing'
 """
 
 
+def test_apply(tmpdir):
+    'Test apply method. This depends on working test_commit.'
+    cnf = tmpdir.join('test')
+    cnf.write("""
+config testing 'testing'
+    option one '0'
+    option two '1'
+
+config deploy 'deploy'
+    option three '2'
+""")
+    other = tmpdir.join('other')
+    other.write("")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    u.get('other')
+    assert u.apply([
+        ('set', 'test', 'testing', 'one', '1'),
+        ('set', 'test', 'testing', 'list', ('a', 'b')),
+        ('delete', 'test', 'testing', 'two'),
+        ['rename', 'test', 'deploy', 'three', 'four'],
+        ('reorder', 'test', 'deploy', 0),
+    ], commit=True) == ['test']
+    assert cnf.read() == """
+config deploy 'deploy'
+\toption four '2'
+
+config testing 'testing'
+\toption one '1'
+\tlist list 'a'
+\tlist list 'b'
+
+"""
+    assert other.read() == ""
+    with pytest.raises(uci.UciException):
+        u.apply([('unknown', 'test', 'testing')])
+    with pytest.raises(TypeError):
+        u.apply(['set'])
+
+    # Failed batch is rolled back but previous changes are kept
+    u.set('test', 'testing', 'one', 'before')
+    with pytest.raises(uci.UciException):
+        u.apply([
+            ('set', 'test', 'testing', 'one', 'batch'),
+            ('delete', 'test', 'deploy'),
+            ('set', 'other', 'new', 'section'),
+            ('unknown', 'test', 'testing'),
+        ], commit=True)
+    assert u.get('test', 'testing', 'one') == 'before'
+    assert u.get('test', 'deploy', 'four') == '2'
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('other', 'new')
+    assert u.dirty_packages() == ['test']
+    assert other.read() == ""
+    # Package is remembered for any form of path
+    for delete in (('delete', 'test.deploy.four'), ('delete', ('test', 'deploy', 'four'))):
+        with pytest.raises(uci.UciException):
+            u.apply([delete, ('unknown', 'test', 'testing')])
+        assert u.get('test', 'testing', 'one') == 'before'
+        assert u.get('test', 'deploy', 'four') == '2'
+    assert u.apply([('delete', ('test', 'deploy', 'four'))]) == ['test']
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test', 'deploy', 'four')
+
+
 def test_save(tmpdir):
     'Test save method. This depends on working test_set.'
     sf = tmpdir.mkdir('save')
@@ -191,3 +306,674 @@ def test_context_commit(tmpdir):
     with uci.Uci(confdir=tmpdir.strpath) as u:
         assert u.get('test', 'testing', 'one') == '0'
         assert u.get('test', 'testing', 'two') == '1'
+
+
+def test_dirty_packages(tmpdir):
+    """Test that only modified packages are reported and committed. This depends
+    on working test_context_commit.
+    """
+    tmpdir.join('test').write("")
+    other_content = """
+config testing 'testing'
+    option one '0'
+"""
+    other = tmpdir.join('other')
+    other.write(other_content)
+    with uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath) as u:
+        assert u.get('other', 'testing', 'one') == '0'
+        assert u.dirty_packages() == []
+        u.set('test', 'testing', 'testing')
+        assert u.dirty_packages() == ['test']
+        u.save('test')
+        assert u.dirty_packages() == []
+        u.set('test', 'testing', 'one', '1')
+        assert u.dirty_packages() == ['test']
+        u.set('test', 'testing', 'two', '2')
+        u.revert('test', 'testing', 'two')
+        assert u.dirty_packages() == ['test']
+    assert other.read() == other_content
+    with uci.Uci(confdir=tmpdir.strpath) as u:
+        assert u.get('test', 'testing', 'one') == '1'
+        with pytest.raises(uci.UciExceptionNotFound):
+            u.get('test', 'testing', 'two')
+
+
+def test_view(tmpdir):
+    'Test view method. This depends on working test_set.'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+    list list '1'
+    list list '2'
+
+config deploy 'deploy'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    pkg = u.view('test')
+    assert isinstance(pkg, collections.abc.Mapping)
+    assert len(pkg) == 2
+    assert list(pkg) == ['testing', 'deploy']
+    assert 'testing' in pkg
+    assert 'missing' not in pkg
+    assert pkg.get('missing') is None
+    with pytest.raises(KeyError):
+        pkg['missing']
+    sec = pkg['testing']
+    assert isinstance(sec, collections.abc.Mapping)
+    assert sec.name == 'testing'
+    assert sec.type == 'testing'
+    assert sec['one'] == '0'
+    assert sec['list'] == ('1', '2')
+    assert isinstance(sec.keys(), collections.abc.KeysView)
+    assert isinstance(sec.values(), collections.abc.ValuesView)
+    assert isinstance(sec.items(), collections.abc.ItemsView)
+    assert list(sec.items()) == [('one', '0'), ('list', ('1', '2'))]
+    assert list(sec.values()) == ['0', ('1', '2')]
+    assert sec.keys() & {'one', 'missing'} == {'one'}
+    assert ('one', '0') in sec.items()
+    assert ('one', '1') not in sec.items()
+    keys = pkg.keys()
+    assert dict(u.view('test', 'deploy')) == {}
+    # Views are live
+    u.set('test', 'testing', 'two', '2')
+    assert sec['two'] == '2'
+    assert 'two' in sec.keys()
+    u.delete('test', 'testing')
+    assert list(pkg) == ['deploy']
+    assert list(keys) == ['deploy']
+    with pytest.raises(uci.UciExceptionNotFound):
+        len(sec)
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.view('test', 'testing')
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.view('missing')
+
+
+def test_iter(tmpdir):
+    'Test iter_sections, iter_options and foreach methods.'
+    tmpdir.join('test').write("""
+config rule 'first'
+    option one '0'
+
+config zone 'zone'
+    option two '1'
+    list list '2'
+
+config rule 'second'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    assert list(u.iter_sections('test')) == [
+        ('first', 'rule', 0),
+        ('zone', 'zone', 1),
+        ('second', 'rule', 2),
+    ]
+    assert list(u.iter_sections('test', type='rule')) == [('first', 'rule', 0), ('second', 'rule', 2)]
+    assert list(u.iter_sections('test', 'missing')) == []
+    assert list(u.iter_options('test', 'zone')) == [('two', '1'), ('list', ('2',))]
+    assert list(u.foreach('test', 'rule')) == [('first', {'one': '0'}), ('second', {})]
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.iter_options('test', 'missing')
+    it = u.iter_sections('test')
+    assert next(it) == ('first', 'rule', 0)
+    u.set('test', 'first', 'one', '1')
+    with pytest.raises(RuntimeError):
+        next(it)
+
+
+def test_sections(tmpdir):
+    'Test sections method and extended section lookup.'
+    tmpdir.join('test').write("""
+config rule
+    option name 'first'
+
+config zone 'zone'
+
+config rule
+    option name 'second'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    sections = u.sections('test')
+    assert [(sec.type, sec.index, sec.anonymous) for sec in sections] == [
+        ('rule', 0, True),
+        ('zone', 1, False),
+        ('rule', 2, True),
+    ]
+    assert sections[1] == ('zone', 'zone', 1)
+    rules = u.sections('test', 'rule')
+    assert [sec.name for sec in rules] == [sections[0].name, sections[2].name]
+    assert u.sections('test', 'missing') == []
+    assert u.get('test', '@rule[1]', 'name') == 'second'
+    assert u.get('test', '@rule[-2]', 'name') == 'first'
+    assert u.get('test.@rule[0].name') == 'first'
+    assert u.get('test', '@zone[0]') == 'zone'
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test', '@rule[2]', 'name')
+    u.set('test', '@rule[0]', 'name', 'third')
+    assert u.get('test', sections[0].name, 'name') == 'third'
+    u.delete('test', '@rule[0]')
+    assert u.get('test', '@rule[0]', 'name') == 'second'
+    assert [sec.index for sec in u.sections('test', 'rule')] == [1]
+
+
+def test_load_unload(tmpdir):
+    'Test load, unload and loaded methods. This depends on working test_set.'
+    cnf = tmpdir.join('test')
+    cnf.write("""
+config testing 'testing'
+    option one '0'
+""")
+    tmpdir.join('other').write("")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    assert u.loaded() == []
+    u.load('test', 'other')
+    assert u.loaded() == ['test', 'other']
+    u.unload('other')
+    u.unload('missing')
+    assert u.loaded() == ['test']
+    u.set('test', 'testing', 'one', '1')
+    cnf.write("""
+config testing 'testing'
+    option one '2'
+""")
+    assert u.get('test', 'testing', 'one') == '1'
+    u.load('test')
+    assert u.dirty_packages() == []
+    assert u.get('test', 'testing', 'one') == '2'
+    with pytest.raises(uci.UciException):
+        u.load('missing')
+
+
+def test_changes(tmpdir):
+    'Test changes and has_changes methods. This depends on working test_set.'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    u = uci.Uci(savedir=savedir, confdir=tmpdir.strpath)
+    assert not u.has_changes('test')
+    assert u.changes() == []
+    u.set('test', 'testing', 'one', '1')
+    u.set('test', 'testing', 'two', 'x')
+    u.set('test', 'testing', 'three', ('a', 'b'))
+    u.delete('test', 'testing', 'one')
+    assert u.has_changes('test')
+    assert u.changes('test') == [
+        ('set', 'test', 'testing', 'one', '1'),
+        ('set', 'test', 'testing', 'two', 'x'),
+        ('add_list', 'test', 'testing', 'three', 'a'),
+        ('add_list', 'test', 'testing', 'three', 'b'),
+        ('delete', 'test', 'testing', 'one', None),
+    ]
+    assert u.changes()[0].command == 'set'
+    u.save('test')
+    u2 = uci.Uci(savedir=savedir, confdir=tmpdir.strpath)
+    assert u2.has_changes('test')
+    assert u2.loaded() == []
+    assert [c.command for c in u2.changes()] == ['set', 'set', 'add_list', 'add_list', 'delete']
+    u2.revert('test')
+    assert not u2.has_changes('test')
+    assert u2.changes('test') == []
+    with pytest.raises(uci.UciExceptionNotFound):
+        u2.changes('missing')
+
+
+def test_threads(tmpdir):
+    'Test that single Uci object can be used from multiple threads.'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '0'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+
+    def worker(index):
+        for i in range(100):
+            u.set('test', 'testing', 'opt' + str(index), str(i))
+            assert u.get('test', 'testing', 'opt' + str(index)) == str(i)
+            assert dict(u.view('test', 'testing'))['one'] == '0'
+        u.commit('test')
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    u2 = uci.Uci(savedir=tmpdir.mkdir('save2').strpath, confdir=tmpdir.strpath)
+    assert u2.get_all('test', 'testing') == {
+        'one': '0', 'opt0': '99', 'opt1': '99', 'opt2': '99', 'opt3': '99',
+    }
+
+
+def test_get_dtype(tmpdir):
+    'Test get with type conversion'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option enabled 'Yes'
+    option disabled 'off'
+    option number ' 42 '
+    option invalid 'Foo'
+    list numbers '1'
+    list numbers '-2'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    assert u.get('test', 'testing', 'enabled', dtype=bool) is True
+    assert u.get('test', 'testing', 'disabled', dtype=bool) is False
+    assert u.get('test', 'testing', 'number', dtype=int) == 42
+    assert u.get('test', 'testing', 'numbers', dtype=int) == (1, -2)
+    assert u.get('test', 'testing', 'numbers', dtype=str) == ('1', '-2')
+    assert u.get('test.testing.enabled', dtype=bool) is True
+    assert u.get('test', dtype=int) == u.get('test')
+    assert u.get('test', 'testing', 'number', dtype=None) == ' 42 '
+    with pytest.raises(ValueError, match="invalid value 'foo' for bool type"):
+        u.get('test', 'testing', 'invalid', dtype=bool)
+    with pytest.raises(ValueError):
+        u.get('test', 'testing', 'invalid', dtype=int)
+    with pytest.raises(TypeError):
+        u.get('test', 'testing', 'enabled', dtype=float)
+    with pytest.raises(TypeError):
+        u.get('test', 'testing', 'enabled', other=bool)
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test', 'testing', 'missing', dtype=bool)
+
+
+def test_get_cached(tmpdir):
+    'Test that repeated get reflects modifications. This depends on working test_set and test_load_unload.'
+    cnf = tmpdir.join('test')
+    cnf.write("""
+config testing 'testing'
+    option one '0'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    for _ in range(3):
+        assert u.get('test', 'testing', 'one') == '0'
+        assert u.get('test.testing.one') == '0'
+        assert u.get_many(['test.testing.one', ('test', 'testing', 'one')]) == ['0', '0']
+    u.set('test', 'testing', 'one', '1')
+    assert u.get('test', 'testing', 'one') == '1'
+    assert u.get('test.testing.one') == '1'
+    assert u.get_many(['test.testing.one', ('test', 'testing', 'one')]) == ['1', '1']
+    u.delete('test.testing.one')
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test', 'testing', 'one')
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test.testing.one')
+    u.revert('test')
+    assert u.get('test', 'testing', 'one') == '0'
+    u.rename('test', 'testing', 'renamed')
+    assert u.get('test', 'renamed', 'one') == '0'
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.get('test', 'testing', 'one')
+    cnf.write("""
+config testing 'testing'
+    option one '2'
+""")
+    u.load('test')
+    assert u.get('test', 'testing', 'one') == '2'
+    u.unload('test')
+    assert u.get('test.testing.one') == '2'
+
+
+def test_export_import(tmpdir):
+    'Test export and import in both formats. This depends on working test_get.'
+    src = tmpdir.mkdir('src')
+    src.join('test').write("""
+config testing 'testing'
+    option one '"quoted"\\'
+    list list 'a'
+    list list 'b'
+config anon
+    option two '2'
+""")
+    src.join('other').write("""
+config other 'other'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=src.strpath)
+    data = json.loads(u.export(['test']).decode())
+    anon = u.sections('test', 'anon')[0].name
+    assert data == {'test': {
+        'testing': {'.anonymous': False, '.type': 'testing', '.name': 'testing', '.index': 0,
+                    'one': '"quoted"\\', 'list': ['a', 'b']},
+        anon: {'.anonymous': True, '.type': 'anon', '.name': anon, '.index': 1, 'two': '2'},
+    }}
+    assert sorted(json.loads(u.export().decode())) == ['other', 'test']
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.export(['missing'])
+    with pytest.raises(ValueError):
+        u.export(format='xml')
+
+    for fmt in ('json', 'binary'):
+        dst = tmpdir.mkdir('dst-' + fmt)
+        dst.join('test').write("""
+config removed 'removed'
+""")
+        u2 = uci.Uci(savedir=tmpdir.mkdir('save-' + fmt).strpath, confdir=dst.strpath)
+        assert sorted(u2.import_(u.export(format=fmt))) == ['other', 'test']
+        assert sorted(u2.dirty_packages()) == ['other', 'test']
+        assert u2.get_all('test', 'testing') == {'one': '"quoted"\\', 'list': ('a', 'b')}
+        assert [(s.type, s.anonymous) for s in u2.sections('test')] == [('testing', False), ('anon', True)]
+        assert u2.get_all('other') == {'other': {}}
+        assert not dst.join('other').check()
+        u2.commit('other')
+        assert dst.join('other').check()
+
+    with pytest.raises(ValueError):
+        u.import_(b'UCI\x01P\xff')
+
+
+def _diff_content(u, config):
+    'Content of config comparable between Uci objects (ignores names of anonymous sections)'
+    sections = sorted(json.loads(u.export([config]).decode())[config].values(), key=lambda s: s['.index'])
+    return [
+        (s['.type'], None if s['.anonymous'] else s['.name'],
+         {k: v for k, v in s.items() if not k.startswith('.')})
+        for s in sections
+    ]
+
+
+def test_diff(tmpdir):
+    'Test diff between two confdirs and with snapshot. This depends on working test_export_import.'
+    old = tmpdir.mkdir('old')
+    old.join('test').write("""
+config named 'first'
+    option one '1'
+config named 'second'
+    option two '2'
+config anon
+    option a 'a'
+config anon
+    option b 'b'
+config removed 'removed'
+config renamed 'before'
+    option keep 'yes'
+config named 'third'
+    list list 'a'
+    list list 'b'
+""")
+    old.join('gone').write("""
+config gone 'gone'
+""")
+    new = tmpdir.mkdir('new')
+    new.join('test').write("""
+config named 'third'
+    list list 'b'
+    list list 'a'
+config named 'first'
+    option one '1'
+config renamed 'after'
+    option keep 'yes'
+config anon
+    option a 'changed'
+    option c 'c'
+config named 'added'
+    option foo 'foo'
+config anon
+    option b 'b'
+config anon
+    option d 'd'
+config other 'second'
+""")
+    new.join('gone').write("")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=old.strpath)
+    u2 = uci.Uci(savedir=tmpdir.mkdir('save2').strpath, confdir=new.strpath)
+
+    ops = u.diff(u2)
+    assert ("rename", "test", "before", "after") in ops
+    assert ("delete", "test", "removed") in ops
+    assert ("delete", "test", "gone") in ops
+    assert ("set", "test", "second", "other") in ops
+    assert ("delete", "test", "second", "two") in ops
+    assert not [op for op in ops if op[:3] == ("set", "test", "first")]
+    assert u.diff(u2, configs=["gone"]) == [("delete", "gone", "gone")]
+
+    assert sorted(u.apply(ops)) == ["gone", "test"]
+    for config in ("test", "gone"):
+        assert _diff_content(u, config) == _diff_content(u2, config)
+    assert u.diff(u2) == []
+
+    snapshot = u.export(["test"])
+    u.revert("test")
+    u.revert("gone")
+    u.apply(u.diff(snapshot))
+    assert _diff_content(u, "test") == _diff_content(u2, "test")
+    assert u.get("gone", "gone") == "gone"
+
+
+def test_diff_apply(tmpdir):
+    'Test that operations of diff applied to Uci reach the other one. This depends on working test_diff.'
+    old = tmpdir.mkdir('old')
+    old.join('test').write("""
+config testing 'testing'
+    option one '1'
+""")
+    old.join('removed').write("""
+config removed 'removed'
+    option one '1'
+""")
+    new = tmpdir.mkdir('new')
+    new.join('test').write("""
+config testing 'testing'
+    option one '2'
+""")
+    new.join('added').write("""
+config added 'added'
+    option one '1'
+config anon
+    list list 'a'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=old.strpath)
+    u2 = uci.Uci(savedir=tmpdir.mkdir('save2').strpath, confdir=new.strpath)
+    snapshot = u2.export()
+
+    assert sorted(u.apply(u.diff(u2), commit=True)) == ['added', 'removed', 'test']
+    for config in ('test', 'added'):
+        assert _diff_content(u, config) == _diff_content(u2, config)
+    assert u.get_all('removed') == {}
+    assert old.join('added').check()
+    assert u.diff(u2) == []
+
+    # Snapshot is compared with configs in confdir of this object
+    old.join('added').remove()
+    u = uci.Uci(savedir=tmpdir.join('save').strpath, confdir=old.strpath)
+    assert u.apply(u.diff(snapshot)) == ['added']
+    assert not old.join('added').check()
+    assert _diff_content(u, 'added') == _diff_content(u2, 'added')
+    assert u.diff(snapshot) == []
+
+
+def test_diff_threads(tmpdir):
+    'Test that concurrent diffs in both directions do not deadlock'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '1'
+""")
+    a = uci.Uci(savedir=tmpdir.mkdir('save_a').strpath, confdir=tmpdir.strpath)
+    b = uci.Uci(savedir=tmpdir.mkdir('save_b').strpath, confdir=tmpdir.strpath)
+    b.set('test', 'testing', 'one', '2')
+
+    def worker(first, second):
+        for _ in range(200):
+            assert first.diff(second) != []
+
+    threads = [threading.Thread(target=worker, args=(a, b)), threading.Thread(target=worker, args=(b, a))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+
+
+def test_stats(tmpdir):
+    'Test statistics and slow callback'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '1'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=tmpdir.strpath)
+    assert u.stats() is None
+    slow = []
+    u.set_stats(slow_callback=lambda method, duration: slow.append(method), slow_threshold=0)
+    u.get('test', 'testing', 'one')
+    u.get('test', 'testing', 'one')
+    u.set('test', 'testing', 'two', '2')
+    u.commit('test')
+    stats = u.stats(reset=True)
+    assert stats['methods']['get']['calls'] == 2
+    assert stats['methods']['set']['calls'] == 1
+    assert stats['methods']['get']['max'] <= stats['methods']['get']['total']
+    assert stats['cache_hits'] == 1 and stats['cache_misses'] == 1
+    assert stats['commits'] == 1
+    assert stats['commit_bytes'] == tmpdir.join('test').size()
+    assert slow == ['get', 'get', 'set', 'commit']
+    assert u.stats()['methods'] == {}
+    u.unload('test')
+    u.get('test', 'testing', 'two')
+    assert u.stats()['loads'] == 1
+    u.set_stats(False)
+    assert u.stats() is None
+
+
+def test_commit_many(tmpdir):
+    'Test commit of multiple configs. This depends on working test_commit.'
+    for config in ('first', 'second', 'third'):
+        tmpdir.join(config).write("")
+    tmpdir.join('first').chmod(0o640)
+    savedir = tmpdir.mkdir('save')
+    u = uci.Uci(savedir=savedir.strpath, confdir=tmpdir.strpath)
+    u.set('first', 'testing', 'testing')
+    u.set('second', 'testing', 'testing')
+    u.save('second')
+    u.set('second', 'testing', 'variable', 'value')
+    u.load('third')
+    assert sorted(u.commit_many(['first', 'second', 'third', 'first'])) == ['first', 'second']
+    assert tmpdir.join('first').read() == "\nconfig testing 'testing'\n\n"
+    assert tmpdir.join('first').stat().mode & 0o777 == 0o640
+    assert tmpdir.join('second').read() == "\nconfig testing 'testing'\n\toption variable 'value'\n\n"
+    assert savedir.join('second').read() == ""
+    assert not [f for f in tmpdir.listdir() if f.basename.startswith('.')]
+    assert u.dirty_packages() == []
+    assert u.get('second', 'testing', 'variable') == 'value'
+    assert u.changes() == []
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.commit_many(['missing'])
+
+    # Changes committed and saved by others are preserved
+    other = uci.Uci(savedir=savedir.strpath, confdir=tmpdir.strpath)
+    u.set('second', 'testing', 'mine', 'value')
+    other.set('second', 'testing', 'committed', 'value')
+    other.commit('second')
+    other.set('second', 'testing', 'saved', 'value')
+    other.save('second')
+    assert u.commit_many(['second']) == ['second']
+    assert uci.Uci(savedir=savedir.strpath, confdir=tmpdir.strpath).get_all('second', 'testing') == {
+        'variable': 'value',
+        'committed': 'value',
+        'saved': 'value',
+        'mine': 'value',
+    }
+
+    u.set('first', 'testing', 'variable', 'value')
+    assert u.commit_many() == ['first']
+    assert uci.Uci(confdir=tmpdir.strpath).get('first', 'testing', 'variable') == 'value'
+
+    with uci.Uci(savedir=savedir.strpath, confdir=tmpdir.strpath) as u:
+        u.set('third', 'testing', 'testing')
+    assert tmpdir.join('third').read() == "\nconfig testing 'testing'\n\n"
+
+
+def test_context_pool(tmpdir):
+    'Test reuse of objects from pool. This depends on working test_commit_many.'
+    conf = tmpdir.join('test')
+    conf.write("""
+config testing 'testing'
+    option value 'old'
+""")
+    tmpdir.join('other').write("")
+    savedir = tmpdir.mkdir('save').strpath
+    pool = uci.ContextPool(confdir=tmpdir.strpath, savedir=savedir, size=1, preload=['test'])
+    with pool.acquire() as u:
+        first = u
+        assert u.loaded() == ['test']
+        u.set('test', 'testing', 'value', 'new')
+    assert conf.read() == "\nconfig testing 'testing'\n\toption value 'new'\n\n"
+    # Object returned to pool can't be used until it is leased again
+    with pytest.raises(uci.UciException):
+        first.get('test', 'testing', 'value')
+
+    u = pool.acquire()
+    assert u is first
+    assert u.get('test', 'testing', 'value') == 'new'
+    assert pool.acquire() is not first
+    u.set('test', 'testing', 'value', 'dropped')
+    pool.release(u)
+    with pytest.raises(ValueError):
+        pool.release(u)
+    with pytest.raises(uci.UciException):
+        u.set('test', 'testing', 'value', 'after release')
+
+    with pool.acquire() as u:
+        assert u is first
+        assert u.get('test', 'testing', 'value') == 'new'
+        u.get('other')
+
+    other = uci.Uci(confdir=tmpdir.strpath, savedir=savedir)
+    other.set('test', 'testing', 'value', 'external')
+    other.commit('test')
+    with pool.acquire() as u:
+        assert u is first
+        assert u.get('test', 'testing', 'value') == 'external'
+        assert sorted(u.loaded()) == ['other', 'test']
+
+    # Change is detected even if modification time stays the same
+    stat = os.stat(conf.strpath)
+    conf.write("\nconfig testing 'testing'\n\toption value 'in place'\n\n")
+    os.utime(conf.strpath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with pool.acquire() as u:
+        assert u is first
+        assert u.get('test', 'testing', 'value') == 'in place'
+
+    with pytest.raises(TypeError):
+        uci.ContextPool(factory=dict)
+
+
+def test_find(tmpdir):
+    'Test find with and without index. This depends on working test_set.'
+    conf = tmpdir.mkdir('conf')
+    conf.join('network').write("""
+config interface 'lan'
+    option device 'br-lan'
+config interface 'wan'
+    option device 'eth0'
+""")
+    conf.join('firewall').write("""
+config zone 'lan'
+    list network 'lan'
+    list network 'lan'
+config zone 'wan'
+    list network 'wan'
+config rule
+    option src 'lan'
+""")
+    u = uci.Uci(savedir=tmpdir.mkdir('save').strpath, confdir=conf.strpath)
+    rule = u.sections('firewall', 'rule')[0].name
+    for index in (False, True):
+        assert sorted(u.find(value='lan', index=index)) == [
+            ('firewall', 'lan', 'network'), ('firewall', rule, 'src')]
+        assert u.find(['firewall'], value='lan', section_type='zone', index=index) == [
+            ('firewall', 'lan', 'network')]
+        assert u.find(['network'], option='device', value='eth0', index=index) == [('network', 'wan', 'device')]
+        assert u.find(['network'], value='missing', index=index) == []
+    assert u.find(['network'], option='device') == [('network', 'lan', 'device'), ('network', 'wan', 'device')]
+    assert u.find(['network'], section_type='interface') == [('network', 'lan', 'device'), ('network', 'wan', 'device')]
+
+    u.set('network', 'wan', 'device', 'lan')
+    u.delete('firewall', rule, 'src')
+    assert sorted(u.find(value='lan', index=True)) == [
+        ('firewall', 'lan', 'network'), ('network', 'wan', 'device')]
+    u.set('firewall', 'wan', 'network', ('wan', 'lan'))
+    u.set('firewall', 'lan', 'forward')
+    u.delete('network', 'wan')
+    for value in ('lan', 'wan', 'eth0'):
+        assert sorted(u.find(value=value, index=True)) == sorted(u.find(value=value))
+    assert u.find(['firewall'], value='lan', section_type='zone', index=True) == [('firewall', 'wan', 'network')]
+    with pytest.raises(uci.UciExceptionNotFound):
+        u.find(['missing'])
@@ -0,0 +1,151 @@
+# Copyright 2026, CZ.NIC z.s.p.o. (http://www.nic.cz/)
+#
+# This file is part of the PyUCI.
+#
+# PyUCI is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+# PyUCI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PyUCI.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import threading
+import euci
+from euci.watch import Event, Watcher
+
+
+def test_watch_read(tmpdir):
+    'Test that saved and committed changes are reported'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '1'
+    option two '2'
+""")
+    tmpdir.join('other').write("")
+    savedir = tmpdir.mkdir('save').strpath
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    with Watcher(['test'], confdir=tmpdir.strpath, savedir=savedir) as watcher:
+        u.set('test', 'testing', 'one', 'changed')
+        u.set('test', 'added', 'section')
+        u.save('test')
+        assert watcher.read(5) == [Event('test', frozenset({'testing', 'added'}), frozenset({('testing', 'one')}))]
+        u.delete('test', 'testing', 'two')
+        u.commit('test')
+        assert watcher.read(5) == [Event('test', frozenset({'testing'}), frozenset({('testing', 'two')}))]
+        u.set('other', 'other', 'other')
+        u.commit('other')
+        assert watcher.read(0.5) == []
+
+
+def test_watch_callback(tmpdir):
+    'Test watch with callback'
+    tmpdir.join('test').write("""
+config testing 'testing'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    events = []
+    received = threading.Event()
+
+    def callback(event):
+        events.append(event)
+        received.set()
+    watcher = u.watch(callback=callback)
+    u.set('test', 'testing', 'option', 'value')
+    u.commit('test')
+    assert received.wait(5)
+    watcher.close()
+    assert events == [Event('test', frozenset({'testing'}), frozenset({('testing', 'option')}))]
+
+
+def test_watch_async(tmpdir):
+    'Test asynchronous iteration of watcher'
+    tmpdir.join('test').write("""
+config testing 'testing'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+
+    async def watch():
+        with Watcher(confdir=tmpdir.strpath, savedir=savedir) as watcher:
+            def change():
+                u.delete('test', 'testing')
+                u.save('test')
+            asyncio.get_running_loop().call_later(0.1, change)
+            async for event in watcher:
+                return event
+
+    assert asyncio.run(asyncio.wait_for(watch(), 5)) == Event('test', frozenset({'testing'}), frozenset())
+
+
+def test_watch_unload(tmpdir):
+    'Test that watching object reads changes committed by other one'
+    tmpdir.join('test').write("""
+config testing 'testing'
+    option one '1'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    other = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    assert u.get('test', 'testing', 'one') == '1'
+    with u.watch() as watcher:
+        other.set('test', 'testing', 'one', 'changed')
+        other.commit('test')
+        assert watcher.read(5) == [Event('test', frozenset({'testing'}), frozenset({('testing', 'one')}))]
+        assert u.get('test', 'testing', 'one') == 'changed'
+        # Package with unsaved changes is kept
+        u.set('test', 'testing', 'two', '2')
+        other.set('test', 'testing', 'one', 'again')
+        other.commit('test')
+        assert watcher.read(5) == [Event('test', frozenset({'testing'}), frozenset({('testing', 'one')}))]
+        assert u.get('test', 'testing', 'one') == 'changed'
+        assert u.get('test', 'testing', 'two') == '2'
+
+
+def test_watch_callback_error(tmpdir, caplog):
+    'Test that exception raised by callback does not stop delivery of later events'
+    tmpdir.join('test').write("""
+config testing 'testing'
+""")
+    savedir = tmpdir.mkdir('save').strpath
+    u = euci.EUci(confdir=tmpdir.strpath, savedir=savedir)
+    events = []
+    failed = threading.Event()
+    received = threading.Event()
+
+    def callback(event):
+        events.append(event)
+        if not failed.is_set():
+            failed.set()
+            raise RuntimeError('callback failure')
+        received.set()
+    with u.watch(callback=callback):
+        u.set('test', 'testing', 'one', '1')
+        u.commit('test')
+        assert failed.wait(5)
+        u.set('test', 'testing', 'two', '2')
+        u.commit('test')
+        assert received.wait(5)
+    assert [event.options for event in events] == [
+        frozenset({('testing', 'one')}), frozenset({('testing', 'two')})]
+    assert 'callback failure' in caplog.text
+
+
+def test_watch_close_reader(tmpdir):
+    'Test that close wakes up reader in other thread'
+    tmpdir.join('test').write("")
+    savedir = tmpdir.mkdir('save').strpath
+    watcher = Watcher(confdir=tmpdir.strpath, savedir=savedir)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(watcher.read()))
+    reader.start()
+    watcher.close()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert result == [[]]